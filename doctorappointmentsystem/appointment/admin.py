@@ -1,35 +1,138 @@
+import calendar
+
 from django.contrib import admin
-from .models import Appointment, Doctor, Customer, User
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.db.models.functions import ExtractIsoWeekDay
+from django.http import StreamingHttpResponse
+from . import bulk, stats
+from .forms import DoctorAdminForm
+from .pagination import EstimatedCountPaginator
+from .models import DOCTOR_FIELDS, Appointment, Doctor, Customer, User, current_time
 
 # Register other models as needed
 
 class CustomAdminSite(admin.AdminSite):
     def index(self, request, extra_context=None):
         extra_context = extra_context or {}
-        extra_context['user_count'] = Doctor.objects.count() + Customer.objects.count()
+        # Read from the rollups only, see appointment.stats
+        extra_context.update(stats.dashboard())
         return super().index(request, extra_context=extra_context)
 
 
+def export_csv_action(kind):
+    """Admin action streaming the selected rows as CSV in the import_data format."""
+    @admin.action(description=f'Export selected {kind} as CSV')
+    def export_csv(modeladmin, request, queryset):
+        response = StreamingHttpResponse(bulk.export_lines(kind, 'csv', queryset), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{kind}.csv"'
+        return response
+    return export_csv
+
+
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'gender', 'phone_no')
+    # The doctor profile and working hours share the user row
+    exclude = DOCTOR_FIELDS
+
+    list_filter = ['gender']
+
+    search_fields = ['^first_name', '^last_name', '=phone_no']
+    actions = [export_csv_action('customers')]
+    list_per_page = 100
+    show_full_result_count = False
+
+
+def outdated_q():
+    """Same cut-off as Appointment.is_outdated, as a filter."""
+    return Q(starts_at__lte=current_time())
+
+
+class OutdatedFilter(admin.SimpleListFilter):
+    title = 'Is Outdated?'
+    parameter_name = 'outdated'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Past'), ('no', 'Upcoming')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(outdated_q())
+        if self.value() == 'no':
+            return queryset.exclude(outdated_q())
 
-    list_filter = ['first_name', 'last_name', 'gender', 'phone_no']
 
-    search_fields = ['first_name', 'last_name', 'gender', 'phone_no']
+class WorkingDayFilter(admin.SimpleListFilter):
+    title = 'Is in working day?'
+    parameter_name = 'working_day'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Yes'), ('no', 'No')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(weekday__lte=5)
+        if self.value() == 'no':
+            return queryset.filter(weekday__gt=5)
+
+
+class SpecializationFilter(admin.SimpleListFilter):
+    title = 'Specialization'
+    parameter_name = 'specialization'
+
+    def lookups(self, request, model_admin):
+        # Distinct over doctors only (served by user_doctor_listing_idx), never appointments
+        specializations = Doctor.objects.order_by('specialization').values_list('specialization', flat=True).distinct()
+        return [(value, value) for value in specializations]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(doctor__specialization=self.value())
+
 
 class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ('start_time', 'end_time', 'date', 'doctor', 'is_outdated',
-                    'is_working_day_appointment')
+    list_display = ('start_time', 'end_time', 'date', 'doctor', 'customer', 'is_outdated',
+                    'is_working_day_appointment', 'weekday')
+    # Doctor and customer come from the same query as the page
+    list_select_related = ('doctor', 'customer')
+
+    list_filter = [OutdatedFilter, WorkingDayFilter, 'is_approved', 'is_cancelled', 'is_completed',
+                   SpecializationFilter]
+
+    search_fields = ['^doctor__first_name', '^doctor__last_name', '^customer__first_name', '^customer__last_name']
+    date_hierarchy = 'date'
+    raw_id_fields = ('doctor', 'customer')
+    actions = [export_csv_action('appointments')]
+    list_per_page = 100
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            outdated=Case(When(outdated_q(), then=Value(True)), default=Value(False), output_field=BooleanField()),
+            weekday=ExtractIsoWeekDay('date'),
+        )
+
+    @admin.display(boolean=True, ordering='outdated', description='Is Outdated?')
+    def is_outdated(self, obj):
+        return obj.outdated
 
-    list_filter = ['start_time', 'end_time', 'date', 'doctor']
+    @admin.display(boolean=True, ordering='weekday', description='Is in working day?')
+    def is_working_day_appointment(self, obj):
+        return obj.weekday <= 5
 
-    search_fields = ['start_time', 'end_time', 'date', 'doctor']
+    @admin.display(ordering='weekday', description='Weekday')
+    def weekday(self, obj):
+        return calendar.day_abbr[obj.weekday - 1]
 
 
 class DoctorAdmin(admin.ModelAdmin):
+    form = DoctorAdminForm
     list_display = ('first_name', 'last_name', 'specialization', 'location', 'fee', 'is_approved')
-    list_filter = ['first_name', 'last_name', 'specialization', 'location', 'fee', 'is_approved']
-    search_fields = ['first_name', 'last_name', 'specialization', 'location', 'fee', 'is_approved']
+    list_filter = ['is_approved', 'specialization']
+    search_fields = ['^first_name', '^last_name', '^specialization', '^location']
+    actions = [export_csv_action('doctors')]
+    list_per_page = 100
+    show_full_result_count = False
 
 
 admin_site = CustomAdminSite(name='customadmin')
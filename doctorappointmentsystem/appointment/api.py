@@ -0,0 +1,230 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views import View
+from django.views.csrf import csrf_failure as html_csrf_failure
+
+from . import availability, versions
+from .directory import FILTER_PARAMS
+from .filters import DoctorFilter
+from .middlewareFiles.LoginRequiredMiddleware import is_json_path
+from .forms import AppointmentApiForm
+from .models import Appointment, Doctor, DoctorSearchIndex
+from .pagination import KeysetPaginator, RankedPaginator
+from .views import AppointmentTimelineMixin
+
+API_PAGE_SIZE = 20
+
+DIRECTORY_VALUES = ['doctor', 'first_name', 'last_name', 'specialization', 'location', 'fee']
+DOCTOR_VALUES = [
+    'id', 'first_name', 'last_name', 'specialization', 'location', 'experience', 'fee',
+    'work_start', 'work_end', 'slot_minutes',
+]
+APPOINTMENT_VALUES = [
+    'id', 'date', 'start_time', 'end_time', 'starts_at', 'is_approved', 'is_completed', 'is_cancelled',
+    'doctor_id', 'customer_id',
+]
+
+
+class VersionedResource(View):
+    """
+    Read-only JSON resource with a strong ETag built from the
+    ``ResourceVersion`` counters it depends on. A matching If-None-Match is
+    answered with 304 after that single version lookup, before the
+    representation is built. Resources that name one row (see resource())
+    check it exists in that same lookup, so a deleted or unknown id is a
+    404 even when If-None-Match matches.
+    """
+
+    def version_keys(self, **kwargs):
+        raise NotImplementedError
+
+    def resource(self, **kwargs):
+        """A queryset that must have a row for the resource to exist; None for collections."""
+        return None
+
+    def etag_parts(self, **kwargs):
+        """Anything besides the versions the representation depends on."""
+        return []
+
+    def payload(self, **kwargs):
+        raise NotImplementedError
+
+    def check_access(self, **kwargs):
+        pass
+
+    def etag(self, **kwargs):
+        keys = self.version_keys(**kwargs)
+        resource = self.resource(**kwargs)
+        if resource is None:
+            current = versions.get(*keys)
+        else:
+            current = versions.get_for(resource, *keys)
+            if current is None:
+                raise Http404(f'{resource.model._meta.verbose_name.capitalize()} does not exist.')
+        raw = json.dumps([keys, current, self.etag_parts(**kwargs)], cls=DjangoJSONEncoder)
+        return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+    def get(self, request, **kwargs):
+        self.check_access(**kwargs)
+        etag = self.etag(**kwargs)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse(self.payload(**kwargs))
+        response['ETag'] = etag
+        # Cacheable by the client only, and always revalidated
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def page_payload(page, rows):
+    return {'results': rows, 'next': page.next_cursor, 'previous': page.previous_cursor}
+
+
+class DoctorListApi(VersionedResource):
+    """Approved doctors, filtered like the directory page."""
+    query_budget = 5
+
+    def version_keys(self, **kwargs):
+        return [versions.DIRECTORY]
+
+    def etag_parts(self, **kwargs):
+        params = self.request.GET
+        return [{name: params[name] for name in FILTER_PARAMS if params.get(name)}, params.get('cursor', '')]
+
+    def payload(self, **kwargs):
+        doctor_filter = DoctorFilter(self.request.GET, queryset=DoctorSearchIndex.objects.filter(is_approved=True))
+        doctors = doctor_filter.qs.values(*DIRECTORY_VALUES)
+        if doctor_filter.ranked_ids is not None:
+            paginator = RankedPaginator(doctors, API_PAGE_SIZE, doctor_filter.ranked_ids)
+        else:
+            paginator = KeysetPaginator(doctors, API_PAGE_SIZE, ['specialization', 'last_name', 'pk'])
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return page_payload(page, [{'id': row.pop('doctor'), **row} for row in page])
+
+
+class DoctorDetailApi(VersionedResource):
+    query_budget = 4
+
+    def version_keys(self, doctor_pk):
+        return [versions.doctor_key(doctor_pk)]
+
+    def resource(self, doctor_pk):
+        return Doctor.objects.filter(pk=doctor_pk)
+
+    def payload(self, doctor_pk):
+        doctor = Doctor.objects.filter(pk=doctor_pk).values(
+            *DOCTOR_VALUES,
+            review_count=F('review_stats__review_count'),
+            rating_count=F('review_stats__rating_count'),
+            rating_sum=F('review_stats__rating_sum'),
+        ).first()
+        if doctor is None:
+            raise Http404('Doctor does not exist.')
+        rating_count, rating_sum = doctor.pop('rating_count'), doctor.pop('rating_sum')
+        doctor['review_count'] = doctor['review_count'] or 0
+        doctor['average_rating'] = round(rating_sum / rating_count, 1) if rating_count else None
+        return doctor
+
+
+class DoctorAvailabilityApi(VersionedResource):
+    query_budget = 5
+
+    def days(self):
+        try:
+            return int(self.request.GET.get('days', 7))
+        except ValueError:
+            return 7
+
+    def version_keys(self, doctor_pk):
+        # Working hours come from the doctor, bookings from their schedule
+        return [versions.doctor_key(doctor_pk), versions.schedule_key(doctor_pk)]
+
+    def resource(self, doctor_pk):
+        return Doctor.objects.filter(pk=doctor_pk)
+
+    def etag_parts(self, doctor_pk):
+        # Slots drop out as they start, so the answer changes by the minute
+        return [availability.local_now().replace(second=0, microsecond=0), self.days()]
+
+    def payload(self, doctor_pk):
+        doctor = get_object_or_404(Doctor.objects.only('work_start', 'work_end', 'slot_minutes'), pk=doctor_pk)
+        slots = availability.free_slots(doctor, days=self.days())
+        return {
+            'doctor': doctor.pk,
+            'slot_minutes': doctor.slot_minutes,
+            'free_slots': {
+                date.isoformat(): [[start.strftime('%H:%M'), end.strftime('%H:%M')] for start, end in day_slots]
+                for date, day_slots in slots.items()
+            },
+        }
+
+
+class UserAppointmentsApi(AppointmentTimelineMixin, VersionedResource):
+    """The signed-in customer's or doctor's own appointments, ``?when=`` as on the HTML pages."""
+    query_budget = 4
+
+    def check_access(self, user_pk):
+        if self.request.user.pk != user_pk:
+            raise Http404('Appointments not found.')
+
+    def version_keys(self, user_pk):
+        if self.request.user.is_doctor():
+            return [versions.schedule_key(user_pk)]
+        return [versions.customer_key(user_pk)]
+
+    def etag_parts(self, user_pk):
+        # Which appointments are upcoming or past moves with the clock;
+        # appointments start on whole minutes
+        now = timezone.now().replace(second=0, microsecond=0)
+        return [self.request.GET.get('when', ''), self.request.GET.get('cursor', ''), now]
+
+    def payload(self, user_pk):
+        owner = 'doctor_id' if self.request.user.is_doctor() else 'customer_id'
+        appointments = self.timeline(Appointment.objects.filter(**{owner: user_pk})).values(
+            *APPOINTMENT_VALUES,
+            doctor_first_name=F('doctor__first_name'),
+            doctor_last_name=F('doctor__last_name'),
+            customer_first_name=F('customer__first_name'),
+            customer_last_name=F('customer__last_name'),
+        )
+        page = KeysetPaginator(appointments, API_PAGE_SIZE, self.keyset_ordering).get_page(self.request.GET.get('cursor'))
+        return {'when': self.when, **page_payload(page, page.object_list)}
+
+
+class BookAppointmentApi(View):
+    """
+    Book an appointment for the signed-in customer. Takes ``date``
+    (YYYY-MM-DD), ``start_time`` and ``end_time`` (HH:MM) as form fields and
+    answers 201 with the appointment, or 400 with the errors.
+    """
+    # One of these reads the schedule version sent with the live dashboard event
+    query_budget = 13
+
+    def post(self, request, doctor_pk):
+        if not request.user.is_customer():
+            return JsonResponse({'error': 'Only customers can book appointments.'}, status=403)
+        form = AppointmentApiForm(request.POST)
+        if form.is_valid():
+            form.instance.doctor = get_object_or_404(Doctor.objects.only('pk'), pk=doctor_pk)
+            form.instance.customer_id = request.user.pk
+            try:
+                appointment = availability.book(form.instance)
+            except availability.SlotUnavailable as e:
+                form.add_error(None, e)
+            else:
+                return JsonResponse({name: getattr(appointment, name) for name in APPOINTMENT_VALUES}, status=201)
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+
+
+def csrf_failure(request, reason=''):
+    """CSRF_FAILURE_VIEW: a JSON 403 on the API, Django's page everywhere else."""
+    if is_json_path(request.path_info):
+        return JsonResponse({'error': f'CSRF verification failed: {reason}'}, status=403)
+    return html_csrf_failure(request, reason)
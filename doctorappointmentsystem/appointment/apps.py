@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AppointmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointment'
+
+    def ready(self):
+        import appointment.signals.search_signals  # Keeps the doctor search index in sync
+        import appointment.signals.directory_signals  # Invalidates the cached doctor directory
+        import appointment.signals.stats_signals  # Maintains the admin statistics rollups
+        import appointment.signals.version_signals  # Bumps the JSON API's ETag versions
+        import appointment.signals.event_signals  # Pushes appointment changes to live dashboards
+        import appointment.metrics  # Hooks every database connection for the request metrics
+        import appointment.database  # Applies the SQLite pragmas to every new connection
@@ -0,0 +1,148 @@
+import datetime
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Appointment, Doctor, current_time, is_working_day, start_datetime
+
+MAX_AVAILABILITY_DAYS = 60
+
+
+class SlotUnavailable(ValidationError):
+    pass
+
+
+def _minutes(value):
+    if isinstance(value, str):  # raw SQLite value, 'HH:MM[:SS[.ffffff]]'
+        return int(value[:2]) * 60 + int(value[3:5])
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+def local_now():
+    """Now on the wall clock appointment times are entered in (see models.start_datetime)."""
+    now = current_time()
+    return timezone.localtime(now, timezone.get_default_timezone()) if settings.USE_TZ else now
+
+
+class DayIndex:
+    """
+    Booked intervals of one doctor on one day: start minutes sorted ascending,
+    plus the running maximum of end minutes over that order. An interval
+    [start, end) is free iff every booking starting before ``end`` has already
+    ended by ``start``, i.e. one binary search and one lookup.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.max_ends = []
+        for _, end in intervals:
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    def overlaps(self, start, end):
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.max_ends[i] > start
+
+    def free_slots(self, work_start, work_end, slot_minutes, after=None):
+        """Free slots within working hours, only those starting after minute ``after`` if given."""
+        if slot_minutes <= 0:
+            return []  # Rows saved before slot_minutes was validated
+        slots = []
+        start = work_start
+        if after is not None and start <= after:
+            start += ((after - start) // slot_minutes + 1) * slot_minutes
+        while start + slot_minutes <= work_end:
+            end = start + slot_minutes
+            if not self.overlaps(start, end):
+                slots.append((start, end))
+            start = end
+        return slots
+
+
+class AvailabilityEngine:
+    """
+    Availability of one doctor over a date range, built from a single indexed
+    query on (doctor, date). Only working days (see ``is_working_day``) and the
+    doctor's working hours produce slots, and only those that haven't started
+    yet; cancelled appointments free theirs.
+    """
+
+    def __init__(self, doctor, start_date, days):
+        self.doctor = doctor
+        self.now = local_now()
+        self.start_date = start_date
+        self.days = days
+        self.end_date = start_date + datetime.timedelta(days=days - 1)
+        booked = Appointment.objects.filter(
+            doctor_id=doctor.pk, date__range=(self.start_date, self.end_date), is_cancelled=False,
+        ).order_by().values_list('date', 'start_time', 'end_time')
+        # Executed without the ORM's per-value date/time converters, which
+        # otherwise dominate the cost of a 30-day query.
+        with connections[booked.db].cursor() as cursor:
+            cursor.execute(*booked.query.sql_with_params())
+            rows = cursor.fetchall()
+        intervals = {}
+        for date, start, end in rows:
+            intervals.setdefault(date, []).append((_minutes(start), _minutes(end)))
+        self.index = {
+            datetime.date.fromisoformat(date) if isinstance(date, str) else date: DayIndex(day)
+            for date, day in intervals.items()
+        }
+
+    def day(self, date):
+        return self.index.get(date) or DayIndex()
+
+    def free_slots(self):
+        """Return ``{date: [(start_time, end_time), ...]}`` for every working day."""
+        work_start, work_end = _minutes(self.doctor.work_start), _minutes(self.doctor.work_end)
+        today = self.now.date()
+        result = {}
+        for offset in range(self.days):
+            date = self.start_date + datetime.timedelta(days=offset)
+            if not is_working_day(date) or date < today:
+                continue
+            after = _minutes(self.now) if date == today else None
+            slots = self.day(date).free_slots(work_start, work_end, self.doctor.slot_minutes, after)
+            result[date] = [(_time(start), _time(end)) for start, end in slots]
+        return result
+
+    def check(self, date, start_time, end_time):
+        """Raise SlotUnavailable unless the interval can be booked."""
+        start, end = _minutes(start_time), _minutes(end_time)
+        if start >= end:
+            raise SlotUnavailable('End time must be after the start time.', code='invalid_interval')
+        if start_datetime(date, start_time) <= current_time():
+            raise SlotUnavailable('This time has already passed.', code='in_past')
+        if not is_working_day(date):
+            raise SlotUnavailable('Appointments can only be booked on working days.', code='not_working_day')
+        if start < _minutes(self.doctor.work_start) or end > _minutes(self.doctor.work_end):
+            raise SlotUnavailable("The appointment is outside the doctor's working hours.", code='outside_hours')
+        if self.day(date).overlaps(start, end):
+            raise SlotUnavailable('This time slot is already booked.', code='slot_taken')
+
+
+def free_slots(doctor, days=7, start_date=None):
+    days = max(1, min(days, MAX_AVAILABILITY_DAYS))
+    start_date = start_date or timezone.localdate()
+    return AvailabilityEngine(doctor, start_date, days).free_slots()
+
+
+def book(appointment):
+    """
+    Save ``appointment`` if its slot is free. The doctor row is locked (on
+    backends with SELECT ... FOR UPDATE; SQLite serialises writers anyway) so
+    two concurrent bookings cannot both pass the overlap check.
+    """
+    with transaction.atomic():
+        doctor = Doctor.objects.select_for_update().get(pk=appointment.doctor_id)
+        engine = AvailabilityEngine(doctor, appointment.date, 1)
+        engine.check(appointment.date, appointment.start_time, appointment.end_time)
+        appointment.save()
+    return appointment
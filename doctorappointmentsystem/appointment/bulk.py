@@ -0,0 +1,294 @@
+import csv
+import itertools
+import json
+from collections import Counter
+
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+
+from userauth import outbox
+from userauth.signals.email_signals import welcome_email
+
+from . import search, stats, versions
+from .directory import directory_cache
+from .models import DOCTOR_PROFILE_FIELDS, Appointment, Customer, Doctor, User
+
+CHUNK_SIZE = 2000
+
+# Columns of each kind, in file order. Users also take ``password`` (an
+# already encoded hash, exported with --passwords) or ``raw_password``.
+USER_COLUMNS = ['username', 'first_name', 'last_name', 'gender', 'phone_no', 'email', 'is_active', 'date_joined']
+DOCTOR_COLUMNS = USER_COLUMNS + [
+    'specialization', 'location', 'experience', 'fee', 'is_approved', 'work_start', 'work_end', 'slot_minutes',
+]
+APPOINTMENT_COLUMNS = [
+    'doctor_email', 'customer_email', 'date', 'start_time', 'end_time', 'is_approved', 'is_completed', 'is_cancelled',
+]
+KINDS = {
+    'customers': (Customer, USER_COLUMNS),
+    'doctors': (Doctor, DOCTOR_COLUMNS),
+    'appointments': (Appointment, APPOINTMENT_COLUMNS),
+}
+
+
+def read_rows(file, format):
+    """
+    Yield ``(line, row, error)`` from a CSV (with a header row) or JSON Lines
+    file, one row at a time; a line that can't be parsed comes with an error
+    instead of a row.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, None, 'Expected a JSON object.'
+
+
+def error_message(error):
+    if isinstance(error, ValidationError) and hasattr(error, 'error_dict'):
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+    if isinstance(error, ValidationError):
+        return ' '.join(error.messages)
+    return str(error)
+
+
+def bulk_create_users(model, users):
+    """bulk_create() ``users``, then fill in their pks where the backend can't return ids from a bulk insert."""
+    model.objects.bulk_create(users)
+    if users and users[0].pk is None:
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+        for user in users:
+            user.pk = ids[user.username]
+    return users
+
+
+def fill(instance, row, columns):
+    """Set ``columns`` from ``row``; empty cells keep the field's default."""
+    for name in columns:
+        value = row.get(name)
+        if value is not None and value != '':
+            setattr(instance, name, value)
+    exclude = [field.name for field in instance._meta.fields if field.name not in columns]
+    instance.clean_fields(exclude=exclude)
+
+
+class UserImporter:
+    """
+    Builds Doctor or Customer rows from file rows and creates each chunk with
+    one bulk_create. bulk_create sends no signals, so create() does what the
+    post_save handlers would: statistics, the doctor search index, API
+    versions, the directory cache and (unless turned off) welcome emails.
+    """
+    unique_fields = ['username', 'email', 'phone_no']
+
+    def __init__(self, model, columns, welcome_email=True, hash_iterations=None):
+        self.model = model
+        self.columns = columns
+        self.welcome_email = welcome_email
+        self.hash_iterations = hash_iterations
+        self.hasher = get_hasher()
+        self.user_type = 'D' if model is Doctor else 'C'
+
+    def build(self, row):
+        user = self.model(user_type=self.user_type)
+        fill(user, row, self.columns)
+        user.clean()
+        if self.model is Doctor:
+            # Optional on the model, for customers
+            missing = [name for name in DOCTOR_PROFILE_FIELDS if getattr(user, name) in (None, '')]
+            if missing:
+                raise ValidationError({name: ['This field is required.'] for name in missing})
+        user.password = self.password(row)
+        return user
+
+    def password(self, row):
+        if row.get('password'):
+            try:
+                identify_hasher(row['password'])
+            except ValueError:
+                raise ValidationError({'password': ['Not an encoded password; pass plain text as raw_password.']})
+            return row['password']
+        if row.get('raw_password'):
+            if self.hash_iterations and hasattr(self.hasher, 'iterations'):
+                # Readable by the default hasher, which re-hashes it with the
+                # full iteration count on the user's first sign-in
+                return self.hasher.encode(row['raw_password'], self.hasher.salt(), self.hash_iterations)
+            return self.hasher.encode(row['raw_password'], self.hasher.salt())
+        user = User()
+        user.set_unusable_password()
+        return user.password
+
+    def prepare(self, built):
+        """Drop rows clashing with existing users or earlier rows; one query per unique field."""
+        taken = {
+            name: set(User.objects.filter(**{f'{name}__in': [getattr(user, name) for _, user in built]})
+                      .values_list(name, flat=True))
+            for name in self.unique_fields
+        }
+        kept, bad = [], []
+        for line, user in built:
+            clashes = [name for name in self.unique_fields if getattr(user, name) in taken[name]]
+            if clashes:
+                bad.append((line, f"{', '.join(clashes)} already taken"))
+                continue
+            for name in self.unique_fields:
+                taken[name].add(getattr(user, name))
+            kept.append(user)
+        return kept, bad
+
+    def create(self, users):
+        bulk_create_users(self.model, users)
+        counters = Counter()
+        for user in users:
+            counters.update(stats.user_state(user.user_type, user.is_superuser, user.is_approved))
+        stats.record_counters(counters)
+        if self.model is Doctor:
+            search.index_new_doctors(users)
+            versions.bump(versions.DIRECTORY)
+            transaction.on_commit(directory_cache.invalidate)
+        if self.welcome_email:
+            outbox.enqueue_many(welcome_email(user) for user in users)
+
+    def finish(self):
+        pass
+
+
+class AppointmentImporter:
+    """
+    Builds appointments from file rows, naming doctor and customer by email.
+    Appointments are taken as they are, without the booking rules' slot
+    checks, and send no live dashboard events. API versions are bumped per
+    chunk; historical rows touch so many (date, doctor) rollup rows that the
+    statistics are rebuilt once at the end instead (or with
+    rebuild_admin_stats if the import is interrupted).
+    """
+
+    def build(self, row):
+        appointment = Appointment()
+        fill(appointment, row, APPOINTMENT_COLUMNS)
+        if appointment.end_time <= appointment.start_time:
+            raise ValidationError({'end_time': ['Must be after start_time.']})
+        appointment.doctor_email = row.get('doctor_email') or ''
+        appointment.customer_email = row.get('customer_email') or ''
+        return appointment
+
+    def prepare(self, built):
+        emails = [appointment.doctor_email for _, appointment in built]
+        doctors = dict(Doctor.objects.filter(email__in=emails).values_list('email', 'pk'))
+        emails = [appointment.customer_email for _, appointment in built if appointment.customer_email]
+        customers = dict(Customer.objects.filter(email__in=emails).values_list('email', 'pk'))
+        kept, bad = [], []
+        for line, appointment in built:
+            if appointment.doctor_email not in doctors:
+                bad.append((line, f'No doctor with email {appointment.doctor_email!r}'))
+            elif appointment.customer_email and appointment.customer_email not in customers:
+                bad.append((line, f'No customer with email {appointment.customer_email!r}'))
+            else:
+                appointment.doctor_id = doctors[appointment.doctor_email]
+                appointment.customer_id = customers.get(appointment.customer_email)
+                kept.append(appointment)
+        return kept, bad
+
+    def create(self, appointments):
+        Appointment.objects.bulk_create(appointments)
+        versions.bump_many(
+            [versions.schedule_key(a.doctor_id) for a in appointments]
+            + [versions.customer_key(a.customer_id) for a in appointments if a.customer_id]
+        )
+
+    def finish(self):
+        stats.rebuild()
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, **options):
+    """
+    Import ``rows`` (from read_rows) chunk by chunk, each chunk in its own
+    transaction, so memory stays bounded and an interrupted import keeps the
+    chunks already done. Yields ``(created, bad)`` per chunk, ``bad`` being
+    ``(line, message)`` pairs for the rows that were skipped.
+
+    ``options`` apply to doctors and customers: ``welcome_email`` (default
+    True) and ``hash_iterations``.
+    """
+    model, columns = KINDS[kind]
+    importer = AppointmentImporter() if model is Appointment else UserImporter(model, columns, **options)
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        built, bad = [], []
+        for line, row, error in chunk:
+            if error is None:
+                try:
+                    built.append((line, importer.build(row)))
+                    continue
+                except (ValidationError, ValueError, TypeError) as e:
+                    error = error_message(e)
+            bad.append((line, error))
+        with transaction.atomic():
+            objs, clashes = importer.prepare(built) if built else ([], [])
+            if objs:
+                importer.create(objs)
+        yield len(objs), sorted(bad + clashes)
+    importer.finish()
+
+
+def columns(kind, passwords=False):
+    return KINDS[kind][1] + (['password'] if passwords and kind != 'appointments' else [])
+
+
+def export_rows(kind, queryset=None, passwords=False, chunk_size=CHUNK_SIZE):
+    """
+    Rows of ``kind`` (all of them, or ``queryset``) as dicts of columns(),
+    in the import format, read from the database ``chunk_size`` at a time.
+    """
+    model, names = KINDS[kind]
+    if queryset is None:
+        queryset = model.objects.all()
+    queryset = queryset.order_by('pk')
+    if kind == 'appointments':
+        fields = [name for name in names if not name.endswith('_email')]
+        rows = queryset.values(*fields, doctor_email=F('doctor__email'), customer_email=F('customer__email'))
+    else:
+        rows = queryset.values(*columns(kind, passwords))
+    return rows.iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """A file-like object whose write() returns the value, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.DictWriter(Echo(), fieldnames=columns)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(kind, format, queryset=None, passwords=False):
+    """Export as an iterator of text lines, for a file or a StreamingHttpResponse."""
+    rows = export_rows(kind, queryset, passwords)
+    if format == 'csv':
+        return csv_lines(columns(kind, passwords), rows)
+    return jsonl_lines(rows)
@@ -0,0 +1,69 @@
+from django.db import connections, router
+from django.db.models import F
+
+# Rows per INSERT, well under SQLite's default limit of 999 parameters
+BATCH_SIZE = 100
+
+
+def bump(model, lookup, delta):
+    """Add ``delta`` to the row matching ``lookup``, creating it for positive deltas."""
+    changes = {name: F(name) + value for name, value in delta.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    if any(value < 0 for value in delta.values()):
+        # Row already gone, e.g. deleted in the same cascade as the doctor
+        return
+    _, created = model.objects.get_or_create(**lookup, defaults=delta)
+    if not created:
+        model.objects.filter(**lookup).update(**changes)
+
+
+def increment(model, key_fields, deltas, create_negative=False):
+    """
+    bump() for many rows at once: ``deltas`` maps tuples of ``key_fields``
+    values (a unique key of ``model``) to ``{field: delta}``. Rows are
+    upserted with one INSERT ... ON CONFLICT DO UPDATE per BATCH_SIZE rows
+    where the backend supports it, and bumped one by one elsewhere. Like
+    bump(), missing rows are only created for positive deltas, unless
+    ``create_negative`` (for tables whose rows reference nothing).
+    """
+    deltas = {key: {name: value for name, value in delta.items() if value} for key, delta in deltas.items()}
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    connection = connections[router.db_for_write(model)]
+    if not connection.features.supports_update_conflicts_with_target:
+        for key, delta in deltas.items():
+            bump(model, dict(zip(key_fields, key)), delta)
+        return
+    upserted = {}
+    for key, delta in deltas.items():
+        if create_negative or min(delta.values()) > 0:
+            upserted[key] = delta
+        else:
+            bump(model, dict(zip(key_fields, key)), delta)
+    if upserted:
+        _upsert(connection, model, key_fields, list(upserted.items()))
+
+
+def _upsert(connection, model, key_fields, rows):
+    opts = model._meta
+    quote = connection.ops.quote_name
+    keys = [opts.get_field(name) for name in key_fields]
+    # Every other column; the database has no defaults of its own
+    values = [field for field in opts.concrete_fields if field not in keys and not field.primary_key]
+    table = quote(opts.db_table)
+    columns = ', '.join(quote(field.column) for field in keys + values)
+    updates = ', '.join(f'{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}'
+                        for field in values)
+    placeholders = '(' + ', '.join(['%s'] * (len(keys) + len(values))) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            params = []
+            for key, delta in batch:
+                params += [field.get_db_prep_save(value, connection) for field, value in zip(keys, key)]
+                params += [delta.get(field.name, 0) for field in values]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT ({", ".join(quote(field.column) for field in keys)}) DO UPDATE SET {updates}',
+                params,
+            )
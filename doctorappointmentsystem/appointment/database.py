@@ -0,0 +1,120 @@
+import contextlib
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DEFAULT_DATABASE_ROUTING = {
+    'PRIMARY': 'default',
+    'REPLICA': 'replica',     # reads go here while this alias is in DATABASES
+    'STICKY_SECONDS': 15,     # how long a client reads from the primary after a write
+    'COOKIE': 'db_primary',
+}
+
+# Applied to every new SQLite connection; None leaves a pragma at its default
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',            # readers and the writer no longer block each other
+    'busy_timeout': 5000,             # ms a writer waits for the lock before "database is locked"
+    'synchronous': 'NORMAL',          # fsync at checkpoints only; safe with WAL
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+def get_config():
+    return {**DEFAULT_DATABASE_ROUTING, **getattr(settings, 'DATABASE_ROUTING', {})}
+
+
+def get_pragmas():
+    return {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def tune_sqlite(connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # On the raw connection, so they aren't counted as the request's queries
+    for name, value in get_pragmas().items():
+        if value is not None:
+            connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(tune_sqlite, dispatch_uid='appointment.database.tune_sqlite')
+
+
+class RoutingState:
+    """Whether reads must go to the primary, and whether anything was written."""
+    __slots__ = ('primary', 'wrote')
+
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+
+
+# One state per request (see DatabaseRoutingMiddleware), shared with the
+# worker threads of its async views. Management commands and background
+# workers share the process-wide state, which stays on the primary after
+# their first write.
+_current = contextvars.ContextVar('database_routing', default=None)
+_outside_requests = RoutingState()
+
+
+def current():
+    return _current.get() or _outside_requests
+
+
+def start(primary=False):
+    state = RoutingState(primary)
+    return _current.set(state), state
+
+
+def stop(token):
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block. For filling caches that are
+    invalidated on write, which must not be refilled from a lagging replica.
+    """
+    state = current()
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary. Reads go to the replica, if one is
+    configured, except inside a transaction on the primary, while
+    use_primary() is active, after a write in the same request, and for
+    STICKY_SECONDS after a request that wrote, so clients read their own
+    writes. The replica is a copy kept outside Django; nothing is
+    migrated there.
+    """
+
+    def __init__(self):
+        config = get_config()
+        self.primary = config['PRIMARY']
+        self.replica = config['REPLICA']
+
+    def db_for_read(self, model, **hints):
+        state = current()
+        if (self.replica not in connections or state.primary or state.wrote
+                or connections[self.primary].in_atomic_block):
+            return self.primary
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        current().wrote = True
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {self.primary, self.replica}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db == self.replica else None
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import database, metrics, search
+
+# Doctor fields shown in, or deciding membership of, the public directory.
+# Saving a doctor without changing any of them leaves the cache alone.
+DIRECTORY_FIELDS = [*search.SEARCH_FIELDS, 'fee', 'is_approved']
+FILTER_PARAMS = ['q', *search.SEARCH_FIELDS]
+
+DEFAULT_DIRECTORY_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 600,
+}
+
+GENERATION_KEY = 'directory:generation'
+
+
+class DirectoryCache:
+    """
+    Caches directory pages under ``directory:<generation>:<digest>``. The
+    digest covers the normalised filter parameters and the page cursor;
+    invalidation bumps the generation, so every old page becomes unreachable
+    at once and ages out of the backend's LRU.
+    """
+
+    def __init__(self, config):
+        self.alias = config['ALIAS']
+        self.timeout = config['TIMEOUT']
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def generation(self):
+        # Seeded from the clock so a lost generation never reuses old keys
+        return self.cache.get_or_set(GENERATION_KEY, time.time_ns, timeout=None)
+
+    async def ageneration(self):
+        return await self.cache.aget_or_set(GENERATION_KEY, time.time_ns, timeout=None)
+
+    def digest(self, params, cursor):
+        # Terms as the search sees them, so 'Pune ' and 'pune' share an entry
+        normalised = {
+            name: ' '.join(search.tokenize(params[name]))
+            for name in FILTER_PARAMS if params.get(name)
+        }
+        raw = json.dumps([normalised, cursor or ''], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def key(self, params, cursor):
+        return f'directory:{self.generation()}:{self.digest(params, cursor)}'
+
+    def get_page(self, params, cursor, build):
+        """Return the cached page for ``params``/``cursor``, calling ``build()`` on a miss."""
+        key = self.key(params, cursor)
+        page = self.cache.get(key)
+        metrics.get_registry().cache_lookup('directory', page is not None)
+        if page is not None:
+            return page
+        with database.use_primary():
+            page = build()
+        self.cache.set(key, page, self.timeout)
+        return page
+
+    async def aget_page(self, params, cursor, build):
+        """Async ``get_page``; ``build`` is a coroutine function."""
+        key = f'directory:{await self.ageneration()}:{self.digest(params, cursor)}'
+        page = await self.cache.aget(key)
+        metrics.get_registry().cache_lookup('directory', page is not None)
+        if page is not None:
+            return page
+        with database.use_primary():
+            page = await build()
+        await self.cache.aset(key, page, self.timeout)
+        return page
+
+    def invalidate(self):
+        metrics.get_registry().cache_invalidations.inc('directory')
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+directory_cache = DirectoryCache({**DEFAULT_DIRECTORY_CACHE, **getattr(settings, 'DIRECTORY_CACHE', {})})
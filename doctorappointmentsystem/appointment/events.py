@@ -0,0 +1,177 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import versions
+
+DEFAULT_EVENT_HUB = {
+    'BACKEND': 'appointment.events.LocalHub',
+    'OPTIONS': {},
+}
+
+# Appointment fields sent with every event
+EVENT_FIELDS = [
+    'id', 'date', 'start_time', 'end_time', 'doctor_id', 'customer_id',
+    'is_approved', 'is_completed', 'is_cancelled',
+]
+
+# State flag that turned on -> event name
+STATE_EVENTS = {'is_approved': 'approved', 'is_completed': 'completed', 'is_cancelled': 'cancelled'}
+
+RESYNC = json.dumps({'event': 'resync'})
+
+
+def doctor_channel(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def appointment_status(row):
+    """'cancelled', 'completed', 'approved' or 'pending', the first whose flag is set."""
+    for flag in ['is_cancelled', 'is_completed', 'is_approved']:
+        if row.get(flag):
+            return STATE_EVENTS[flag]
+    return 'pending'
+
+
+class Subscription:
+    """
+    One subscriber's bounded message queue, bound to the event loop it was
+    created on. A subscriber that falls ``queue_size`` messages behind has
+    its backlog replaced by a single RESYNC message.
+    """
+
+    def __init__(self, queue_size):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def deliver(self, message):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalHub:
+    """
+    In-process pub/sub: ``publish`` (thread-safe, callable from sync views
+    and signals) hands each message to the event loop of every subscriber
+    of the channel. Enough for a single ASGI worker and for tests.
+    """
+
+    def __init__(self, options):
+        self.queue_size = options.get('QUEUE_SIZE', 100)
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                pass  # Its loop has closed; the subscriber is going away
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self.lock:
+                self.subscribers[channel].discard(subscription)
+                if not self.subscribers[channel]:
+                    del self.subscribers[channel]
+
+
+class RedisHub(LocalHub):
+    """
+    Relays messages through Redis pub/sub so an event published by any
+    worker reaches subscribers on every worker. Each process keeps one
+    pattern subscription and fans messages out to its local subscribers.
+    Needs the ``redis`` package.
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImproperlyConfigured("RedisHub requires the 'redis' package.") from e
+        self.url = options.get('URL', 'redis://localhost:6379/0')
+        self.prefix = options.get('PREFIX', 'appointment:events:')
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    async def listen(self):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(self.prefix + '*')
+            async for item in pubsub.listen():
+                if item['type'] == 'pmessage':
+                    channel = item['channel'].decode()[len(self.prefix):]
+                    super().publish(channel, item['data'].decode())
+
+    def subscribe(self, channel):
+        # Started lazily on the server's event loop, and again if it died
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        return super().subscribe(channel)
+
+
+_hub = None
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        config = {**DEFAULT_EVENT_HUB, **getattr(settings, 'EVENT_HUB', {})}
+        _hub = import_string(config['BACKEND'])(config['OPTIONS'])
+    return _hub
+
+
+def publish_appointments(event, rows):
+    """
+    Send ``event`` (e.g. 'created', 'approved') for appointment ``rows``
+    (dicts of EVENT_FIELDS) to their doctors' channels, one message per
+    doctor, once the current transaction commits. Each appointment also
+    carries its ``status`` and its doctor's schedule ``version`` after the
+    change, so a dashboard can update its rows in place and ignore stale
+    messages.
+    """
+    per_doctor = {}
+    for row in rows:
+        appointment = {name: row.get(name) for name in EVENT_FIELDS}
+        appointment['status'] = appointment_status(appointment)
+        per_doctor.setdefault(row['doctor_id'], []).append(appointment)
+    if not per_doctor:
+        return
+
+    def send():
+        hub = get_hub()
+        current = versions.get(*[versions.schedule_key(doctor_id) for doctor_id in per_doctor])
+        for (doctor_id, appointments), version in zip(per_doctor.items(), current):
+            hub.publish(doctor_channel(doctor_id), json.dumps(
+                {'event': event, 'appointments': [{**appointment, 'version': version} for appointment in appointments]},
+                cls=DjangoJSONEncoder,
+            ))
+
+    # Robust: a hub outage must not fail a request whose change already committed
+    transaction.on_commit(send, robust=True)
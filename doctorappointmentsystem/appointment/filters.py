@@ -1,12 +1,35 @@
 import django_filters
-from .models import Doctor, Appointment
+from .models import DoctorSearchIndex, Appointment
+from . import search
 
 class DoctorFilter(django_filters.FilterSet):
+    """
+    Prefix search over the denormalised doctor directory. Filtering is
+    delegated to appointment.search, which uses SQLite FTS5 when available.
+    """
+    q = django_filters.CharFilter(label='Search')
+    first_name = django_filters.CharFilter(label='First name')
+    last_name = django_filters.CharFilter(label='Last name')
+    specialization = django_filters.CharFilter(label='Specialization')
+    location = django_filters.CharFilter(label='Location')
+
     class Meta:
-        model = Doctor
-        fields = ['first_name', 'last_name', 'specialization', 'location']
+        model = DoctorSearchIndex
+        fields = ['q', 'first_name', 'last_name', 'specialization', 'location']
+
+    _ranked_ids = None
+
+    @property
+    def ranked_ids(self):
+        """Relevance-ordered doctor ids for free-text searches, None otherwise."""
+        self.qs
+        return self._ranked_ids
+
+    def filter_queryset(self, queryset):
+        queryset, self._ranked_ids = search.filter_directory(queryset, **self.form.cleaned_data)
+        return queryset
         
 class AppointmentFilter(django_filters.FilterSet):
     class Meta:
         model = Appointment
-        fields = ['start_time', 'end_time', 'date', 'is_approved', 'is_completed', 'is_cancelled']
\ No newline at end of file
+        fields = ['start_time', 'end_time', 'date', 'is_approved', 'is_completed', 'is_cancelled']
@@ -1,11 +1,12 @@
-from .models import Appointment, DoctorReview, User
+from .models import DOCTOR_PROFILE_FIELDS, Appointment, Doctor, DoctorReview, User
+from . import images
 from django import forms
 
 
 class DoctorReviewForm(forms.ModelForm):
     class Meta:
         model = DoctorReview
-        fields = ['review']
+        fields = ['rating', 'review']
 
 class AppointmentCreateForm(forms.ModelForm):
     start_time = forms.TimeField(input_formats=['%I:%M %p'])
@@ -14,7 +15,32 @@ class AppointmentCreateForm(forms.ModelForm):
         model = Appointment
         fields = ['start_time', 'end_time', 'date']
 
+class AppointmentApiForm(AppointmentCreateForm):
+    start_time = forms.TimeField(input_formats=['%H:%M', '%H:%M:%S'])
+    end_time = forms.TimeField(input_formats=['%H:%M', '%H:%M:%S'])
+
 class ProfilePic(forms.ModelForm):
     class Meta:
         model = User
-        fields = ['prifile_pic']
\ No newline at end of file
+        fields = ['prifile_pic']
+
+    def clean_prifile_pic(self):
+        upload = self.cleaned_data['prifile_pic']
+        if getattr(upload, 'image', None) is not None:  # a new upload, opened by ImageField
+            images.validate_upload(upload)
+        return upload
+
+class DoctorProfileFormMixin:
+    """Requires the doctor profile fields, which the model leaves optional for customers."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in DOCTOR_PROFILE_FIELDS:
+            if name in self.fields:
+                self.fields[name].required = True
+
+
+class DoctorAdminForm(DoctorProfileFormMixin, forms.ModelForm):
+    class Meta:
+        model = Doctor
+        fields = '__all__'
@@ -0,0 +1,98 @@
+import hashlib
+
+from django import forms
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from django.utils.translation import get_language
+
+from . import metrics
+
+DEFAULT_FRAGMENT_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+    # Part of every key; change it when a cached template changes and the
+    # cache outlives the deploy (anything but the per-process locmem cache)
+    'VERSION': 1,
+}
+
+
+def get_config():
+    return {**DEFAULT_FRAGMENT_CACHE, **getattr(settings, 'FRAGMENT_CACHE', {})}
+
+
+def _field_values(obj, seen):
+    values = [obj._meta.label, *(field.value_from_object(obj) for field in obj._meta.concrete_fields)]
+    # Related rows loaded with select_related are what templates render from
+    for name, related in sorted(obj._state.fields_cache.items()):
+        if related is not None and id(related) not in seen:
+            seen.add(id(related))
+            values.append((name, _field_values(related, seen)))
+    return values
+
+
+def vary_value(value):
+    """
+    What a value contributes to a fragment key. Model instances stand for
+    all their column values and those of the related rows loaded with them,
+    so a fragment keyed on the rows it shows changes whenever one of them
+    is edited, without a version lookup.
+    """
+    if isinstance(value, models.Model):
+        return _field_values(value, {id(value)})
+    if isinstance(value, (list, tuple, models.QuerySet)):
+        return [vary_value(item) for item in value]
+    return value
+
+
+def form_vary_value(form):
+    """
+    A form's class, prefix, initial values and (when bound) data. None for
+    forms whose HTML depends on more: ModelForms editing an existing row.
+    """
+    if isinstance(form, forms.BaseModelForm) and form.instance.pk is not None:
+        return None
+    data = {name: form.data.getlist(form.add_prefix(name)) if hasattr(form.data, 'getlist')
+            else form.data.get(form.add_prefix(name)) for name in form.fields} if form.is_bound else None
+    initial = {name: form.get_initial_for_field(field, name) for name, field in form.fields.items()}
+    return [f'{type(form).__module__}.{type(form).__qualname__}', form.prefix, data, initial]
+
+
+class FragmentCache:
+    """
+    Rendered template fragments under ``fragment:<version>:<name>:<digest>``.
+    The digest covers the values the fragment varies on (see vary_value)
+    and the active language. Nothing is ever invalidated: a change in the
+    data makes a new key, and the old entry ages out of the backend's LRU.
+    """
+
+    def __init__(self, config):
+        self.enabled = config['ENABLED']
+        self.alias = config['ALIAS']
+        self.timeout = config['TIMEOUT']
+        self.version = config['VERSION']
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, name, vary_on):
+        raw = repr([get_language(), [vary_value(value) for value in vary_on]])
+        return f'fragment:{self.version}:{name}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def get_or_render(self, name, vary_on, render):
+        """The cached fragment for ``vary_on``, calling ``render()`` on a miss."""
+        if not self.enabled:
+            return render()
+        key = self.key(name, vary_on)
+        html = self.cache.get(key)
+        metrics.get_registry().cache_lookup('fragment', html is not None)
+        if html is not None:
+            return html
+        html = render()
+        self.cache.set(key, html, self.timeout)
+        return html
+
+
+fragment_cache = FragmentCache(get_config())
@@ -0,0 +1,189 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from userauth.usercache import user_cache
+
+from .models import ProfileImageJob, User
+
+DEFAULT_PROFILE_IMAGES = {
+    'STORAGE': 'default',            # alias in django.core.files.storage.storages
+    'MAX_UPLOAD_BYTES': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000,
+    'FORMATS': ['JPEG', 'PNG', 'WEBP', 'GIF'],
+    'ORIGINAL_SIZE': 1024,           # longest side of the re-encoded original
+    'THUMBNAIL_SIZES': [64, 256],    # square thumbnails
+    'QUALITY': 80,
+}
+
+MAX_ATTEMPTS = 3
+
+
+def get_config():
+    return {**DEFAULT_PROFILE_IMAGES, **getattr(settings, 'PROFILE_IMAGES', {})}
+
+
+def get_storage():
+    return storages[get_config()['STORAGE']]
+
+
+def variant_name(content_hash, size):
+    # Named by the upload's content hash, so a URL never changes meaning and
+    # can be cached forever
+    return f'avatars/{content_hash[:2]}/{content_hash}-{size}.webp'
+
+
+def thumbnail_url(content_hash, size):
+    return get_storage().url(variant_name(content_hash, size))
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploads to a temporary file in chunks and drops files as soon as
+    they pass MAX_UPLOAD_BYTES, instead of reading them to the end; the
+    fields whose files were dropped are listed in ``skipped``. Installed by
+    the views that take profile pictures, before they read request.POST.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.skipped = []
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        self.limit = get_config()['MAX_UPLOAD_BYTES']
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self.file.close()
+            self.skipped.append(self.field_name)
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def upload_too_large():
+    return ValidationError('The image is larger than %(limit)s.', code='too_large',
+                           params={'limit': filesizeformat(get_config()['MAX_UPLOAD_BYTES'])})
+
+
+def validate_upload(upload):
+    """Check an upload already opened by forms.ImageField (``upload.image``)."""
+    config = get_config()
+    if upload.size > config['MAX_UPLOAD_BYTES']:
+        raise upload_too_large()
+    image = upload.image
+    if image.format not in config['FORMATS']:
+        raise ValidationError('Upload a JPEG, PNG, WebP or GIF image.', code='invalid_format')
+    width, height = image.size
+    if width * height > config['MAX_PIXELS']:
+        raise ValidationError('The image has too many pixels.', code='too_many_pixels')
+
+
+def content_hash(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_upload(user, upload):
+    """
+    Stage a validated upload under its content hash and queue it for the
+    worker. The original is never served; until the worker is done the
+    user keeps their previous picture.
+    """
+    digest = content_hash(upload)
+    storage = get_storage()
+    name = f'avatars/uploads/{digest}'
+    if not storage.exists(name):
+        name = storage.save(name, upload)
+    with transaction.atomic():
+        ProfileImageJob.objects.update_or_create(
+            user=user, status=ProfileImageJob.PENDING,
+            defaults={'source': name, 'content_hash': digest, 'attempts': 0, 'last_error': ''},
+        )
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def render_variants(source, config):
+    """Return ``{size: webp bytes}`` for the bounded original and each thumbnail."""
+    original_size = config['ORIGINAL_SIZE']
+    with Image.open(source) as image:
+        if image.width * image.height > config['MAX_PIXELS']:
+            raise ValueError('The image has too many pixels.')
+        # JPEGs can be decoded at a reduced scale, which is much cheaper
+        image.draft('RGB', (original_size, original_size))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+        image.thumbnail((original_size, original_size), Image.LANCZOS)
+        variants = {original_size: image}
+        for size in config['THUMBNAIL_SIZES']:
+            variants[size] = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        encoded = {}
+        for size, variant in variants.items():
+            buffer = BytesIO()
+            variant.save(buffer, 'WEBP', quality=config['QUALITY'], method=4)
+            encoded[size] = buffer.getvalue()
+        return encoded
+
+
+def process(job, config, storage):
+    with storage.open(job.source, 'rb') as source:
+        variants = render_variants(source, config)
+    for size, data in variants.items():
+        name = variant_name(job.content_hash, size)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(data))
+
+    previous = User.objects.filter(pk=job.user_id).values_list('avatar_hash', flat=True).first()
+    User.objects.filter(pk=job.user_id).update(
+        avatar_hash=job.content_hash, prifile_pic=variant_name(job.content_hash, config['ORIGINAL_SIZE']),
+    )
+    # update() sends no post_save, so drop the signed-in user's cached row here
+    user_cache.invalidate(job.user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(job.user_id))
+    if not ProfileImageJob.objects.filter(source=job.source, status=ProfileImageJob.PENDING).exclude(pk=job.pk).exists():
+        storage.delete(job.source)
+    if previous and previous != job.content_hash and not User.objects.filter(avatar_hash=previous).exists():
+        for size in [config['ORIGINAL_SIZE'], *config['THUMBNAIL_SIZES']]:
+            storage.delete(variant_name(previous, size))
+
+
+def drain(batch_size=20, max_attempts=MAX_ATTEMPTS):
+    """
+    Process one batch of pending jobs. Failed jobs are retried up to
+    ``max_attempts`` times, then marked failed. Returns ``(done, failed)``.
+    """
+    batch = list(ProfileImageJob.objects.filter(status=ProfileImageJob.PENDING)[:batch_size])
+    config, storage = get_config(), get_storage()
+    done = failed = 0
+    for job in batch:
+        changes = {'attempts': job.attempts + 1, 'processed_at': timezone.now()}
+        try:
+            with transaction.atomic():
+                process(job, config, storage)
+        except Exception as e:
+            changes['last_error'] = str(e)
+            if changes['attempts'] >= max_attempts:
+                changes['status'] = ProfileImageJob.FAILED
+            failed += 1
+        else:
+            changes.update(status=ProfileImageJob.DONE, last_error='')
+            done += 1
+        # Unless a newer upload replaced the source meanwhile; it stays pending
+        ProfileImageJob.objects.filter(pk=job.pk, source=job.source).update(**changes)
+    return done, failed
@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import io
+import itertools
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from appointment.models import Appointment, Customer, Doctor, DoctorReview
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare WSGI and ASGI throughput and latency of the directory, doctor '
+        'detail and appointment pages under many concurrent slow clients. Both '
+        'stacks run in-process with the full middleware chain: WSGI as a pool '
+        'of --threads worker threads, as a threaded server has, ASGI as a '
+        'single event loop. Each client takes --client-delay seconds to read a '
+        'response, which holds a WSGI thread but not the event loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=300, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=900, help='Requests per server.')
+        parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads.')
+        parser.add_argument('--client-delay', type=float, default=1.0, help='Seconds a client takes to read a response.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--customer', type=int, help='Benchmark as an existing customer instead of synthetic data.')
+        parser.add_argument('--doctor', type=int, help='Doctor whose detail page is requested (with --customer).')
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        self.host = options['host']
+        created = []
+        if options['customer']:
+            customer = Customer.objects.get(pk=options['customer'])
+            doctor = Doctor.objects.get(pk=options['doctor']) if options['doctor'] else Doctor.objects.first()
+        else:
+            customer, doctor = self._synthetic_data(created)
+        client = Client()
+        client.force_login(customer)
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={session_key}'
+        paths = [
+            reverse('index'),
+            reverse('doctor_details', args=[doctor.pk]),
+            reverse('user_appointments', args=[customer.pk]),
+        ]
+        try:
+            results = {
+                server: asyncio.run(self._run(server, paths, options))
+                for server in options['servers']
+            }
+        finally:
+            client.logout()
+            for obj in reversed(created):
+                obj.delete()
+        self._report(results, paths, options)
+
+    def _synthetic_data(self, created):
+        # Committed, so the server threads can see it; deleted afterwards
+        doctor = Doctor.objects.create(
+            username='benchmark-asgi-doctor', first_name='Bench', last_name='Mark',
+            phone_no='+999000000002', email='benchmark-asgi-doctor@example.com',
+            specialization='Benchmark', location='Benchmark', experience='1', fee=0, is_approved=True,
+        )
+        created.append(doctor)
+        customer = Customer.objects.create(
+            username='benchmark-asgi-customer', first_name='Bench', last_name='Customer',
+            phone_no='+999000000003', email='benchmark-asgi-customer@example.com',
+        )
+        created.append(customer)
+        today = timezone.localdate()
+        Appointment.objects.bulk_create([
+            Appointment(doctor=doctor, customer=customer, date=today + datetime.timedelta(days=day),
+                        start_time=datetime.time(10), end_time=datetime.time(10, 30))
+            for day in range(1, 11)
+        ])
+        for rating in range(1, 6):
+            DoctorReview.objects.create(doctor_id=doctor, author=customer, rating=rating, review='Benchmark')
+        return customer, doctor
+
+    async def _run(self, server, paths, options):
+        total, delay = options['requests'], options['client_delay']
+        issued = itertools.count()
+        timings = {path: [] for path in paths}
+        errors = []
+        if server == 'wsgi':
+            handler = WSGIHandler()
+            pool = ThreadPoolExecutor(max_workers=options['threads'])
+            loop = asyncio.get_running_loop()
+
+            async def request(path):
+                return await loop.run_in_executor(pool, self._wsgi_request, handler, path, delay)
+        else:
+            handler = ASGIHandler()
+
+            async def request(path):
+                return await self._asgi_request(handler, path, delay)
+
+        async def client():
+            while (n := next(issued)) < total:
+                path = paths[n % len(paths)]
+                started = time.perf_counter()
+                status = await request(path)
+                timings[path].append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors.append(status)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        elapsed = time.perf_counter() - started
+        if server == 'wsgi':
+            pool.shutdown()
+        return {'elapsed': elapsed, 'timings': timings, 'errors': errors}
+
+    def _wsgi_request(self, handler, path, delay):
+        url = urlsplit(path)
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+            'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host, 'HTTP_COOKIE': self.cookie, 'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            'wsgi.version': (1, 0),
+        }
+        status = []
+        response = handler(environ, lambda line, headers, exc_info=None: status.append(line))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        time.sleep(delay)  # the worker thread writes to a slow client
+        return int(status[0].split()[0])
+
+    async def _asgi_request(self, handler, path, delay):
+        url = urlsplit(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+            'query_string': url.query.encode(), 'server': (self.host, 80), 'client': ('127.0.0.1', 0),
+            'headers': [(b'host', self.host.encode()), (b'cookie', self.cookie.encode())],
+        }
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)  # a slow client only parks this coroutine
+
+        await handler(scope, receive, send)
+        return status[0]
+
+    def _report(self, results, paths, options):
+        self.stdout.write(
+            f"{options['clients']} clients, {options['requests']} requests per server, "
+            f"{options['client_delay'] * 1000:.0f} ms client read time, {options['threads']} WSGI threads"
+        )
+        self.stdout.write(f"{'server':<8}{'route':<32}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for server, result in results.items():
+            for path in paths + ['all']:
+                timings = (
+                    [t for values in result['timings'].values() for t in values]
+                    if path == 'all' else result['timings'][path]
+                )
+                if not timings:
+                    continue
+                timings.sort()
+                p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+                throughput = len(timings) / result['elapsed']
+                errors = len(result['errors']) if path == 'all' else ''
+                self.stdout.write(
+                    f'{server:<8}{path:<32}{throughput:>10.1f}{statistics.median(timings):>10.1f}{p99:>10.1f}{errors:>8}'
+                )
@@ -0,0 +1,72 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from appointment import availability
+from appointment.models import Appointment, Doctor
+
+
+class Command(BaseCommand):
+    help = (
+        'Time 30-day availability queries for one doctor. Without --doctor, a '
+        'synthetic doctor with a fully booked-in-places calendar is created '
+        'inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, help='Benchmark an existing doctor instead of synthetic data.')
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--budget-ms', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['doctor']:
+                doctor = Doctor.objects.get(pk=options['doctor'])
+            else:
+                doctor = self._synthetic_doctor(options['days'])
+            timings = self._run(doctor, options['days'], options['repeat'])
+            transaction.set_rollback(True)
+
+        timings.sort()
+        p50 = statistics.median(timings)
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"{options['days']}-day availability over {options['repeat']} runs: "
+            f"mean {statistics.mean(timings):.2f} ms, p50 {p50:.2f} ms, p99 {p99:.2f} ms"
+        )
+        if p99 > options['budget_ms']:
+            raise CommandError(f"p99 {p99:.2f} ms exceeds the {options['budget_ms']} ms budget")
+        self.stdout.write(self.style.SUCCESS(f"Within the {options['budget_ms']} ms budget."))
+
+    def _run(self, doctor, days, repeat):
+        start_date = datetime.date.today()
+        availability.free_slots(doctor, days=days, start_date=start_date)  # warm up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            availability.free_slots(doctor, days=days, start_date=start_date)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _synthetic_doctor(self, days):
+        doctor = Doctor.objects.create(
+            username='benchmark-availability', first_name='Bench', last_name='Mark',
+            phone_no='+999000000001', email='benchmark-availability@example.com',
+            specialization='Benchmark', location='Benchmark', experience='1', fee=0,
+        )
+        today = datetime.date.today()
+        appointments = []
+        # Every other slot booked for the benchmarked window plus a year of history
+        for offset in range(-365, days):
+            date = today + datetime.timedelta(days=offset)
+            for hour in range(9, 17):
+                appointments.append(Appointment(
+                    doctor=doctor, date=date,
+                    start_time=datetime.time(hour, 0), end_time=datetime.time(hour, 30),
+                ))
+        Appointment.objects.bulk_create(appointments)
+        return doctor
@@ -0,0 +1,90 @@
+import copy
+import re
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from appointment.fragments import fragment_cache
+from appointment.management.commands.benchmark_urls import SCENARIOS, Fixtures
+
+# The pages that render templates, rather than JSON or redirects
+PAGES = [
+    'index', 'index?specialization', 'user_detail', 'change_password', 'user_appointments', 'create_appointment',
+    'write_review', 'doctor_details', 'doctor_dashboard', 'doctor_dashboard?past', 'patient_detail',
+    'login_user', 'register_doctor',
+]
+TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+def uncached_loaders(templates):
+    """settings.TEMPLATES with the cached loaders' inner loaders in their place."""
+    templates = copy.deepcopy(templates)
+    for engine in templates:
+        loaders = engine.get('OPTIONS', {}).get('loaders', [])
+        engine['OPTIONS']['loaders'] = [
+            inner for loader in loaders
+            for inner in (loader[1] if isinstance(loader, tuple) and loader[0].endswith('cached.Loader') else [loader])
+        ]
+        if not engine['OPTIONS']['loaders']:
+            del engine['OPTIONS']['loaders']
+            engine['APP_DIRS'] = True
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the template render time (the tpl entry of Server-Timing) of the '
+        'HTML pages with the uncached template loaders, the cached loader, and the '
+        'cached loader plus fragment caching (see appointment.fragments), on the data '
+        'in the database (see seed_perfdata). Each configuration is warmed up first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per page and configuration.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='+', metavar='LABEL', choices=PAGES, help='Run only these pages.')
+        parser.add_argument('--doctor', type=int)
+        parser.add_argument('--customer', type=int)
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in SCENARIOS if s.label in (options['only'] or PAGES)]
+        fixtures = Fixtures(options['doctor'], options['customer'])
+        configurations = [
+            ('uncached loader', {'TEMPLATES': uncached_loaders(settings.TEMPLATES)}, False),
+            ('cached loader', {}, False),
+            ('+ fragments', {}, True),
+        ]
+        enabled = fragment_cache.enabled
+        results = {}
+        try:
+            for label, overrides, fragments in configurations:
+                fragment_cache.enabled = fragments
+                # Render times are read from Server-Timing
+                metrics = {**getattr(settings, 'METRICS', {}), 'SERVER_TIMING': True, 'ENFORCE_BUDGETS': False}
+                with override_settings(METRICS=metrics, **overrides):
+                    clients = fixtures.clients(options['host'])
+                    for scenario in scenarios:
+                        results[scenario.label, label] = self._time(scenario, clients[scenario.role], fixtures, options)
+        finally:
+            fragment_cache.enabled = enabled
+
+        names = [label for label, _, _ in configurations]
+        self.stdout.write(f"{'template p50 (ms)':<24}" + ''.join(f'{name:>17}' for name in names) + f"{'speed-up':>10}")
+        for scenario in scenarios:
+            times = [results[scenario.label, name] for name in names]
+            speedup = f'{times[0] / times[-1]:.1f}x' if times[-1] else '-'
+            self.stdout.write(f'{scenario.label:<24}' + ''.join(f'{t:>17.2f}' for t in times) + f'{speedup:>10}')
+
+    def _time(self, scenario, client, fixtures, options):
+        path = fixtures.path(scenario)
+        timings = []
+        for i in range(options['warmup'] + options['requests']):
+            response = client.get(path)
+            if response.status_code != scenario.status:
+                raise CommandError(f'{path} answered {response.status_code}, expected {scenario.status}.')
+            if i >= options['warmup']:
+                timings.append(float(dict(TIMING.findall(response['Server-Timing']))['tpl']))
+        return statistics.median(timings)
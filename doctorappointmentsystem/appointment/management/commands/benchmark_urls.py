@@ -0,0 +1,313 @@
+import io
+import json
+import logging
+import platform
+import re
+import resource
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from appointment import availability, metrics
+from appointment import urls as appointment_urls
+from appointment.models import Appointment, Customer, Doctor, DoctorReview, User
+from doctorappointmentsystem import urls as project_urls
+
+# One request to benchmark. ``args`` and ``data`` name attributes of the
+# Fixtures below; ``write`` requests are each rolled back afterwards.
+Scenario = namedtuple('Scenario', 'label name role method args query data status write',
+                      defaults=('get', (), '', None, 200, False))
+
+SCENARIOS = [
+    Scenario('index', 'index', 'customer'),
+    Scenario('index?q', 'index', 'customer', query='?q=sha'),
+    Scenario('index?specialization', 'index', 'customer', query='?specialization=cardio'),
+    Scenario('user_detail', 'user_detail', 'customer', args=('customer',)),
+    Scenario('change_password', 'change_password', 'customer'),
+    Scenario('user_appointments', 'user_appointments', 'customer', args=('customer',)),
+    Scenario('user_appointments?past', 'user_appointments', 'customer', args=('customer',), query='?when=past'),
+    Scenario('create_appointment', 'create_appointment', 'customer', args=('doctor',)),
+    Scenario('create_appointment:post', 'create_appointment', 'customer', 'post', ('doctor',),
+             data='booking_form', status=302, write=True),
+    Scenario('write_review', 'write_review', 'customer', args=('doctor',)),
+    Scenario('write_review:post', 'write_review', 'customer', 'post', ('doctor',),
+             data='review', status=302, write=True),
+    Scenario('doctor_details', 'doctor_details', 'customer', args=('doctor',)),
+    Scenario('doctor_availability', 'doctor_availability', 'customer', args=('doctor',)),
+    Scenario('approve_appointment', 'approve_appointment', 'doctor', args=('appointment',), status=302, write=True),
+    Scenario('complete_appointment', 'complete_appointment', 'doctor', args=('appointment',), status=302, write=True),
+    Scenario('cancel_appointment', 'cancel_appointment', 'doctor', args=('appointment',), status=302, write=True),
+    Scenario('doctor_dashboard', 'doctor_dashboard', 'doctor', args=('doctor',)),
+    Scenario('doctor_dashboard?past', 'doctor_dashboard', 'doctor', args=('doctor',), query='?when=past'),
+    Scenario('doctor_appointment_stream', 'doctor_appointment_stream', 'doctor', args=('doctor',), status=204),
+    Scenario('bulk_appointment_transition', 'bulk_appointment_transition', 'doctor', 'post', ('doctor',),
+             data='bulk_approve', write=True),
+    Scenario('patient_detail', 'patient_detail', 'doctor', args=('customer',)),
+    Scenario('change_profile_pic', 'change_profile_pic', 'customer', 'post', data='picture', status=302, write=True),
+    Scenario('api_doctors', 'api_doctors', 'customer'),
+    Scenario('api_doctors?q', 'api_doctors', 'customer', query='?q=sha'),
+    Scenario('api_doctor_detail', 'api_doctor_detail', 'customer', args=('doctor',)),
+    Scenario('api_doctor_availability', 'api_doctor_availability', 'customer', args=('doctor',)),
+    Scenario('api_book_appointment', 'api_book_appointment', 'customer', 'post', ('doctor',),
+             data='booking_api', status=201, write=True),
+    Scenario('api_user_appointments', 'api_user_appointments', 'customer', args=('customer',)),
+    Scenario('metrics', 'metrics', 'staff'),
+    Scenario('login_user', 'login_user', 'anonymous'),
+    Scenario('login_doctor', 'login_doctor', 'anonymous'),
+    Scenario('register_user', 'register_user', 'anonymous'),
+    Scenario('register_doctor', 'register_doctor', 'anonymous'),
+    Scenario('admin:index', 'admin:index', 'staff'),
+    Scenario('admin:appointment_list', 'admin:appointment_appointment_changelist', 'staff'),
+    Scenario('admin:doctor_list', 'admin:appointment_doctor_changelist', 'staff'),
+    Scenario('admin:customer_list', 'admin:appointment_customer_changelist', 'staff'),
+]
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+SAVEPOINT = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def named_urls():
+    """Names of the URL patterns in appointment/urls.py and doctorappointmentsystem/urls.py."""
+    patterns = appointment_urls.urlpatterns + project_urls.urlpatterns
+    return {pattern.name for pattern in patterns if getattr(pattern, 'name', None)}
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+class Fixtures:
+    """The seeded rows the scenarios are run against: the busiest doctor and their busiest patient."""
+
+    def __init__(self, doctor=None, customer=None):
+        appointments = Appointment.objects.order_by()
+        if doctor is None:
+            busiest = (appointments.filter(doctor__is_approved=True).values('doctor')
+                       .annotate(n=Count('id')).order_by('-n').first())
+            if busiest is None:
+                raise CommandError('No appointments to benchmark; run seed_perfdata first.')
+            doctor = busiest['doctor']
+        self.doctor = Doctor.objects.get(pk=doctor)
+        if customer is None:
+            busiest = (appointments.filter(doctor=self.doctor, customer__isnull=False).values('customer')
+                       .annotate(n=Count('id')).order_by('-n').first())
+            customer = busiest['customer'] if busiest else Customer.objects.values_list('pk', flat=True).first()
+        self.customer = Customer.objects.get(pk=customer)
+        self.staff = User.objects.filter(is_staff=True, is_active=True).order_by('pk').first()
+
+        pending = Appointment.objects.filter(doctor=self.doctor, is_approved=False, is_cancelled=False).upcoming()
+        self.appointment = pending.first()
+        self.pending_ids = list(pending.values_list('pk', flat=True)[:10])
+        slot = next(((day, start, end) for day, slots in sorted(availability.free_slots(self.doctor, days=30).items())
+                     for start, end in slots), None)
+        if slot is None:
+            raise CommandError(f'{self.doctor} has no free slot in the next 30 days; pass another --doctor.')
+        day, start, end = slot
+        self.booking_form = {'date': day, 'start_time': start.strftime('%I:%M %p'), 'end_time': end.strftime('%I:%M %p')}
+        self.booking_api = {'date': day, 'start_time': start.strftime('%H:%M'), 'end_time': end.strftime('%H:%M')}
+        self.review = {'review': 'Benchmark review.', 'rating': 5}
+        self.bulk_approve = {'action': 'approve', 'ids': self.pending_ids}
+        image = io.BytesIO()
+        Image.new('RGB', (640, 480), 'teal').save(image, 'JPEG')
+        self.image = image.getvalue()
+
+    @property
+    def picture(self):
+        upload = io.BytesIO(self.image)
+        upload.name = 'benchmark.jpg'
+        return {'prifile_pic': upload}
+
+    def clients(self, host):
+        """A test client per scenario role, signed in as the fixture user."""
+        clients = {'anonymous': Client(HTTP_HOST=host)}
+        for role, user in [('customer', self.customer), ('doctor', self.doctor), ('staff', self.staff)]:
+            if user is not None:
+                clients[role] = Client(HTTP_HOST=host)
+                clients[role].force_login(user)
+        return clients
+
+    def path(self, scenario):
+        return reverse(scenario.name, args=[getattr(self, arg).pk for arg in scenario.args]) + scenario.query
+
+    def counts(self):
+        return {
+            'doctors': Doctor.objects.count(),
+            'customers': Customer.objects.count(),
+            'appointments': Appointment.objects.count(),
+            'reviews': DoctorReview.objects.count(),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every named URL of appointment/urls.py and doctorappointmentsystem/urls.py '
+        'through the test client, with the full middleware chain, against the data in the '
+        'database (see seed_perfdata). Reports latency percentiles, queries (from the '
+        'Server-Timing header) against each view\'s query budget, and the peak Python '
+        'memory allocated by one request. Requests that write are each rolled back (their '
+        'savepoints are not counted as queries), so on_commit work never runs for them. '
+        'Write the results with --output and compare two runs with --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='+', metavar='LABEL', help='Run only these scenarios.')
+        parser.add_argument('--doctor', type=int, help='Default: the approved doctor with most appointments.')
+        parser.add_argument('--customer', type=int, help="Default: that doctor's most frequent patient.")
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='A JSON file from an earlier --output to compare against.')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in SCENARIOS if not options['only'] or s.label in options['only']]
+        missing = named_urls() - {s.name for s in SCENARIOS}
+        if missing:
+            self.stderr.write(f"No scenario for: {', '.join(sorted(missing))}")
+        fixtures = Fixtures(options['doctor'], options['customer'])
+        overrides = {
+            # The query count is read from Server-Timing; budgets are reported, not enforced
+            'METRICS': {**getattr(settings, 'METRICS', {}), 'SERVER_TIMING': True, 'ENFORCE_BUDGETS': False},
+            # Uploaded pictures are staged in memory rather than under MEDIA_ROOT
+            'STORAGES': {**settings.STORAGES, 'benchmark': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}},
+            'PROFILE_IMAGES': {**getattr(settings, 'PROFILE_IMAGES', {}), 'STORAGE': 'benchmark'},
+        }
+        results = {}
+        # Over-budget views are marked in the report instead of logged per request
+        logger, level = metrics.logger, metrics.logger.level
+        logger.setLevel(logging.ERROR)
+        with override_settings(**overrides):
+            clients = fixtures.clients(options['host'])
+            for scenario in scenarios:
+                if scenario.role not in clients or (scenario.args == ('appointment',) and fixtures.appointment is None):
+                    self.stderr.write(f'{scenario.label}: skipped, no {scenario.args[0] if scenario.args else scenario.role}')
+                    continue
+                results[scenario.label] = self._run(scenario, clients[scenario.role], fixtures, options)
+            for client in clients.values():
+                client.logout()
+        logger.setLevel(level)
+
+        report = {
+            'meta': {
+                'commit': self._commit(),
+                'created': timezone.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'data': fixtures.counts(),
+                # Whole process, in kB; includes loading the fixtures
+                'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            },
+            'urls': results,
+        }
+        self._print(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Wrote {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as f:
+                self._compare(json.load(f)['urls'], results)
+
+    def _request(self, scenario, client, fixtures):
+        path = fixtures.path(scenario)
+        data = getattr(fixtures, scenario.data) if scenario.data else {}
+        savepoints = 0
+        started = time.perf_counter()
+        if scenario.write:
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                response = getattr(client, scenario.method)(path, data, HTTP_REFERER='/')
+                transaction.set_rollback(True)
+            # Inside the rollback transaction every atomic block in the view
+            # adds a savepoint and its release; production runs none of them
+            savepoints = sum(query['sql'].startswith(SAVEPOINT) for query in captured.captured_queries)
+        else:
+            response = getattr(client, scenario.method)(path, data)
+        elapsed = (time.perf_counter() - started) * 1000
+        match = QUERIES.search(response.get('Server-Timing', ''))
+        return path, response.status_code, elapsed, int(match.group(1)) - savepoints if match else None
+
+    def _run(self, scenario, client, fixtures, options):
+        for _ in range(options['warmup']):
+            self._request(scenario, client, fixtures)
+        timings, queries = [], set()
+        for _ in range(options['requests']):
+            path, status, elapsed, count = self._request(scenario, client, fixtures)
+            if status != scenario.status:
+                self.stderr.write(f'{scenario.label}: {path} answered {status}, expected {scenario.status}')
+                break
+            timings.append(elapsed)
+            queries.add(count)
+        tracemalloc.start()
+        try:
+            self._request(scenario, client, fixtures)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        timings.sort()
+        result = {
+            'name': scenario.name,
+            'method': scenario.method.upper(),
+            'path': path,
+            'status': status,
+            'budget': metrics.budget_of(resolve(path.split('?')[0]).func, scenario.method),
+            'queries': max((count for count in queries if count is not None), default=None),
+            'peak_kb': round(peak / 1024, 1),
+        }
+        if timings:
+            result.update({
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'max_ms': round(timings[-1], 3),
+            })
+        return result
+
+    def _commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                  text=True, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def _print(self, results):
+        self.stdout.write(f"{'scenario':<32}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'budget':>8}{'peak kB':>9}")
+        for label, result in results.items():
+            if 'p50_ms' not in result:
+                self.stdout.write(f"{label:<32}{'failed with ' + str(result['status']):>27}")
+                continue
+            over = '!' if result['budget'] is not None and (result['queries'] or 0) > result['budget'] else ''
+            self.stdout.write(
+                f"{label:<32}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{str(result['queries']) + over:>9}{str(result['budget']):>8}{result['peak_kb']:>9.0f}"
+            )
+
+    def _compare(self, before, after):
+        self.stdout.write(f"{'scenario':<32}{'p50 before':>12}{'p50 after':>11}{'change':>9}{'queries':>10}")
+        for label in sorted(before.keys() & after.keys()):
+            old, new = before[label], after[label]
+            if 'p50_ms' not in old or 'p50_ms' not in new:
+                continue
+            change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            self.stdout.write(
+                f"{label:<32}{old['p50_ms']:>12.2f}{new['p50_ms']:>11.2f}{change:>+8.0f}%"
+                f"{str(old['queries']) + '->' + str(new['queries']):>10}"
+            )
+        for label in sorted(before.keys() ^ after.keys()):
+            self.stdout.write(f"{label:<32}{'only before' if label in before else 'only after':>12}")
@@ -0,0 +1,151 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'Neurology', 'Orthopedics', 'Pediatrics']
+
+# Both layouts as they look in the database, trimmed to the columns the
+# benchmarked queries touch. 'multi' is the old Doctor(User)/Customer(User)
+# multi-table inheritance, 'single' the current user_type-partitioned table.
+SCHEMA = {
+    'multi': [
+        "CREATE TABLE bench_multi_user (id integer PRIMARY KEY, user_type varchar(1) NOT NULL, "
+        "first_name varchar(50) NOT NULL, last_name varchar(50) NOT NULL, email varchar(254) NOT NULL)",
+        "CREATE TABLE bench_multi_doctor (user_ptr_id integer PRIMARY KEY REFERENCES bench_multi_user (id), "
+        "specialization varchar(50) NOT NULL, location varchar(50) NOT NULL, fee integer NOT NULL, "
+        "is_approved boolean NOT NULL)",
+        "CREATE TABLE bench_multi_customer (user_ptr_id integer PRIMARY KEY REFERENCES bench_multi_user (id))",
+    ],
+    'single': [
+        "CREATE TABLE bench_single_user (id integer PRIMARY KEY, user_type varchar(1) NOT NULL, "
+        "first_name varchar(50) NOT NULL, last_name varchar(50) NOT NULL, email varchar(254) NOT NULL, "
+        "specialization varchar(50) NOT NULL, location varchar(50) NOT NULL, fee integer NULL, "
+        "is_approved boolean NOT NULL)",
+        "CREATE INDEX bench_single_doctor_idx ON bench_single_user (specialization, last_name, id) WHERE user_type = 'D'",
+        "CREATE INDEX bench_single_customer_idx ON bench_single_user (last_name, id) WHERE user_type = 'C'",
+    ],
+}
+
+QUERIES = {
+    'multi': {
+        'list': (
+            "SELECT u.id, u.first_name, u.last_name, d.specialization, d.location, d.fee "
+            "FROM bench_multi_doctor d JOIN bench_multi_user u ON u.id = d.user_ptr_id "
+            "WHERE u.user_type = 'D' ORDER BY d.specialization, u.last_name, u.id LIMIT 20"
+        ),
+        'detail': (
+            "SELECT u.id, u.first_name, u.last_name, u.email, d.specialization, d.location, d.fee, d.is_approved "
+            "FROM bench_multi_doctor d JOIN bench_multi_user u ON u.id = d.user_ptr_id "
+            "WHERE u.user_type = 'D' AND d.user_ptr_id = %s"
+        ),
+        'save': [
+            "UPDATE bench_multi_user SET first_name = first_name, last_name = last_name, email = email WHERE id = %s",
+            "UPDATE bench_multi_doctor SET location = location, fee = fee + 1 WHERE user_ptr_id = %s",
+        ],
+        'count': [
+            "SELECT COUNT(*) FROM bench_multi_doctor d JOIN bench_multi_user u ON u.id = d.user_ptr_id WHERE u.user_type = 'D'",
+            "SELECT COUNT(*) FROM bench_multi_customer c JOIN bench_multi_user u ON u.id = c.user_ptr_id WHERE u.user_type = 'C'",
+        ],
+    },
+    'single': {
+        'list': (
+            "SELECT id, first_name, last_name, specialization, location, fee FROM bench_single_user "
+            "WHERE user_type = 'D' ORDER BY specialization, last_name, id LIMIT 20"
+        ),
+        'detail': (
+            "SELECT id, first_name, last_name, email, specialization, location, fee, is_approved "
+            "FROM bench_single_user WHERE user_type = 'D' AND id = %s"
+        ),
+        'save': [
+            "UPDATE bench_single_user SET first_name = first_name, last_name = last_name, email = email, "
+            "location = location, fee = fee + 1 WHERE id = %s",
+        ],
+        'count': [
+            "SELECT COUNT(*) FROM bench_single_user WHERE user_type IN ('D', 'C')",
+        ],
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare list, detail, save and count costs of the old multi-table '
+        'Doctor/Customer layout with the single user table, on synthetic users '
+        'created inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--doctor-every', type=int, default=10, help='Every Nth user is a doctor.')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        users, every = int(options['users']), int(options['doctor_every'])
+        doctor_ids = list(range(every, users + 1, every))
+        results = {}
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for layout in SCHEMA:
+                    started = time.perf_counter()
+                    self._populate(cursor, layout, users, every)
+                    self.stdout.write(f'{layout}: loaded {users} users in {time.perf_counter() - started:.1f} s')
+                rng = random.Random(0)
+                ids = [rng.choice(doctor_ids) for _ in range(options['repeat'])]
+                for layout, queries in QUERIES.items():
+                    results[layout] = {
+                        operation: self._time(cursor, sql, ids) for operation, sql in queries.items()
+                    }
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'operation':<10}{'multi p50':>12}{'single p50':>12}{'speed-up':>10}")
+        for operation in QUERIES['multi']:
+            before, after = results['multi'][operation], results['single'][operation]
+            self.stdout.write(f'{operation:<10}{before:>10.3f}ms{after:>10.3f}ms{before / after:>9.1f}x')
+
+    def _populate(self, cursor, layout, users, every):
+        for statement in SCHEMA[layout]:
+            cursor.execute(statement)
+        # No query parameters below, so '%' is SQL's modulo operator
+        series = f'WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {users}) '
+        kind = f"CASE WHEN n % {every} = 0 THEN 'D' ELSE 'C' END"
+        specialization = f'CASE (n / {every}) % 5 ' + ' '.join(
+            f"WHEN {i} THEN '{name}'" for i, name in enumerate(SPECIALIZATIONS)
+        ) + ' END'
+        name = "'Name' || (n * 7919 % 100003)"
+        if layout == 'single':
+            cursor.execute(
+                "INSERT INTO bench_single_user (id, user_type, first_name, last_name, email, "
+                "specialization, location, fee, is_approved) " + series +
+                f"SELECT n, {kind}, {name}, {name}, 'user' || n || '@example.com', "
+                f"CASE WHEN n % {every} = 0 THEN {specialization} ELSE '' END, "
+                f"CASE WHEN n % {every} = 0 THEN 'City' || (n % 50) ELSE '' END, "
+                f"CASE WHEN n % {every} = 0 THEN 100 + n % 400 END, n % 2 = 0 FROM seq"
+            )
+            return
+        cursor.execute(
+            "INSERT INTO bench_multi_user (id, user_type, first_name, last_name, email) " + series +
+            f"SELECT n, {kind}, {name}, {name}, 'user' || n || '@example.com' FROM seq"
+        )
+        cursor.execute(
+            "INSERT INTO bench_multi_doctor (user_ptr_id, specialization, location, fee, is_approved) "
+            f"SELECT id, {specialization.replace('(n /', '(id /')}, 'City' || (id % 50), 100 + id % 400, id % 2 = 0 "
+            "FROM bench_multi_user WHERE user_type = 'D'"
+        )
+        cursor.execute(
+            "INSERT INTO bench_multi_customer (user_ptr_id) SELECT id FROM bench_multi_user WHERE user_type = 'C'"
+        )
+
+    def _time(self, cursor, sql, ids):
+        statements = sql if isinstance(sql, list) else [sql]
+        timings = []
+        for pk in ids:
+            started = time.perf_counter()
+            for statement in statements:
+                cursor.execute(statement, [pk] if '%s' in statement else None)
+                if cursor.description:
+                    cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from appointment import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Export doctors, customers or appointments as CSV or JSON Lines in the '
+        'format import_data reads, streaming from the database in chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(bulk.KINDS))
+        parser.add_argument('path', nargs='?', default='-', help='Default: stdout.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension, else jsonl.')
+        parser.add_argument('--passwords', action='store_true', help='Include password hashes, to move accounts.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        lines = bulk.export_lines(options['kind'], format, passwords=options['passwords'])
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = -1 if format == 'csv' else 0  # not counting the header
+        with open(path, 'w', newline='', encoding='utf-8') as target:
+            for line in lines:
+                target.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} {options['kind']}."))
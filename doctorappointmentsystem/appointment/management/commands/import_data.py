@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointment import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Import doctors, customers or appointments from a CSV or JSON Lines file '
+        '(- for stdin), in chunks of bulk inserts. Rows that fail validation or '
+        'clash with existing users are skipped and reported. Appointments name '
+        'their doctor and customer by email, so import users first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(bulk.KINDS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+        parser.add_argument('--no-welcome-email', action='store_true', help="Don't queue welcome emails for imported users.")
+        parser.add_argument(
+            '--hash-iterations', type=int,
+            help='Hash raw_password values with this many PBKDF2 iterations instead of the default; '
+                 'they are upgraded on first sign-in. Pre-hashed password values are always fastest.',
+        )
+        parser.add_argument('--errors', help='Write skipped rows to this file as JSON Lines (line, error).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl' if path != '-' else None)
+        if format is None:
+            raise CommandError('Pass --format when reading from stdin.')
+        errors = open(options['errors'], 'w') if options['errors'] else None
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        created = skipped = shown = 0
+        started = time.perf_counter()
+        try:
+            chunks = bulk.import_rows(
+                options['kind'], bulk.read_rows(source, format), options['chunk_size'],
+                welcome_email=not options['no_welcome_email'], hash_iterations=options['hash_iterations'],
+            )
+            for count, bad in chunks:
+                created += count
+                skipped += len(bad)
+                for line, message in bad:
+                    if errors:
+                        errors.write(json.dumps({'line': line, 'error': message}) + '\n')
+                    elif shown < 20:
+                        self.stderr.write(f'Line {line}: {message}')
+                        shown += 1
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{created} imported, {skipped} skipped, {created / elapsed:.0f} rows/s')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if errors:
+                errors.close()
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} {options['kind']}, skipped {skipped}."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointment import images
+from appointment.models import User
+
+
+class Command(BaseCommand):
+    help = 'Re-encode uploaded profile pictures and make their thumbnails, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--max-attempts', type=int, default=images.MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once no jobs are left.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls with --loop.')
+        parser.add_argument(
+            '--enqueue-existing', action='store_true',
+            help='First queue every picture uploaded before the pipeline existed.',
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_existing']:
+            self.enqueue_existing()
+        while True:
+            done, failed = images.drain(options['batch_size'], options['max_attempts'])
+            if done or failed:
+                self.stdout.write(f'Processed {done}, failed {failed}.')
+            if done + failed < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+    def enqueue_existing(self):
+        storage = images.get_storage()
+        queued = 0
+        legacy = User.objects.filter(avatar_hash='').exclude(prifile_pic='').exclude(prifile_pic__isnull=True)
+        for user in legacy.only('pk', 'prifile_pic').iterator():
+            if not storage.exists(user.prifile_pic.name):
+                continue
+            with storage.open(user.prifile_pic.name, 'rb') as source:
+                images.store_upload(user, source)
+            queued += 1
+        self.stdout.write(f'Queued {queued} existing pictures.')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from appointment import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin statistics rollups from the Appointment and user tables.'
+
+    def handle(self, *args, **options):
+        totals = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt admin stats: {totals['appointments_booked']} appointments, "
+            f"{totals['doctors']} doctors, {totals['customers']} customers."
+        ))
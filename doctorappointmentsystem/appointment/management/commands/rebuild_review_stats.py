@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from appointment.models import DoctorReview, DoctorReviewStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every doctor review aggregate from the DoctorReview table.'
+
+    def handle(self, *args, **options):
+        totals = (
+            DoctorReview.objects.order_by()
+            .values('doctor_id')
+            .annotate(review_count=Count('id'), rating_count=Count('rating'),
+                      rating_sum=Sum('rating'), last_review_at=Max('created_at'))
+        )
+        with transaction.atomic():
+            DoctorReviewStats.objects.all().delete()
+            DoctorReviewStats.objects.bulk_create([
+                DoctorReviewStats(
+                    doctor_id=row['doctor_id'], review_count=row['review_count'],
+                    rating_count=row['rating_count'], rating_sum=row['rating_sum'] or 0,
+                    last_review_at=row['last_review_at'],
+                )
+                for row in totals.iterator()
+            ], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review stats for {DoctorReviewStats.objects.count()} doctors.'))
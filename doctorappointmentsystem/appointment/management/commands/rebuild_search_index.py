@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointment import search
+from appointment.directory import directory_cache
+from appointment.models import Doctor, DoctorSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the doctor search index from the Doctor table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.setup()
+        count = 0
+        with transaction.atomic():
+            backend.clear()
+            DoctorSearchIndex.objects.all().delete()
+            for doctor in Doctor.objects.iterator(chunk_size=options['batch_size']):
+                search.index_doctor(doctor)
+                count += 1
+        directory_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} doctors.'))
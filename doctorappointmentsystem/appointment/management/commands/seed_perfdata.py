@@ -0,0 +1,219 @@
+import datetime
+import itertools
+import math
+import random
+import time
+import zlib
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointment import bulk, search, stats, versions
+from appointment.directory import directory_cache
+from appointment.models import Appointment, Customer, Doctor, DoctorReview, User, is_working_day
+
+# (specialization, relative share of doctors, typical fee)
+SPECIALIZATIONS = [
+    ('General Practice', 30, 300), ('Pediatrics', 12, 500), ('Dermatology', 10, 700), ('Gynecology', 8, 700),
+    ('Cardiology', 8, 1200), ('Orthopedics', 8, 900), ('Psychiatry', 6, 1000), ('ENT', 6, 500),
+    ('Ophthalmology', 6, 600), ('Neurology', 4, 1300), ('Oncology', 2, 1500),
+]
+# Ranked by size; a city's share of users falls off as 1 / rank
+LOCATIONS = [
+    'Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Ahmedabad', 'Chennai', 'Kolkata', 'Pune', 'Jaipur', 'Surat',
+    'Lucknow', 'Kanpur', 'Nagpur', 'Indore', 'Bhopal', 'Patna', 'Vadodara', 'Ludhiana', 'Agra', 'Nashik',
+]
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya',
+    'Rahul', 'Riya', 'Rohan', 'Sanjay', 'Sneha', 'Tanvi', 'Varun', 'Vikram', 'Zara',
+]
+LAST_NAMES = [
+    'Agarwal', 'Bhat', 'Chopra', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Khan', 'Kumar', 'Mehta', 'Menon',
+    'Nair', 'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma',
+]
+# (work_start hour, work_end hour, weight); (slot minutes, weight); (rating, weight)
+WORKING_HOURS = [(9, 17, 70), (8, 16, 15), (10, 18, 10), (14, 20, 5)]
+SLOT_MINUTES = [(30, 60), (15, 20), (20, 15), (60, 5)]
+RATINGS = [(5, 45), (4, 30), (3, 10), (2, 5), (1, 10)]
+REVIEWS = [
+    'Listened carefully and explained everything.', 'Very helpful, would visit again.', 'Long wait, but worth it.',
+    'Quick and to the point.', 'Did not feel heard.', 'Clinic was clean and staff were friendly.',
+    'Diagnosis was spot on.', 'Too expensive for a short visit.',
+]
+PAST_DAYS, FUTURE_DAYS = 365, 60
+
+
+def weighted(rng, pairs):
+    """A function drawing a value from ``(value, weight)`` pairs."""
+    values = [value for value, _ in pairs]
+    cum_weights = list(itertools.accumulate(weight for _, weight in pairs))
+    return lambda: rng.choices(values, cum_weights=cum_weights)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic doctors, customers, appointments and '
+        'reviews for performance work. The same --seed and counts always give '
+        'the same data. Rows are bulk inserted in chunks, so no signals run: '
+        'the search index, statistics, API versions and review aggregates are '
+        'built as import_data builds them, and no emails are sent. Every user '
+        'shares --password; a superuser named <prefix>-admin is created for '
+        'the admin pages.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--appointments', type=int, default=200000)
+        parser.add_argument('--reviews', type=int, default=50000, help='Written for completed appointments.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='perf', help='Usernames and emails start with this.')
+        parser.add_argument('--password', default='perfdata')
+        parser.add_argument('--flush', action='store_true', help='Delete users seeded earlier with --prefix first.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.chunk_size = options['chunk_size']
+        self.password = make_password(options['password'])
+        self.now = timezone.now()
+        self.today = timezone.localdate()
+        # Phone numbers are unique too; keep each prefix's range apart
+        self.phone_base = zlib.crc32(self.prefix.encode()) % 900 + 100
+
+        seeded = User.objects.filter(username__startswith=f'{self.prefix}-')
+        if options['flush']:
+            with transaction.atomic():
+                # Their appointments and reviews in one statement each, without
+                # the per-row delete signals; the statistics are rebuilt below
+                deleted = Appointment.objects.filter(doctor__in=seeded)._raw_delete(connection.alias)
+                deleted += DoctorReview.objects.filter(doctor_id__in=seeded)._raw_delete(connection.alias)
+                deleted += seeded.delete()[0]
+            self.stdout.write(f'Deleted {deleted} rows seeded earlier.')
+            call_command('rebuild_search_index', stdout=self.stdout)
+        elif seeded.exists():
+            raise CommandError(f'Users prefixed {self.prefix!r} already exist; pass --flush or another --prefix.')
+
+        started = time.perf_counter()
+        User.objects.bulk_create([User(
+            username=f'{self.prefix}-admin', email=f'{self.prefix}-admin@example.com', password=self.password,
+            first_name='Perf', last_name='Admin', phone_no=f'+{self.phone_base}0000000000',
+            is_staff=True, is_superuser=True,
+        )])
+        doctors = self._users(Doctor, options['doctors'])
+        customers = self._users(Customer, options['customers'])
+        completed = self._appointments(doctors, customers, options['appointments'])
+        self._reviews(completed, options['reviews'])
+
+        stats.rebuild()
+        call_command('rebuild_review_stats', stdout=self.stdout)
+        versions.bump(versions.DIRECTORY)
+        directory_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f} s (seed {options["seed"]}).'))
+
+    def _chunks(self, objs, label):
+        total = 0
+        for chunk in iter(lambda: list(itertools.islice(objs, self.chunk_size)), []):
+            with transaction.atomic():
+                yield chunk
+            total += len(chunk)
+            self.stdout.write(f'{total} {label}')
+
+    def _users(self, model, count):
+        kind = 'doctor' if model is Doctor else 'customer'
+        rng = self.rng
+        specialization = weighted(rng, [((name, fee), share) for name, share, fee in SPECIALIZATIONS])
+        location = weighted(rng, [(city, 1 / rank) for rank, city in enumerate(LOCATIONS, 1)])
+        hours = weighted(rng, [((start, end), weight) for start, end, weight in WORKING_HOURS])
+        slot_minutes = weighted(rng, SLOT_MINUTES)
+
+        def build(i):
+            user = model(
+                user_type='D' if model is Doctor else 'C', username=f'{self.prefix}-{kind}-{i}',
+                email=f'{self.prefix}-{kind}-{i}@example.com', password=self.password,
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), gender=rng.choice('MF'),
+                phone_no=f"+{self.phone_base}{'1' if model is Doctor else '2'}{i:09d}",
+                date_joined=self.now - datetime.timedelta(days=rng.expovariate(1 / 300)),
+            )
+            if model is Doctor:
+                user.specialization, fee = specialization()
+                user.location = location()
+                # Fees are right-skewed around the specialization's typical fee
+                user.fee = max(100, int(round(rng.lognormvariate(math.log(fee), 0.35), -1)))
+                user.experience = str(int(rng.triangular(1, 40, 8)))
+                user.is_approved = rng.random() < 0.95
+                start, end = hours()
+                user.work_start, user.work_end = datetime.time(start), datetime.time(end)
+                user.slot_minutes = slot_minutes()
+            return user
+
+        created = []
+        for chunk in self._chunks(map(build, range(count)), f'{kind}s'):
+            bulk.bulk_create_users(model, chunk)
+            if model is Doctor:
+                search.index_new_doctors(chunk)
+            created.extend(chunk)
+        return created
+
+    def _appointments(self, doctors, customers, count):
+        """Insert ``count`` appointments; returns ``(doctor_id, customer_id)`` of the completed ones."""
+        rng = self.rng
+        doctors = [doctor for doctor in doctors if doctor.is_approved]
+        if not doctors or not customers:
+            return []
+        # A few doctors and patients account for most bookings
+        doctor_weights = list(itertools.accumulate(rng.paretovariate(1.2) for _ in doctors))
+        customer_weights = list(itertools.accumulate(rng.paretovariate(1.5) for _ in customers))
+        taken = set()
+        completed = []
+
+        def build(_):
+            doctor = rng.choices(doctors, cum_weights=doctor_weights)[0]
+            slot_count = (doctor.work_end.hour - doctor.work_start.hour) * 60 // doctor.slot_minutes
+            for _ in range(10):
+                date = self.today + datetime.timedelta(days=rng.randint(-PAST_DAYS, FUTURE_DAYS))
+                start = doctor.work_start.hour * 60 + rng.randrange(slot_count) * doctor.slot_minutes
+                if is_working_day(date) and (doctor.pk, date, start) not in taken:
+                    break
+            else:
+                return None  # This doctor is fully booked around here
+            taken.add((doctor.pk, date, start))
+            end = start + doctor.slot_minutes
+            appointment = Appointment(
+                doctor_id=doctor.pk, customer_id=rng.choices(customers, cum_weights=customer_weights)[0].pk,
+                date=date, start_time=datetime.time(start // 60, start % 60), end_time=datetime.time(end // 60, end % 60),
+            )
+            roll = rng.random()
+            if date < self.today:
+                appointment.is_cancelled = roll < 0.08
+                appointment.is_approved = appointment.is_completed = 0.08 <= roll < 0.88
+                if appointment.is_completed:
+                    completed.append((appointment.doctor_id, appointment.customer_id))
+            else:
+                appointment.is_cancelled = roll < 0.05
+                appointment.is_approved = 0.05 <= roll < 0.5
+            return appointment
+
+        built = (appointment for appointment in map(build, range(count)) if appointment)
+        for chunk in self._chunks(built, 'appointments'):
+            Appointment.objects.bulk_create(chunk)
+            versions.bump_many(
+                [versions.schedule_key(a.doctor_id) for a in chunk] + [versions.customer_key(a.customer_id) for a in chunk]
+            )
+        return completed
+
+    def _reviews(self, completed, count):
+        rng = self.rng
+        rating = weighted(rng, RATINGS)
+        picked = rng.sample(completed, min(count, len(completed)))
+        built = (
+            DoctorReview(doctor_id_id=doctor_id, author_id=customer_id, rating=rating(),
+                         review=rng.choice(REVIEWS))
+            for doctor_id, customer_id in picked
+        )
+        for chunk in self._chunks(built, 'reviews'):
+            DoctorReview.objects.bulk_create(chunk)
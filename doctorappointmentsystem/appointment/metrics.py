@@ -0,0 +1,232 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS = {
+    # Add a Server-Timing header to every response. Off by default: it shows
+    # any client the query counts and timings of every endpoint
+    'SERVER_TIMING': False,
+    'ENFORCE_BUDGETS': False,    # raise QueryBudgetExceeded instead of only counting and logging
+    'TOKEN': '',                 # bearer token for the /metrics endpoint; staff users need none
+    'LATENCY_BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    'QUERY_BUCKETS': [0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89],
+}
+
+
+def get_config():
+    return {**DEFAULT_METRICS, **getattr(settings, 'METRICS', {})}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus sense."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = list(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                yield '_bucket', (*zip(self.labels, labels), ('le', bound)), cumulative
+            yield '_sum', tuple(zip(self.labels, labels)), total
+            yield '_count', tuple(zip(self.labels, labels)), cumulative
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + 1
+
+    def samples(self):
+        with self.lock:
+            series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            yield '', tuple(zip(self.labels, labels)), value
+
+
+def _label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Registry:
+    """
+    This process's request metrics. Each worker process keeps its own, so
+    scrape every worker (or run one per host) to see all traffic.
+    """
+
+    def __init__(self, config):
+        latency, queries = config['LATENCY_BUCKETS'], config['QUERY_BUCKETS']
+        self.requests = Counter('http_requests_total', 'Requests by view, method and status.', ['view', 'method', 'status'])
+        self.latency = Histogram('http_request_duration_seconds', 'Time to the response headers.', ['view', 'method'], latency)
+        self.queries = Histogram('http_request_db_queries', 'Database queries per request.', ['view'], queries)
+        self.db_time = Histogram('http_request_db_duration_seconds', 'Time spent in database queries.', ['view'], latency)
+        self.template_time = Histogram('http_request_template_duration_seconds', 'Time spent rendering templates.', ['view'], latency)
+        self.over_budget = Counter('http_request_query_budget_exceeded_total', 'Requests over their view\'s query budget.', ['view'])
+        self.cache_lookups = Counter('cache_lookups_total', 'Application cache lookups by cache and result.', ['cache', 'result'])
+        self.cache_invalidations = Counter('cache_invalidations_total', 'Application cache invalidations.', ['cache'])
+        self.metrics = [
+            self.requests, self.latency, self.queries, self.db_time, self.template_time, self.over_budget,
+            self.cache_lookups, self.cache_invalidations,
+        ]
+
+    def record(self, view, method, status, latency, request_metrics):
+        self.requests.inc(view, method, str(status))
+        self.latency.observe(latency, view, method)
+        self.queries.observe(request_metrics.queries, view)
+        self.db_time.observe(request_metrics.db_time, view)
+        self.template_time.observe(request_metrics.template_time, view)
+
+    def cache_lookup(self, cache, hit):
+        self.cache_lookups.inc(cache, 'hit' if hit else 'miss')
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{name}="{_label_value(value)}"' for name, value in labels)
+                lines.append(f'{metric.name}{suffix}{{{label_text}}} {value}' if labels else f'{metric.name}{suffix} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = Registry(get_config())
+    return _registry
+
+
+class RequestMetrics:
+    """What one request spent; shared with the worker threads its async views use."""
+    __slots__ = ('queries', 'db_time', 'template_time', 'rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = 0
+
+
+# Context variables are copied into sync_to_async threads, so queries made
+# there are still counted against the request that awaited them.
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start():
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    request_metrics = RequestMetrics()
+    return _current.set(request_metrics), request_metrics
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.db_time += time.perf_counter() - started
+        request_metrics.queries += 1
+
+
+def install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Connections are per thread; each one gets the wrapper when it connects
+connection_created.connect(install, dispatch_uid='appointment.metrics.install')
+
+
+def budget_of(view_func, method='get'):
+    """
+    A view's declared query budget for ``method``: the ``query_budget``
+    attribute of its class (for class-based views) or of the function
+    itself, either one number for every method or a dict such as
+    ``{'get': 1, 'post': 9}``; methods missing from the dict have no budget.
+    """
+    view_class = getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', getattr(view_func, 'query_budget', None))
+    if isinstance(budget, dict):
+        return budget.get(method.lower())
+    return budget
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        request_metrics = _current.get()
+        if request_metrics is None:
+            return super().render(context, request)
+        # Only the outermost render is timed; included templates are part of it
+        request_metrics.rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.rendering -= 1
+            if not request_metrics.rendering:
+                request_metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each render into the request's metrics."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
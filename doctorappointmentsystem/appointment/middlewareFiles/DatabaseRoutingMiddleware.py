@@ -0,0 +1,52 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from appointment import database
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Gives each request its own appointment.database routing state. Unsafe
+    methods, and clients holding the sticky cookie, read from the primary;
+    a request that wrote sets the cookie, so the page it redirects to shows
+    the change even while the replica lags. Goes before the session and
+    authentication middleware, whose lookups it routes too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = database.get_config()
+        self.cookie = config['COOKIE']
+        self.sticky_seconds = config['STICKY_SECONDS']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def primary(self, request):
+        return request.method not in SAFE_METHODS or self.cookie in request.COOKIES
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token, state = database.start(self.primary(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            database.stop(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        token, state = database.start(self.primary(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            database.stop(token)
+        return self.finish(response, state)
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(self.cookie, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
@@ -1,26 +1,200 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
-import logging
+from django.utils.functional import empty
+from collections import deque
 from datetime import datetime
+import atexit
+import os
+import threading
+import time
 
 
-class LoggingMiddleware(MiddlewareMixin):
+DEFAULT_REQUEST_LOG = {
+    'PATH': os.path.join(settings.BASE_DIR, 'appointment', 'logfiles', 'logfile.log'),
+    # 'queue': enqueue records and let a background thread write them in
+    # batches; 'sync': write each record on the request thread.
+    'MODE': 'queue',
+    'BUFFER_SIZE': 10000,     # ring buffer capacity; the oldest records are dropped when full
+    'BATCH_SIZE': 500,        # wake the writer early once this many records are waiting
+    'FLUSH_INTERVAL': 1.0,    # seconds between flushes when traffic is low
+    'MAX_BYTES': 10 * 1024 * 1024,  # rotate when the file grows past this size (0 disables)
+    'ROTATE_INTERVAL': 0,     # rotate after this many seconds (0 disables)
+    'BACKUP_COUNT': 5,
+}
+
+
+def get_log_config():
+    return {**DEFAULT_REQUEST_LOG, **getattr(settings, 'REQUEST_LOG', {})}
+
+
+def format_record(record):
+    timestamp, method, path, status, latency, user_id = record
+    when = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{when}] {method} {path} {status} {latency * 1000:.1f}ms user={user_id or '-'}\n"
+
+
+class RequestLogWriter:
+    """
+    Writes request records to a rotating log file. In queue mode, producers
+    only append a tuple to a bounded deque (atomic under the GIL, no lock);
+    a daemon thread drains it in batches, so the file is opened once and
+    written with one write() per batch.
+    """
+
+    def __init__(self, config):
+        self.path = config['PATH']
+        self.batch_size = config['BATCH_SIZE']
+        self.flush_interval = config['FLUSH_INTERVAL']
+        self.max_bytes = config['MAX_BYTES']
+        self.rotate_interval = config['ROTATE_INTERVAL']
+        self.backup_count = config['BACKUP_COUNT']
+        self.buffer = deque(maxlen=config['BUFFER_SIZE'])
+        self.dropped = 0
+        self.wakeup = threading.Event()
+        self.write_lock = threading.Lock()
+        self.stream = None
+        self.opened_at = None
+        self.thread = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(record)
+        if self.pid != os.getpid():
+            self.start()
+        if len(self.buffer) >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self):
+        # (Re)start the writer in each process, e.g. after a pre-fork server forks.
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stream = None
+            self.thread = threading.Thread(target=self.run, name='request-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        lines = []
+        while self.buffer:
+            try:
+                lines.append(format_record(self.buffer.popleft()))
+            except IndexError:
+                break
+        if self.dropped:
+            lines.append(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] request log buffer full, dropped {self.dropped} records\n")
+            self.dropped = 0
+        if lines:
+            self.write(''.join(lines))
+
+    def write(self, data):
+        with self.write_lock:
+            try:
+                if self.should_rotate():
+                    self.rotate()
+                if self.stream is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self.stream = open(self.path, 'a')
+                    self.opened_at = time.time()
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception as e:
+                print(f"Error writing to log file: {e}")
+
+    def should_rotate(self):
+        if self.stream is None:
+            return False
+        if self.max_bytes and self.stream.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self.opened_at >= self.rotate_interval
+
+    def rotate(self):
+        self.stream.close()
+        self.stream = None
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_writers = {}
+
+
+def get_writer(config):
+    path = config['PATH']
+    if path not in _writers:
+        _writers[path] = RequestLogWriter(config)
+    return _writers[path]
+
+
+@atexit.register
+def flush_all():
+    for writer in _writers.values():
+        writer.flush()
+
+
+class LoggingMiddleware:
+    """
+    Records method, path, status, latency and user of every request. Sync
+    and async capable; in queue mode logging only appends to the writer's
+    buffer, so the async path never blocks the event loop on file I/O.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.log_file_path = 'appointment/logfiles/logfile.log'
+        config = get_log_config()
+        self.log_file_path = config['PATH']
+        self.queued = config['MODE'] == 'queue'
+        self.writer = get_writer(config)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        self.log_request(request)
+        if self.async_mode:
+            return self.__acall__(request)
+        timestamp, started = time.time(), time.perf_counter()
         response = self.get_response(request)
+        self.log_request(request, response, timestamp, time.perf_counter() - started)
         return response
 
-    def log_request(self, request):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        method = request.method
-        path = request.path
-        log_message = f"[{timestamp}] {method} {path}\n"
-        try:
-            with open(self.log_file_path, 'a') as log_file:
-                log_file.write(log_message)
-        except Exception as e:
-            print(f"Error writing to log file: {e}")
+    async def __acall__(self, request):
+        timestamp, started = time.time(), time.perf_counter()
+        response = await self.get_response(request)
+        latency = time.perf_counter() - started
+        if self.queued:
+            self.log_request(request, response, timestamp, latency)
+        else:
+            await sync_to_async(self.log_request, thread_sensitive=False)(request, response, timestamp, latency)
+        return response
+
+    def log_request(self, request, response, timestamp, latency):
+        record = (
+            timestamp, request.method, request.path, response.status_code,
+            latency, self.user_id(request),
+        )
+        if self.queued:
+            self.writer.enqueue(record)
+        else:
+            self.writer.write(format_record(record))
+
+    def user_id(self, request):
+        # Only report a user that was already loaded; never trigger the query.
+        user = getattr(request, 'user', None)
+        if user is None or getattr(user, '_wrapped', None) is empty:
+            return None
+        return user.pk
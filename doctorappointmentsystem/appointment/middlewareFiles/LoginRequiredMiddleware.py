@@ -1,22 +1,97 @@
 # middleware.py
-from django.http import HttpResponseRedirect
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import HttpResponseRedirect, JsonResponse
 from django.conf import settings
-from django.urls import reverse
+from django.core.exceptions import ImproperlyConfigured
+from django.shortcuts import resolve_url
+from django.urls import NoReverseMatch, URLResolver, get_resolver, reverse
+
+DEFAULT_PUBLIC_PATHS = [
+    'login_user', 'login_doctor', 'register_user', 'register_doctor', 'admin:login', 'admin:index', 'metrics',
+]
+# Path prefixes of JSON endpoints, which answer 401 instead of redirecting
+DEFAULT_JSON_PATHS = ['/api/']
+
+
+def json_path_prefixes():
+    return list(getattr(settings, 'LOGIN_REQUIRED_JSON_PATHS', DEFAULT_JSON_PATHS))
+
+
+def is_json_path(path):
+    return path.startswith(tuple(json_path_prefixes()))
+
+
+def auth_url_prefixes():
+    """Static prefixes of every view included from django.contrib.auth.urls."""
+    prefixes = []
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver) and getattr(pattern.urlconf_module, '__name__', None) == 'django.contrib.auth.urls':
+            base = str(pattern.pattern)
+            for view in pattern.url_patterns:
+                prefixes.append('/' + (base + str(view.pattern)).split('<', 1)[0])
+    return prefixes
+
+
+def public_path_prefixes():
+    prefixes = [settings.STATIC_URL, settings.MEDIA_URL] + auth_url_prefixes()
+    for entry in getattr(settings, 'LOGIN_REQUIRED_PUBLIC_PATHS', DEFAULT_PUBLIC_PATHS):
+        if entry.startswith('/'):
+            prefixes.append(entry)
+            continue
+        try:
+            prefixes.append(reverse(entry))
+        except NoReverseMatch as e:
+            raise ImproperlyConfigured(f"LOGIN_REQUIRED_PUBLIC_PATHS entry {entry!r} is not a URL name or path.") from e
+    # A bare '/' would make every path public
+    return sorted({prefix for prefix in prefixes if prefix and prefix != '/'})
+
 
 class LoginRequiredMiddleware:
+    """
+    Redirect anonymous users to the login page, except on public paths.
+    Anonymous requests to the JSON API get a JSON 401 instead.
+    The public prefixes are compiled into one anchored regex at startup and
+    checked before request.user is touched, so static files, login pages and
+    health checks never load the session or the user.
+
+    Runs natively in both sync and async middleware chains, so under ASGI it
+    doesn't force Django to switch threads around the async views.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
-            self.get_response = get_response
-            self.exclude_urls = [
-                reverse('login_user'),
-                reverse('login_doctor'),
-                reverse('register_user'), 
-                reverse('register_doctor'), 
-                reverse('admin:login'), 
-                reverse('admin:index')
-            ]
+        self.get_response = get_response
+        self.exclude_urls = public_path_prefixes()
+        # A prefix ends at a path segment, so '/metrics' doesn't make '/metrics_x' public
+        self.public_path = re.compile('|'.join(
+            re.escape(url) + ('' if url.endswith('/') else '(?![^/])') for url in self.exclude_urls
+        ))
+        self.redirect_url = resolve_url(settings.LOGIN_REDIRECT_URL)
+        self.json_paths = tuple(json_path_prefixes())
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        if not request.user.is_authenticated and not any(request.path_info.startswith(url) for url in self.exclude_urls) and request.path_info != reverse('login_user'):
-            return HttpResponseRedirect(reverse(settings.LOGIN_REDIRECT_URL))
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.public_path.match(request.path_info) and not request.user.is_authenticated:
+            return self.login_required(request)
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    def login_required(self, request):
+        if request.path_info.startswith(self.json_paths):
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        return HttpResponseRedirect(self.redirect_url)
+
+    async def __acall__(self, request):
+        if not self.public_path.match(request.path_info):
+            # Loading the user reads the session and user tables; Django 4.2
+            # has no request.auser(), so do it in a worker thread
+            if not await sync_to_async(lambda: request.user.is_authenticated)():
+                return self.login_required(request)
+        return await self.get_response(request)
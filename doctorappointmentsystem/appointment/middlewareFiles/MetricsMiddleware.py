@@ -0,0 +1,66 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from appointment import metrics
+
+
+class MetricsMiddleware:
+    """
+    Measures every request's latency, database queries and time, and
+    template render time into appointment.metrics histograms labelled by
+    URL name, adds them as a Server-Timing header, and checks the query
+    count against the view's ``query_budget``. Goes first in MIDDLEWARE so
+    the session and user lookups of the middleware below it are counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = metrics.get_config()
+        self.server_timing = config['SERVER_TIMING']
+        self.enforce_budgets = config['ENFORCE_BUDGETS']
+        self.registry = metrics.get_registry()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token, request_metrics = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        token, request_metrics = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    def finish(self, request, response, request_metrics, latency):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        self.registry.record(view, request.method, response.status_code, latency, request_metrics)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={request_metrics.db_time * 1000:.1f};desc="{request_metrics.queries} queries", '
+                f'tpl;dur={request_metrics.template_time * 1000:.1f}, '
+                f'total;dur={latency * 1000:.1f}'
+            )
+        budget = metrics.budget_of(match.func, request.method) if match else None
+        if budget is not None and request_metrics.queries > budget:
+            self.registry.over_budget.inc(view)
+            message = f'{view} made {request_metrics.queries} queries, over its budget of {budget}.'
+            if self.enforce_budgets:
+                raise metrics.QueryBudgetExceeded(message)
+            metrics.logger.warning(message)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0002_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['date', 'start_time', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='doctor',
+            options={'ordering': ['specialization', 'last_name', 'pk']},
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from appointment import search
+
+
+def build_search_index(apps, schema_editor):
+    """Index the doctors that already exist; signals keep it in sync from here on."""
+    Doctor = apps.get_model('appointment', 'Doctor')
+    DoctorSearchIndex = apps.get_model('appointment', 'DoctorSearchIndex')
+    DoctorSearchToken = apps.get_model('appointment', 'DoctorSearchToken')
+    entries = DoctorSearchIndex.objects.bulk_create([
+        DoctorSearchIndex(
+            doctor_id=doctor.pk, first_name=doctor.first_name, last_name=doctor.last_name,
+            specialization=doctor.specialization, location=doctor.location, fee=doctor.fee,
+            is_approved=doctor.is_approved,
+        )
+        for doctor in Doctor._base_manager.iterator()
+    ], batch_size=1000)
+    backend = search.get_backend()
+    if isinstance(backend, search.FTS5SearchBackend):
+        backend.setup()
+        backend.index_new(entries)
+        return
+    DoctorSearchToken.objects.bulk_create([
+        DoctorSearchToken(doctor_id=entry.pk, field=field, token=token[:50], weight=weight)
+        for entry in entries if entry.is_approved
+        for field, weight in search.SEARCH_FIELDS.items()
+        for token in set(search.tokenize(getattr(entry, field)))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0003_listing_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSearchIndex',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='appointment.doctor')),
+                ('first_name', models.CharField(max_length=50, verbose_name='First name')),
+                ('last_name', models.CharField(max_length=50, verbose_name='Last name')),
+                ('specialization', models.CharField(max_length=50, verbose_name='Specialization')),
+                ('location', models.CharField(max_length=50, verbose_name='Location')),
+                ('fee', models.IntegerField(verbose_name='Fee')),
+                ('is_approved', models.BooleanField(default=False, verbose_name='Approve')),
+            ],
+            options={
+                'ordering': ['specialization', 'last_name', 'pk'],
+                'indexes': [models.Index(condition=models.Q(('is_approved', True)), fields=['specialization', 'last_name', 'doctor'], name='doctorsearch_listing_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DoctorSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=50)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='appointment.doctorsearchindex')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'field', 'doctor'], name='doctorsearch_token_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
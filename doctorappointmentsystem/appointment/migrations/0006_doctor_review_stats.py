@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def build_review_stats(apps, schema_editor):
+    """Aggregate the existing reviews; DoctorReviewStats.record() takes over from here."""
+    DoctorReview = apps.get_model('appointment', 'DoctorReview')
+    DoctorReviewStats = apps.get_model('appointment', 'DoctorReviewStats')
+    totals = (
+        DoctorReview.objects.order_by()
+        .values('doctor_id')
+        .annotate(review_count=Count('id'), rating_count=Count('rating'),
+                  rating_sum=Sum('rating'), last_review_at=Max('created_at'))
+    )
+    DoctorReviewStats.objects.bulk_create([
+        DoctorReviewStats(
+            doctor_id=row['doctor_id'], review_count=row['review_count'],
+            rating_count=row['rating_count'], rating_sum=row['rating_sum'] or 0,
+            last_review_at=row['last_review_at'],
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0005_doctor_working_hours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorReviewStats',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='appointment.doctor')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('last_review_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='doctorreview',
+            name='author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='appointment.customer'),
+        ),
+        # Added without auto_now_add first, so existing reviews stay undated
+        migrations.AddField(
+            model_name='doctorreview',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Created at'),
+        ),
+        migrations.AlterField(
+            model_name='doctorreview',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created at'),
+        ),
+        migrations.AddField(
+            model_name='doctorreview',
+            name='rating',
+            field=models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')], null=True, verbose_name='Rating'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorreview',
+            index=models.Index(fields=['doctor_id', '-id'], name='review_doctor_newest_idx'),
+        ),
+        migrations.RunPython(build_review_stats, migrations.RunPython.noop),
+    ]
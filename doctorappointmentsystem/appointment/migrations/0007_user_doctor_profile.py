@@ -0,0 +1,78 @@
+import datetime
+
+import django.core.validators
+from django.db import migrations, models
+
+# The doctor profile columns, moving from appointment_doctor to appointment_user
+PROFILE_FIELDS = ['specialization', 'location', 'experience', 'fee', 'is_approved', 'work_start', 'work_end', 'slot_minutes']
+
+
+class Migration(migrations.Migration):
+    """
+    Adds the doctor profile to the user table. The old columns leave the
+    Doctor model's state only; 0008 copies them over and 0009 drops
+    appointment_doctor with them.
+    """
+
+    dependencies = [
+        ('appointment', '0006_doctor_review_stats'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.RemoveField(model_name='doctor', name=name) for name in PROFILE_FIELDS],
+        ),
+        # User.Meta no longer extends AbstractUser.Meta, which set the verbose names
+        migrations.AlterModelOptions(
+            name='user',
+            options={},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='specialization',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Specialization'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='location',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Location'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='experience',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Experience'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='fee',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Fee'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='is_approved',
+            field=models.BooleanField(default=False, verbose_name='Approve'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='work_start',
+            field=models.TimeField(default=datetime.time(9, 0), verbose_name='Working hours start'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='work_end',
+            field=models.TimeField(default=datetime.time(17, 0), verbose_name='Working hours end'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(5)], verbose_name='Slot length (minutes)'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('user_type', 'D')), fields=['specialization', 'last_name', 'id'], name='user_doctor_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('user_type', 'C')), fields=['last_name', 'id'], name='user_customer_name_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# Table of the old multi-table layout -> the user_type of its rows
+LEGACY_TABLES = {
+    'appointment_doctor': 'D',
+    'appointment_customer': 'C',
+}
+
+
+def move_profiles(apps, schema_editor):
+    """
+    Copy each doctor's profile from appointment_doctor onto its user row and
+    set user_type from the table a user was in. Only the columns the legacy
+    table actually has are copied (working hours, for one, came later); the
+    rest keep the defaults 0007 gave them.
+    """
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+    User = apps.get_model('appointment', 'User')
+    user_table = quote(User._meta.db_table)
+    profile = {field.column for field in User._meta.local_concrete_fields} - {'id'}
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for table, kind in LEGACY_TABLES.items():
+            if table not in tables:
+                continue
+            legacy_rows = f'SELECT user_ptr_id FROM {quote(table)}'
+            columns = [
+                column.name for column in connection.introspection.get_table_description(cursor, table)
+                if column.name in profile
+            ]
+            if columns:
+                targets = ', '.join(quote(column) for column in columns)
+                cursor.execute(
+                    f'UPDATE {user_table} SET ({targets}) = ('
+                    f'SELECT {targets} FROM {quote(table)} WHERE user_ptr_id = {user_table}.id'
+                    f') WHERE id IN ({legacy_rows})'
+                )
+            cursor.execute(f'UPDATE {user_table} SET user_type = %s WHERE id IN ({legacy_rows})', [kind])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0007_user_doctor_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+import appointment.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Turns Doctor and Customer into proxies of User. Foreign keys point at the
+    user table first; their values stay valid, as a child row's key is its
+    user's id. Then appointment_doctor and appointment_customer are dropped.
+    """
+
+    dependencies = [
+        ('appointment', '0008_move_doctor_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='customer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='customer_appointments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='doctorreview',
+            name='author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='doctorreview',
+            name='doctor_id',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='doctorreviewstats',
+            name='doctor',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='doctorsearchindex',
+            name='doctor',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.DeleteModel(
+            name='Customer',
+        ),
+        migrations.DeleteModel(
+            name='Doctor',
+        ),
+        migrations.CreateModel(
+            name='Customer',
+            fields=[],
+            options={
+                'ordering': ['last_name'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('appointment.user',),
+            managers=[
+                ('objects', appointment.models.CustomerManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Doctor',
+            fields=[],
+            options={
+                'ordering': ['specialization', 'last_name', 'pk'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('appointment.user',),
+            managers=[
+                ('objects', appointment.models.DoctorManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='customer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='customer_appointments', to='appointment.customer'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointment.doctor'),
+        ),
+        migrations.AlterField(
+            model_name='doctorreview',
+            name='author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='appointment.customer'),
+        ),
+        migrations.AlterField(
+            model_name='doctorreview',
+            name='doctor_id',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointment.doctor'),
+        ),
+        migrations.AlterField(
+            model_name='doctorreviewstats',
+            name='doctor',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='appointment.doctor'),
+        ),
+        migrations.AlterField(
+            model_name='doctorsearchindex',
+            name='doctor',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='appointment.doctor'),
+        ),
+    ]
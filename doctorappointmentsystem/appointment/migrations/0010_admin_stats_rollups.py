@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_rollups(apps, schema_editor):
+    """What stats.rebuild() does, for the rows that exist before the signals take over."""
+    Appointment = apps.get_model('appointment', 'Appointment')
+    User = apps.get_model('appointment', 'User')
+    DailyDoctorStats = apps.get_model('appointment', 'DailyDoctorStats')
+    DailySpecializationStats = apps.get_model('appointment', 'DailySpecializationStats')
+    StatsCounter = apps.get_model('appointment', 'StatsCounter')
+    flags = {
+        'booked': Count('id'),
+        'approved': Count('id', filter=Q(is_approved=True)),
+        'completed': Count('id', filter=Q(is_completed=True)),
+        'cancelled': Count('id', filter=Q(is_cancelled=True)),
+    }
+    appointments = Appointment.objects.order_by()
+    DailyDoctorStats.objects.bulk_create([
+        DailyDoctorStats(**row)
+        for row in appointments.values('date', 'doctor_id').annotate(**flags).iterator()
+    ], batch_size=1000)
+    DailySpecializationStats.objects.bulk_create([
+        DailySpecializationStats(specialization=row.pop('doctor__specialization'), **row)
+        for row in appointments.values('date', 'doctor__specialization').annotate(**flags).iterator()
+    ], batch_size=1000)
+    totals = appointments.aggregate(
+        **{f'appointments_{name}': flag for name, flag in flags.items()},
+        appointments_pending=Count('id', filter=Q(is_approved=False, is_completed=False, is_cancelled=False)),
+    )
+    totals.update(User.objects.aggregate(
+        doctors=Count('id', filter=Q(user_type='D')),
+        pending_doctors=Count('id', filter=Q(user_type='D', is_approved=False)),
+        customers=Count('id', filter=Q(user_type='C', is_superuser=False)),
+    ))
+    StatsCounter.objects.bulk_create([StatsCounter(name=name, value=value) for name, value in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0009_doctor_customer_proxies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySpecializationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('specialization', models.CharField(max_length=50, verbose_name='Specialization')),
+                ('booked', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'specialization'), name='dailyspecstats_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyDoctorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('booked', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='appointment.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor'), name='dailydoctorstats_unique')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+import appointment.models
+from django.db import migrations, models
+
+
+def fill_starts_at(apps, schema_editor):
+    """Fill starts_at from date + start_time for the appointments that already exist."""
+    Appointment = apps.get_model('appointment', 'Appointment')
+    pending = Appointment.objects.filter(starts_at__isnull=True).order_by('pk').only('pk', 'date', 'start_time')
+    while True:
+        batch = list(pending[:5000])
+        if not batch:
+            break
+        for row in batch:
+            row.starts_at = appointment.models.start_datetime(row.date, row.start_time)
+        # bulk_update writes the value as given; StartsAtField.pre_save only runs on save/insert
+        Appointment.objects.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0011_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='starts_at',
+            field=appointment.models.StartsAtField(editable=False, null=True, verbose_name='Starts at'),
+        ),
+        migrations.RunPython(fill_starts_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['customer', 'starts_at', 'id'], name='appoint_customer_starts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'starts_at', 'id'], name='appoint_doctor_starts_idx'),
+        ),
+    ]
@@ -1,10 +1,24 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager
-from django.core.validators import RegexValidator
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, RegexValidator
+from django.utils import timezone
 import datetime
 
 
+# Columns only doctors use: the profile every doctor must fill in, and the
+# approval flag and working hours
+DOCTOR_PROFILE_FIELDS = ['specialization', 'location', 'experience', 'fee']
+DOCTOR_FIELDS = DOCTOR_PROFILE_FIELDS + ['is_approved', 'work_start', 'work_end', 'slot_minutes']
+
+
+def is_working_day(date):
+    """Appointments can only be booked Monday to Friday."""
+    return 0 <= date.weekday() <= 4
+
+
 class User(AbstractUser):
     type_choices = (
         ('D', 'Doctor'),
@@ -20,14 +34,43 @@ class User(AbstractUser):
     last_name = models.CharField('Last name', max_length=50)
     gender = models.CharField('Gender', max_length=1, choices=gender_type, default='M')
     prifile_pic = models.ImageField(upload_to='images/', null=True, blank=True)
+    # Content hash naming the resized copies of prifile_pic, set by the image
+    # worker once they exist (see appointment.images)
+    avatar_hash = models.CharField(max_length=64, blank=True)
     mobile_regex = RegexValidator(regex=r'^\+?1?\d{9,15}$', message="Mobile number must be entered in the format: '+999999999'. Up to 15 digits allowed.")
     phone_no = models.CharField(validators=[mobile_regex], max_length=17, unique=True)
     email = models.EmailField(unique=True)
 
+    # Doctor profile, stored on the user row (see the Doctor proxy below);
+    # left empty for customers, so optional here. Doctor forms and the
+    # import require DOCTOR_PROFILE_FIELDS.
+    specialization = models.CharField('Specialization', max_length=50, blank=True, default='')
+    location = models.CharField('Location', max_length=50, blank=True, default='')
+    experience = models.CharField('Experience', max_length=50, blank=True, default='')
+    fee = models.IntegerField('Fee', null=True, blank=True)
+    is_approved = models.BooleanField('Approve', default=False)
+    work_start = models.TimeField('Working hours start', default=datetime.time(9, 0))
+    work_end = models.TimeField('Working hours end', default=datetime.time(17, 0))
+    slot_minutes = models.PositiveSmallIntegerField('Slot length (minutes)', default=30, validators=[MinValueValidator(5)])
+
+    class Meta:
+        indexes = [
+            # Partitioned by user_type, so each only holds one kind of user and
+            # serves the Doctor/Customer managers' default ordering.
+            models.Index(fields=['specialization', 'last_name', 'id'], condition=models.Q(user_type='D'),
+                         name='user_doctor_listing_idx'),
+            models.Index(fields=['last_name', 'id'], condition=models.Q(user_type='C'),
+                         name='user_customer_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def clean(self):
+        super().clean()
+        if self.work_start and self.work_end and self.work_end <= self.work_start:
+            raise ValidationError({'work_end': 'Working hours must end after they start.'})
+
     def get_absolute_url(self):
         return '/%i' % self.pk
 
@@ -44,7 +87,15 @@ class User(AbstractUser):
     
     @property
     def image_url(self):
-        return getattr(self.prifile_pic, 'url', None) if self.prifile_pic else None
+        """The 256 px profile picture, None until the image worker has made it."""
+        from .images import thumbnail_url
+        return thumbnail_url(self.avatar_hash, 256) if self.avatar_hash else None
+
+    @property
+    def icon_url(self):
+        """The 64 px profile picture, for lists."""
+        from .images import thumbnail_url
+        return thumbnail_url(self.avatar_hash, 64) if self.avatar_hash else None
 
 
 class DoctorManager(UserManager):
@@ -54,19 +105,17 @@ class DoctorManager(UserManager):
 
 class CustomerManager(UserManager):
     def get_queryset(self):
-        return super().get_queryset().filter(user_type='C')
+        # Superusers keep the default user_type but were never customers
+        return super().get_queryset().filter(user_type='C', is_superuser=False)
 
 
 class Doctor(User):
+    """Doctors are user rows with user_type 'D'; no table of their own."""
     objects = DoctorManager()
-    specialization = models.CharField('Specialization', max_length=50)
-    location = models.CharField('Location', max_length=50)
-    experience = models.CharField('Experience', max_length=50)
-    fee = models.IntegerField('Fee')
-    is_approved = models.BooleanField('Approve', default=False)
 
     class Meta:
-        ordering = ['specialization', 'last_name']
+        proxy = True
+        ordering = ['specialization', 'last_name', 'pk']
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -84,14 +133,98 @@ class Doctor(User):
     
 
 class DoctorReview(models.Model):
+    rating_choices = [(i, str(i)) for i in range(1, 6)]
+
     doctor_id = models.ForeignKey(Doctor, on_delete=models.CASCADE)
     review = models.TextField('Review', max_length=200, blank=False)
+    # Nullable only for reviews written before ratings existed
+    rating = models.PositiveSmallIntegerField('Rating', choices=rating_choices, null=True, blank=False)
+    author = models.ForeignKey('Customer', on_delete=models.SET_NULL, null=True, blank=True, related_name='reviews')
+    created_at = models.DateTimeField('Created at', auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor_id', '-id'], name='review_doctor_newest_idx'),
+        ]
 
+    def save(self, *args, **kwargs):
+        old = DoctorReview.objects.filter(pk=self.pk).first() if self.pk else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            DoctorReviewStats.record(self, old)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            DoctorReviewStats.forget(self)
+        return result
+
+
+class DoctorReviewStats(models.Model):
+    """
+    Per-doctor review aggregate, updated incrementally as reviews are written
+    so the detail page never aggregates over all of a doctor's reviews.
+    """
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='review_stats')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    last_review_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def average_rating(self):
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else None
+
+    @classmethod
+    def record(cls, review, old=None):
+        """
+        Fold a saved review into its doctor's aggregate row. ``old`` is the
+        review as it was before an edit, None for a new review.
+        """
+        if old is not None and old.doctor_id_id != review.doctor_id_id:
+            cls.forget(old)
+            old = None
+        if old is not None:
+            cls.objects.filter(doctor_id=review.doctor_id_id).update(
+                rating_count=models.F('rating_count') + int(review.rating is not None) - int(old.rating is not None),
+                rating_sum=models.F('rating_sum') + (review.rating or 0) - (old.rating or 0),
+            )
+            return
+        rated = review.rating is not None
+        changes = {
+            'review_count': models.F('review_count') + 1,
+            'rating_count': models.F('rating_count') + int(rated),
+            'rating_sum': models.F('rating_sum') + (review.rating or 0),
+            'last_review_at': review.created_at,
+        }
+        if not cls.objects.filter(doctor_id=review.doctor_id_id).update(**changes):
+            stats, created = cls.objects.get_or_create(
+                doctor_id=review.doctor_id_id,
+                defaults={'review_count': 1, 'rating_count': int(rated), 'rating_sum': review.rating or 0,
+                          'last_review_at': review.created_at},
+            )
+            if not created:
+                cls.objects.filter(doctor_id=review.doctor_id_id).update(**changes)
+
+    @classmethod
+    def forget(cls, review):
+        """Take a deleted review back out of its doctor's aggregate row."""
+        newest = (
+            DoctorReview.objects.filter(doctor_id=review.doctor_id_id)
+            .order_by(models.F('created_at').desc(nulls_last=True)).values('created_at')[:1]
+        )
+        cls.objects.filter(doctor_id=review.doctor_id_id).update(
+            review_count=models.F('review_count') - 1,
+            rating_count=models.F('rating_count') - int(review.rating is not None),
+            rating_sum=models.F('rating_sum') - (review.rating or 0),
+            last_review_at=models.Subquery(newest),
+        )
 
 class Customer(User):
     objects = CustomerManager()
 
     class Meta:
+        proxy = True
         ordering = ['last_name']
 
     def __str__(self):
@@ -109,18 +242,90 @@ class Customer(User):
         return f'{self.first_name} {self.last_name}'
 
 
+def current_time():
+    return timezone.now() if settings.USE_TZ else datetime.datetime.now()
+
+
+def current_date():
+    """Today in the default timezone, the one appointment times are entered in."""
+    if settings.USE_TZ:
+        return timezone.localtime(timezone.now(), timezone.get_default_timezone()).date()
+    return datetime.date.today()
+
+
+def start_datetime(date, start_time):
+    """An appointment's start as a datetime, aware in the default timezone when USE_TZ."""
+    value = datetime.datetime.combine(date, start_time)
+    return timezone.make_aware(value, timezone.get_default_timezone()) if settings.USE_TZ else value
+
+
+class StartsAtField(models.DateTimeField):
+    """
+    ``date`` + ``start_time`` stored as one column. Recomputed from those two
+    fields every time the row is written, including by bulk_create.
+    """
+
+    def pre_save(self, model_instance, add):
+        opts = model_instance._meta
+        date = opts.get_field('date').to_python(model_instance.date)
+        start_time = opts.get_field('start_time').to_python(model_instance.start_time)
+        value = start_datetime(date, start_time) if date and start_time else None
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def upcoming(self, now=None):
+        """Appointments that haven't started yet, soonest first."""
+        return self.filter(starts_at__gt=now or current_time()).order_by('starts_at', 'id')
+
+    def past(self, now=None):
+        """Appointments that have started (see Appointment.is_outdated), latest first."""
+        return self.filter(starts_at__lte=now or current_time()).order_by('-starts_at', '-id')
+
+    def between(self, first_day, last_day):
+        start = start_datetime(first_day, datetime.time.min)
+        end = start_datetime(last_day + datetime.timedelta(days=1), datetime.time.min)
+        return self.filter(starts_at__gte=start, starts_at__lt=end).order_by('starts_at', 'id')
+
+    def today(self):
+        today = current_date()
+        return self.between(today, today)
+
+    def for_week(self, day=None):
+        """Monday to Sunday of the week containing ``day`` (default: this week)."""
+        day = day or current_date()
+        monday = day - datetime.timedelta(days=day.weekday())
+        return self.between(monday, monday + datetime.timedelta(days=6))
+
+
 class Appointment(models.Model):
     start_time = models.TimeField('Start time')
     end_time = models.TimeField('End time')
     date = models.DateField('Date')
-    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
+    # Named so it doesn't clash with Doctor.appointment_set on the shared user table
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, related_name='customer_appointments')
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
     is_cancelled = models.BooleanField("Cancelled", default = False)
     is_approved = models.BooleanField("Approved", default = False)
     is_completed = models.BooleanField("Completed", default = False)
+    # Nullable so it could be added to existing tables; its migration fills it in
+    starts_at = StartsAtField('Starts at', null=True, editable=False)
+
+    objects = AppointmentQuerySet.as_manager()
 
     class Meta:
-        ordering = ['start_time', '-date']
+        ordering = ['date', 'start_time', 'id']
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'start_time'], name='appoint_doctor_date_idx'),
+            models.Index(fields=['doctor', 'is_cancelled', 'is_approved', 'is_completed'],
+                         name='appoint_doctor_status_idx'),
+            # Default ordering, the admin date hierarchy and outdated filter
+            models.Index(fields=['date', 'start_time', 'id'], name='appoint_date_idx'),
+            # upcoming()/past() per patient and per doctor seek straight to "now"
+            models.Index(fields=['customer', 'starts_at', 'id'], name='appoint_customer_starts_idx'),
+            models.Index(fields=['doctor', 'starts_at', 'id'], name='appoint_doctor_starts_idx'),
+        ]
 
     def __str__(self):
         return str(self.start_time)
@@ -129,15 +334,133 @@ class Appointment(models.Model):
         return f'/{self.doctor.id}/appoint/{self.id}'
 
     def is_outdated(self):
-        today = datetime.datetime.now()
-        day = datetime.datetime.combine(self.date, self.start_time)
-        return day <= today
+        return start_datetime(self.date, self.start_time) <= current_time()
 
     def is_working_day_appointment(self):
-        return 0 <= self.date.weekday() <= 4
+        return is_working_day(self.date)
 
     is_outdated.boolean = True
     is_outdated.short_description = 'Is Outdated?'
 
     is_working_day_appointment.boolean = True
     is_working_day_appointment.short_description = 'Is in working day?'
+
+
+class DoctorSearchIndex(models.Model):
+    """
+    Denormalised copy of the searchable Doctor columns, kept in sync by
+    appointment.signals.search_signals. Directory listings and searches read
+    this table alone instead of joining appointment_doctor to appointment_user.
+    """
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    first_name = models.CharField('First name', max_length=50)
+    last_name = models.CharField('Last name', max_length=50)
+    specialization = models.CharField('Specialization', max_length=50)
+    location = models.CharField('Location', max_length=50)
+    fee = models.IntegerField('Fee')
+    is_approved = models.BooleanField('Approve', default=False)
+
+    class Meta:
+        ordering = ['specialization', 'last_name', 'pk']
+        indexes = [
+            models.Index(fields=['specialization', 'last_name', 'doctor'], condition=models.Q(is_approved=True),
+                         name='doctorsearch_listing_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+class DoctorSearchToken(models.Model):
+    """Prefix-searchable token rows used when SQLite FTS5 is unavailable."""
+    doctor = models.ForeignKey(DoctorSearchIndex, on_delete=models.CASCADE, related_name='tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=50)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'field', 'doctor'], name='doctorsearch_token_idx'),
+        ]
+
+
+class DailyDoctorStats(models.Model):
+    """
+    Appointments per doctor per day, maintained by appointment.stats as
+    appointments are booked, change state or are deleted.
+    """
+    date = models.DateField('Date')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    booked = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'doctor'], name='dailydoctorstats_unique'),
+        ]
+
+
+class DailySpecializationStats(models.Model):
+    """Appointments per specialization per day; what the admin index reads."""
+    date = models.DateField('Date')
+    specialization = models.CharField('Specialization', max_length=50)
+    booked = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'specialization'], name='dailyspecstats_unique'),
+        ]
+
+
+class StatsCounter(models.Model):
+    """Site-wide running totals (users, pending approvals, appointments by state)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+
+class ResourceVersion(models.Model):
+    """
+    Change counter per API resource (e.g. ``doctor:12``), bumped in the same
+    transaction as the change. The JSON API derives its ETags from it.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+
+class ProfileImageJob(models.Model):
+    """
+    An uploaded profile picture waiting for the process_profile_images worker
+    to re-encode it and make its thumbnails. A user has at most one pending
+    job; uploading again replaces its source.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    status_choices = (
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='profile_image_jobs')
+    source = models.CharField(max_length=255, help_text='Staged upload, relative to the image storage')
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=status_choices, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='profileimage_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(status='pending'), name='profileimage_pending_user'),
+        ]
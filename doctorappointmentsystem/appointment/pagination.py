@@ -0,0 +1,235 @@
+import base64
+import json
+from types import SimpleNamespace
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator. Pages are addressed by an opaque cursor holding the
+    sort key of the row next to the page, so every page costs one indexed
+    range scan of ``per_page + 1`` rows and no COUNT(*).
+
+    ``ordering`` must be unique over the queryset; it defaults to the model's
+    Meta.ordering with ``pk`` appended as a tie-breaker. ``values()``
+    querysets work too, as long as they select every ordering field.
+    ``aget_page`` is the same lookup through the async ORM.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        ordering = list(ordering or queryset.model._meta.ordering)
+        if not any(f.lstrip('-') in ('id', 'pk') for f in ordering):
+            ordering.append('pk')
+        self.ordering = ordering
+
+    def _fields(self):
+        pk_name = self.queryset.model._meta.pk.name
+        return [
+            (pk_name if f.lstrip('-') == 'pk' else f.lstrip('-'), f.startswith('-'))
+            for f in self.ordering
+        ]
+
+    def encode_cursor(self, direction, obj):
+        opts = self.queryset.model._meta
+        values = []
+        for name, _ in self._fields():
+            field = opts.get_field(name)
+            if isinstance(obj, dict):
+                # A values() row, keyed by field name
+                source = SimpleNamespace(**{field.attname: obj[name]})
+            else:
+                source = obj
+            values.append(field.value_to_string(source))
+        raw = json.dumps([direction] + values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(direction, key)`` or ``None`` if the cursor is not valid."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = json.loads(raw)
+            fields = self._fields()
+            if direction not in ('n', 'p') or len(values) != len(fields):
+                return None
+            opts = self.queryset.model._meta
+            key = [opts.get_field(name).to_python(value) for (name, _), value in zip(fields, values)]
+        except Exception:
+            return None
+        return direction, key
+
+    def _seek(self, key, forward):
+        """Build ``(a, b, c) > (x, y, z)`` as a chain of OR'ed prefixes."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(), key):
+            op = 'gt' if forward != descending else 'lt'
+            condition |= equal & Q(**{f'{name}__{op}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _query(self, cursor):
+        """The sliced queryset for ``cursor`` and the direction it was read in."""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self.queryset.order_by(*self.ordering)[:self.per_page + 1], None
+        direction, key = decoded
+        if direction == 'n':
+            qs = self.queryset.filter(self._seek(key, forward=True))
+            return qs.order_by(*self.ordering)[:self.per_page + 1], direction
+        reverse = [f[1:] if f.startswith('-') else '-' + f for f in self.ordering]
+        qs = self.queryset.filter(self._seek(key, forward=False))
+        return qs.order_by(*reverse)[:self.per_page + 1], direction
+
+    def _page(self, rows, direction):
+        if direction == 'p':
+            has_before, has_more = len(rows) > self.per_page, True
+            rows = rows[:self.per_page][::-1]
+        else:
+            has_more, has_before = len(rows) > self.per_page, direction == 'n'
+            rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor('n', rows[-1]) if rows and has_more else None
+        previous_cursor = self.encode_cursor('p', rows[0]) if rows and has_before else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        query, direction = self._query(cursor)
+        return self._page(list(query), direction)
+
+    async def aget_page(self, cursor=None):
+        query, direction = self._query(cursor)
+        return self._page([row async for row in query], direction)
+
+
+class RankedPaginator:
+    """
+    Pages over a precomputed, relevance-ordered list of primary keys (e.g. the
+    top hits of a full-text search). The cursor is the position in that list,
+    so each page is a single ``pk IN (...)`` lookup of ``per_page`` rows.
+    Works on model and ``values()`` querysets alike.
+    """
+
+    def __init__(self, queryset, per_page, ranked_ids):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ranked_ids = list(ranked_ids)
+
+    def _encode(self, offset):
+        return base64.urlsafe_b64encode(json.dumps(['r', offset]).encode()).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            marker, offset = json.loads(raw)
+        except Exception:
+            return 0
+        if marker != 'r' or not isinstance(offset, int) or not 0 <= offset < len(self.ranked_ids):
+            return 0
+        return offset
+
+    def _query(self, cursor):
+        offset = self._decode(cursor) if cursor else 0
+        page_ids = self.ranked_ids[offset:offset + self.per_page]
+        return self.queryset.filter(pk__in=page_ids) if page_ids else self.queryset.none(), offset, page_ids
+
+    def _page(self, rows, offset, page_ids):
+        pk_name = self.queryset.model._meta.pk.name
+        rows = {row[pk_name] if isinstance(row, dict) else row.pk: row for row in rows}
+        end = offset + self.per_page
+        return KeysetPage(
+            [rows[pk] for pk in page_ids if pk in rows],
+            self._encode(end) if end < len(self.ranked_ids) else None,
+            self._encode(max(offset - self.per_page, 0)) if offset else None,
+        )
+
+    def get_page(self, cursor=None):
+        query, offset, page_ids = self._query(cursor)
+        return self._page(list(query), offset, page_ids)
+
+    async def aget_page(self, cursor=None):
+        query, offset, page_ids = self._query(cursor)
+        return self._page([row async for row in query], offset, page_ids)
+
+
+class KeysetPaginationMixin:
+    """Swap ListView's offset pagination for KeysetPaginator."""
+    cursor_kwarg = 'cursor'
+    keyset_ordering = None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        page_obj = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page_obj, page_obj.object_list, page_obj.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        context['querystring'] = params.urlencode()
+        return context
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Cheap approximate row count of ``model``'s table, or None where the
+    backend has no estimate. PostgreSQL reads the planner statistics; SQLite
+    reads the largest integer primary key, an upper bound found via the
+    primary key b-tree.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite' and model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+            cursor.execute(f'SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables. An unfiltered queryset over a table
+    estimated at more than ``estimate_threshold`` rows reports that estimate
+    instead of running COUNT(*); filtered and small querysets are counted
+    exactly.
+    """
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,241 @@
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import DoctorSearchIndex, DoctorSearchToken
+
+# Column name -> ranking weight. 'q' in a search matches any of them.
+SEARCH_FIELDS = {
+    'first_name': 4,
+    'last_name': 4,
+    'specialization': 2,
+    'location': 1,
+}
+SEARCH_RESULTS_LIMIT = 100
+
+
+def normalise(value):
+    """Casefold and strip accents so 'Péter' and 'peter' index the same."""
+    value = unicodedata.normalize('NFKD', str(value))
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(value):
+    return re.findall(r'\w+', normalise(value))
+
+
+def query_terms(**params):
+    """
+    Turn filter parameters into ``(field, token)`` pairs, where ``field`` is
+    None for free-text ``q`` tokens. Every term must match (as a prefix).
+    """
+    terms = []
+    for name, value in params.items():
+        if not value or (name != 'q' and name not in SEARCH_FIELDS):
+            continue
+        field = None if name == 'q' else name
+        terms.extend((field, token) for token in tokenize(value))
+    return terms
+
+
+class TokenSearchBackend:
+    """
+    Portable inverted index: one DoctorSearchToken row per (field, token).
+    Prefix matches are half-open range scans on the token index
+    (``token >= 'pu' AND token < 'pv'``), which any database can serve from a
+    b-tree, unlike ``LIKE '%pu%'``.
+    """
+
+    def setup(self):
+        pass
+
+    def index(self, entry):
+        DoctorSearchToken.objects.filter(doctor=entry).delete()
+        if not entry.is_approved:
+            return
+        DoctorSearchToken.objects.bulk_create([
+            DoctorSearchToken(doctor=entry, field=field, token=token[:50], weight=weight)
+            for field, weight in SEARCH_FIELDS.items()
+            for token in set(tokenize(getattr(entry, field)))
+        ])
+
+    def index_new(self, entries):
+        """Like index() for entries that have no tokens yet, in one insert."""
+        DoctorSearchToken.objects.bulk_create([
+            DoctorSearchToken(doctor=entry, field=field, token=token[:50], weight=weight)
+            for entry in entries if entry.is_approved
+            for field, weight in SEARCH_FIELDS.items()
+            for token in set(tokenize(getattr(entry, field)))
+        ], batch_size=1000)
+
+    def remove(self, doctor_id):
+        DoctorSearchToken.objects.filter(doctor_id=doctor_id).delete()
+
+    def clear(self):
+        DoctorSearchToken.objects.all().delete()
+
+    def _term_q(self, field, token):
+        condition = Q(token__gte=token, token__lt=token[:-1] + chr(ord(token[-1]) + 1))
+        if field:
+            condition &= Q(field=field)
+        return condition
+
+    def _matches(self, terms):
+        conditions = [self._term_q(field, token) for field, token in terms]
+        flags = {
+            f'term_{i}': Max(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for i, condition in enumerate(conditions)
+        }
+        return (
+            DoctorSearchToken.objects.filter(reduce(or_, conditions))
+            .values('doctor_id')
+            .annotate(**flags)
+            .filter(**{name: 1 for name in flags})
+        )
+
+    def match(self, terms):
+        return Q(pk__in=self._matches(terms).values('doctor_id'))
+
+    def search(self, terms, limit=SEARCH_RESULTS_LIMIT):
+        exact = [token for _, token in terms]
+        rows = (
+            self._matches(terms)
+            .annotate(score=Sum('weight') + Sum(Case(When(token__in=exact, then=Value(1)), default=Value(0))))
+            .order_by('-score', 'doctor_id')
+            .values_list('doctor_id', flat=True)[:limit]
+        )
+        return list(rows)
+
+
+class FTS5SearchBackend:
+    """
+    SQLite FTS5 index over approved doctors, keyed by rowid = doctor id, with
+    2- and 3-character prefix indexes so ``"pu"*`` queries stay cheap.
+    Ranked with bm25 using SEARCH_FIELDS as column weights.
+    """
+    table = 'appointment_doctorsearch_fts'
+
+    def setup(self):
+        columns = ', '.join(SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def index(self, entry):
+        self.remove(entry.pk)
+        if not entry.is_approved:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+                [entry.pk] + [getattr(entry, field) for field in SEARCH_FIELDS],
+            )
+
+    def index_new(self, entries):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+                [[entry.pk] + [getattr(entry, field) for field in SEARCH_FIELDS] for entry in entries if entry.is_approved],
+            )
+
+    def remove(self, doctor_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [doctor_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def _expression(self, terms):
+        return ' '.join(f'{field} : "{token}"*' if field else f'"{token}"*' for field, token in terms)
+
+    def match(self, terms):
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", (self._expression(terms),)))
+
+    def search(self, terms, limit=SEARCH_RESULTS_LIMIT):
+        weights = ', '.join(f'{weight:.1f}' for weight in SEARCH_FIELDS.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}), rowid LIMIT %s",
+                [self._expression(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = FTS5SearchBackend() if fts5_available() else TokenSearchBackend()
+    return _backend
+
+
+def index_doctor(doctor):
+    entry, _ = DoctorSearchIndex.objects.update_or_create(
+        doctor_id=doctor.pk,
+        defaults={
+            'first_name': doctor.first_name,
+            'last_name': doctor.last_name,
+            'specialization': doctor.specialization,
+            'location': doctor.location,
+            'fee': doctor.fee,
+            'is_approved': doctor.is_approved,
+        },
+    )
+    get_backend().index(entry)
+    return entry
+
+
+def index_new_doctors(doctors):
+    """index_doctor() for doctors created with bulk_create, which sends no signals."""
+    entries = DoctorSearchIndex.objects.bulk_create([
+        DoctorSearchIndex(
+            doctor_id=doctor.pk, first_name=doctor.first_name, last_name=doctor.last_name,
+            specialization=doctor.specialization, location=doctor.location, fee=doctor.fee,
+            is_approved=doctor.is_approved,
+        )
+        for doctor in doctors
+    ], batch_size=1000)
+    get_backend().index_new(entries)
+
+
+def remove_doctor(doctor_id):
+    get_backend().remove(doctor_id)
+    DoctorSearchIndex.objects.filter(pk=doctor_id).delete()
+
+
+def filter_directory(queryset, **params):
+    """
+    Restrict a DoctorSearchIndex queryset to the doctors matching ``params``.
+
+    Returns ``(queryset, ranked_ids)``. Free-text ``q`` searches are capped at
+    the SEARCH_RESULTS_LIMIT best hits and ``ranked_ids`` lists them in
+    relevance order; column-only filters are applied as an uncapped subquery,
+    keep the queryset's ordering and return ``ranked_ids=None``.
+    """
+    terms = query_terms(**params)
+    if not terms:
+        return queryset, None
+    backend = get_backend()
+    if not params.get('q'):
+        return queryset.filter(backend.match(terms)), None
+    ids = backend.search(terms)
+    return queryset.filter(pk__in=ids), ids
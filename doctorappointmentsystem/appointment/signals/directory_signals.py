@@ -0,0 +1,36 @@
+from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from appointment.models import Doctor
+from appointment.directory import DIRECTORY_FIELDS, directory_cache
+from appointment import versions
+
+
+def listing(instance):
+    # Read from __dict__ so deferred fields aren't fetched just for this
+    return tuple(instance.__dict__.get(field) for field in DIRECTORY_FIELDS)
+
+
+@receiver(post_init, sender=Doctor)
+def remember_listing(sender, instance, **kwargs):
+    instance._loaded_listing = listing(instance)
+
+
+@receiver(post_save, sender=Doctor)
+def invalidate_on_save(sender, instance, created, update_fields=None, **kwargs):
+    previous = getattr(instance, '_loaded_listing', None)
+    instance._loaded_listing = listing(instance)
+    if not created:
+        if update_fields is not None and not set(update_fields) & set(DIRECTORY_FIELDS):
+            return  # e.g. the last_login update on every sign-in
+        if previous == instance._loaded_listing:
+            return
+    versions.bump(versions.DIRECTORY)
+    # After commit, so a concurrent request can't re-cache the old rows
+    transaction.on_commit(directory_cache.invalidate)
+
+
+@receiver(post_delete, sender=Doctor)
+def invalidate_on_delete(sender, instance, **kwargs):
+    versions.bump(versions.DIRECTORY)
+    transaction.on_commit(directory_cache.invalidate)
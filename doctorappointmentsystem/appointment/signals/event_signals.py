@@ -0,0 +1,34 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_init, post_save, post_delete
+from appointment.models import Appointment
+from appointment import events
+
+
+def event_row(instance):
+    # Read from __dict__ so deferred fields aren't fetched just for this
+    return {name: instance.__dict__.get(name) for name in events.EVENT_FIELDS}
+
+
+@receiver(post_init, sender=Appointment)
+def remember_event_row(sender, instance, **kwargs):
+    instance._loaded_event_row = event_row(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Appointment)
+def publish_saved_appointment(sender, instance, created, raw=False, **kwargs):
+    previous = None if created else getattr(instance, '_loaded_event_row', None)
+    row = instance._loaded_event_row = event_row(instance)
+    if raw or row == previous:
+        return
+    if previous is None:
+        event = 'created'
+    else:
+        turned_on = [flag for flag in events.STATE_EVENTS if row[flag] and not previous[flag]]
+        # Latest in the approve -> complete/cancel order wins
+        event = events.STATE_EVENTS[turned_on[-1]] if turned_on else 'updated'
+    events.publish_appointments(event, [row])
+
+
+@receiver(post_delete, sender=Appointment)
+def publish_deleted_appointment(sender, instance, **kwargs):
+    events.publish_appointments('deleted', [event_row(instance)])
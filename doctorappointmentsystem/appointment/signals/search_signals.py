@@ -0,0 +1,21 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, post_migrate
+from appointment.models import Doctor
+from appointment import search
+
+
+@receiver(post_save, sender=Doctor)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_doctor(instance)
+
+
+@receiver(post_delete, sender=Doctor)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_doctor(instance.pk)
+
+
+@receiver(post_migrate)
+def create_search_tables(sender, **kwargs):
+    if sender.name == 'appointment':
+        search.get_backend().setup()
@@ -0,0 +1,72 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_init, post_save, post_delete
+from appointment.models import Appointment, Customer, Doctor, User
+from appointment import stats
+
+
+def appointment_state(instance):
+    # Read from __dict__ so deferred fields aren't fetched just for this
+    values = instance.__dict__
+    if values.get('date') is None or values.get('doctor_id') is None:
+        return None
+    return stats.appointment_state(
+        values['date'], values['doctor_id'],
+        values.get('is_approved'), values.get('is_completed'), values.get('is_cancelled'),
+    )
+
+
+def user_state(instance):
+    values = instance.__dict__
+    return stats.user_state(values.get('user_type'), values.get('is_superuser'), values.get('is_approved'))
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    instance._loaded_stats = appointment_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Appointment)
+def update_appointment_stats(sender, instance, created, raw=False, **kwargs):
+    previous = None if created else getattr(instance, '_loaded_stats', None)
+    instance._loaded_stats = appointment_state(instance)
+    if not raw and previous != instance._loaded_stats:
+        stats.record_appointments([(previous, instance._loaded_stats)])
+
+
+@receiver(post_delete, sender=Appointment)
+def remove_appointment_stats(sender, instance, **kwargs):
+    stats.record_appointments([(appointment_state(instance), None)])
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Doctor)
+@receiver(post_init, sender=Customer)
+def remember_user_state(sender, instance, **kwargs):
+    instance._loaded_user_stats = user_state(instance) if instance.pk else {}
+    # Missing when deferred; the rollups then can't tell whether it changed
+    instance._loaded_specialization = instance.__dict__.get('specialization') if instance.pk else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Customer)
+def update_user_stats(sender, instance, created, raw=False, **kwargs):
+    previous = {} if created else getattr(instance, '_loaded_user_stats', {})
+    instance._loaded_user_stats = user_state(instance)
+    specialization = None if created else getattr(instance, '_loaded_specialization', None)
+    instance._loaded_specialization = instance.__dict__.get('specialization')
+    if raw:
+        return
+    if (instance.user_type == 'D' and specialization is not None
+            and instance._loaded_specialization not in (None, specialization)):
+        stats.move_specialization(instance.pk, specialization, instance._loaded_specialization)
+    delta = {name: instance._loaded_user_stats.get(name, 0) - previous.get(name, 0)
+             for name in {*previous, *instance._loaded_user_stats}}
+    stats.record_counters(delta)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Customer)
+def remove_user_stats(sender, instance, **kwargs):
+    stats.record_counters({name: -value for name, value in user_state(instance).items()})
@@ -0,0 +1,52 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_init, post_save, post_delete
+from appointment.models import Appointment, Doctor, DoctorReview
+from appointment import versions
+
+# Saves that never change what the API shows about a doctor
+IGNORED_DOCTOR_FIELDS = {'last_login', 'password'}
+
+
+@receiver(post_save, sender=Doctor)
+def bump_doctor_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= IGNORED_DOCTOR_FIELDS):
+        return
+    versions.bump(versions.doctor_key(instance.pk))
+
+
+@receiver(post_delete, sender=Doctor)
+def bump_deleted_doctor_version(sender, instance, **kwargs):
+    versions.bump(versions.doctor_key(instance.pk))
+
+
+@receiver(post_save, sender=DoctorReview)
+@receiver(post_delete, sender=DoctorReview)
+def bump_reviewed_doctor_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versions.bump(versions.doctor_key(instance.doctor_id_id))
+
+
+def owners(instance):
+    values = instance.__dict__
+    return values.get('doctor_id'), values.get('customer_id')
+
+
+@receiver(post_init, sender=Appointment)
+def remember_owners(sender, instance, **kwargs):
+    instance._loaded_owners = owners(instance) if instance.pk else (None, None)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_appointment_versions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # A reassigned appointment also leaves its previous owners' lists
+    previous = getattr(instance, '_loaded_owners', (None, None))
+    instance._loaded_owners = owners(instance)
+    doctors = {previous[0], instance._loaded_owners[0]} - {None}
+    customers = {previous[1], instance._loaded_owners[1]} - {None}
+    versions.bump(
+        *[versions.schedule_key(pk) for pk in doctors],
+        *[versions.customer_key(pk) for pk in customers],
+    )
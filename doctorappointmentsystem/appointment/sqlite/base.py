@@ -0,0 +1,34 @@
+import django
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+if django.VERSION >= (5, 1):
+    # transaction_mode is built in; settings use the stock backend there,
+    # this keeps 'appointment.sqlite' working as an ENGINE too.
+    DatabaseWrapper = base.DatabaseWrapper
+else:
+    class DatabaseWrapper(base.DatabaseWrapper):
+        """
+        Django's SQLite backend with the ``transaction_mode`` option of Django
+        5.1, which 4.2 lacks. A deferred transaction that reads and then writes
+        fails at once with "database is locked" when another connection wrote
+        since its read, whatever busy_timeout is. IMMEDIATE takes the write lock
+        at BEGIN, so concurrent writers wait their turn instead.
+        """
+        transaction_mode = None
+
+        def get_connection_params(self):
+            kwargs = super().get_connection_params()
+            mode = kwargs.pop('transaction_mode', None)
+            if mode is not None and mode.upper() not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f'transaction_mode must be one of {sorted(TRANSACTION_MODES)}, not {mode!r}.'
+                )
+            self.transaction_mode = mode and mode.upper()
+            return kwargs
+
+        def _start_transaction_under_autocommit(self):
+            self.cursor().execute(f'BEGIN {self.transaction_mode}' if self.transaction_mode else 'BEGIN')
@@ -0,0 +1,164 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import counters
+from .models import (
+    Appointment, DailyDoctorStats, DailySpecializationStats, StatsCounter, User,
+)
+
+DAILY_COUNTERS = ['booked', 'approved', 'completed', 'cancelled']
+
+
+def appointment_state(date, doctor_id, is_approved, is_completed, is_cancelled):
+    """What one appointment contributes to the rollups: ``(date, doctor_id, counts)``."""
+    counts = {
+        'booked': 1,
+        'approved': int(bool(is_approved)),
+        'completed': int(bool(is_completed)),
+        'cancelled': int(bool(is_cancelled)),
+        'pending': int(not (is_approved or is_completed or is_cancelled)),
+    }
+    return date, doctor_id, counts
+
+
+def user_state(user_type, is_superuser, is_approved):
+    """What one user contributes to the site counters."""
+    if user_type == 'D':
+        return {'doctors': 1, 'pending_doctors': int(not is_approved)}
+    if user_type == 'C' and not is_superuser:
+        return {'customers': 1}
+    return {}
+
+
+def record_appointments(changes):
+    """
+    Fold ``(old_state, new_state)`` pairs from ``appointment_state`` into the
+    rollups (either side may be None for a create or delete). Runs in the
+    caller's transaction, so the rollups commit or roll back with the change.
+    """
+    daily = defaultdict(Counter)
+    totals = Counter()
+    for old, new in changes:
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            date, doctor_id, counts = state
+            for name, value in counts.items():
+                totals[f'appointments_{name}'] += sign * value
+                if name in DAILY_COUNTERS:
+                    daily[date, doctor_id][name] += sign * value
+    record_counters(totals)
+    daily = {key: {k: v for k, v in delta.items() if v} for key, delta in daily.items()}
+    daily = {key: delta for key, delta in daily.items() if delta}
+    if not daily:
+        return
+
+    specializations = dict(
+        User.objects.filter(pk__in={doctor_id for _, doctor_id in daily})
+        .values_list('pk', 'specialization')
+    )
+    per_specialization = defaultdict(Counter)
+    for (date, doctor_id), delta in daily.items():
+        if doctor_id in specializations:
+            per_specialization[date, specializations[doctor_id]].update(delta)
+    counters.increment(DailyDoctorStats, ['date', 'doctor_id'], daily)
+    counters.increment(DailySpecializationStats, ['date', 'specialization'], per_specialization)
+
+
+def move_specialization(doctor_id, old, new):
+    """
+    Move a doctor's appointments from the ``old`` to the ``new``
+    specialization's daily rollups after their specialization changed, so
+    later changes to those appointments come off the row they were added to.
+    """
+    moved = defaultdict(Counter)
+    for row in DailyDoctorStats.objects.filter(doctor_id=doctor_id).values('date', *DAILY_COUNTERS):
+        date = row.pop('date')
+        moved[date, old].subtract(row)
+        moved[date, new].update(row)
+    with transaction.atomic():
+        counters.increment(DailySpecializationStats, ['date', 'specialization'], moved)
+
+
+def record_counters(delta):
+    counters.increment(StatsCounter, ['name'], {(name,): {'value': value} for name, value in delta.items()},
+                       create_negative=True)
+
+
+def rebuild():
+    """Recompute every rollup from the Appointment and user tables."""
+    flags = {
+        'booked': Count('id'),
+        'approved': Count('id', filter=Q(is_approved=True)),
+        'completed': Count('id', filter=Q(is_completed=True)),
+        'cancelled': Count('id', filter=Q(is_cancelled=True)),
+    }
+    appointments = Appointment.objects.order_by()
+    with transaction.atomic():
+        DailyDoctorStats.objects.all().delete()
+        DailySpecializationStats.objects.all().delete()
+        StatsCounter.objects.all().delete()
+        DailyDoctorStats.objects.bulk_create([
+            DailyDoctorStats(**row)
+            for row in appointments.values('date', 'doctor_id').annotate(**flags).iterator()
+        ], batch_size=1000)
+        DailySpecializationStats.objects.bulk_create([
+            DailySpecializationStats(specialization=row.pop('doctor__specialization'), **row)
+            for row in appointments.values('date', 'doctor__specialization').annotate(**flags).iterator()
+        ], batch_size=1000)
+
+        totals = appointments.aggregate(
+            **{f'appointments_{name}': flag for name, flag in flags.items()},
+            appointments_pending=Count('id', filter=Q(is_approved=False, is_completed=False, is_cancelled=False)),
+        )
+        totals.update(User.objects.aggregate(
+            doctors=Count('id', filter=Q(user_type='D')),
+            pending_doctors=Count('id', filter=Q(user_type='D', is_approved=False)),
+            customers=Count('id', filter=Q(user_type='C', is_superuser=False)),
+        ))
+        StatsCounter.objects.bulk_create([StatsCounter(name=name, value=value) for name, value in totals.items()])
+    return totals
+
+
+def dashboard(days=14, top=5):
+    """
+    Everything the admin index shows, read from the rollups only: a fixed
+    number of counter rows plus at most ``days`` x specializations daily rows,
+    however many appointments exist.
+    """
+    counters = dict(StatsCounter.objects.values_list('name', 'value'))
+    today = timezone.localdate()
+    since = today - datetime.timedelta(days=days - 1)
+    recent = DailySpecializationStats.objects.filter(date__range=(since, today)).order_by()
+    per_day = {
+        row['date']: row
+        for row in recent.values('date').annotate(booked_total=Sum('booked'), cancelled_total=Sum('cancelled'))
+    }
+    booked = sum(row['booked_total'] for row in per_day.values())
+    cancelled = sum(row['cancelled_total'] for row in per_day.values())
+    appointments_per_day = []
+    for offset in range(days):
+        date = since + datetime.timedelta(days=offset)
+        row = per_day.get(date, {})
+        appointments_per_day.append({
+            'date': date, 'booked': row.get('booked_total') or 0, 'cancelled': row.get('cancelled_total') or 0,
+        })
+    return {
+        'user_count': counters.get('doctors', 0) + counters.get('customers', 0),
+        'doctor_count': counters.get('doctors', 0),
+        'customer_count': counters.get('customers', 0),
+        'pending_doctors': counters.get('pending_doctors', 0),
+        'appointment_count': counters.get('appointments_booked', 0),
+        'pending_appointments': counters.get('appointments_pending', 0),
+        'stats_days': days,
+        'appointments_per_day': appointments_per_day,
+        'cancellation_rate': round(100 * cancelled / booked, 1) if booked else None,
+        'top_specializations': list(
+            recent.values('specialization').annotate(booked_total=Sum('booked'))
+            .filter(booked_total__gt=0).order_by('-booked_total', 'specialization')[:top]
+        ),
+    }
@@ -0,0 +1,52 @@
+from crispy_forms.templatetags.crispy_forms_filters import as_crispy_form
+from django import template
+from django.utils.safestring import mark_safe
+
+from appointment.fragments import form_vary_value, fragment_cache
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return mark_safe(fragment_cache.get_or_render(self.name, vary_on, lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Cache the enclosed template in appointment.fragments, once per set of
+    values it varies on::
+
+        {% fragment 'appointment_rows' page_obj.object_list %} ... {% endfragment %}
+
+    Vary on everything the fragment renders from; model instances stand
+    for their column values. Keep {% csrf_token %} and blocks outside.
+    """
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2 or bits[1][0] not in '\'"' or bits[1][-1] != bits[1][0]:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a quoted fragment name.")
+    return FragmentNode(nodelist, bits[1][1:-1], [parser.compile_filter(bit) for bit in bits[2:]])
+
+
+@register.simple_tag
+def cached_form(form, style='', bound=False):
+    """
+    Render ``form`` (``style='crispy'`` for crispy_forms' bootstrap layout)
+    through the fragment cache. Bound forms are cached only with
+    ``bound=True``, for forms like the GET filters whose HTML, errors
+    included, follows from their data alone.
+    """
+    vary_on = form_vary_value(form) if bound or not form.is_bound else None
+    render = (lambda: as_crispy_form(form)) if style == 'crispy' else form.render
+    if vary_on is None:
+        return render()
+    return mark_safe(fragment_cache.get_or_render(f'form:{style}', [vary_on], render))
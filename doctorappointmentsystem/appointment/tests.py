@@ -1,3 +1,1271 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from userauth.forms import RegisterDoctorUserForm
+
+from . import availability, bulk, database, events, images, metrics, search, stats, transitions, urls, versions, views
+from .admin import admin_site
+from .directory import directory_cache
+from .forms import DoctorAdminForm
+from .fragments import fragment_cache
+from .management.commands import benchmark_urls
+from .middlewareFiles import LoggingMiddleware as request_log
+from .middlewareFiles.DatabaseRoutingMiddleware import DatabaseRoutingMiddleware
+from .middlewareFiles.LoginRequiredMiddleware import LoginRequiredMiddleware
+from .models import (
+    DOCTOR_FIELDS, DOCTOR_PROFILE_FIELDS, Appointment, Customer, DailyDoctorStats, DailySpecializationStats, Doctor,
+    DoctorReview, DoctorReviewStats, DoctorSearchIndex, ProfileImageJob, ResourceVersion, StatsCounter, User,
+    start_datetime,
+)
+from .pagination import KeysetPaginator, RankedPaginator
+
+# Logged by CaptureQueriesContext but not run through a cursor, so not seen
+# by the execute wrapper MetricsMiddleware counts with
+TRANSACTION_CONTROL = {'COMMIT', 'ROLLBACK'}
+
+
+def make_doctor(**fields):
+    """An approved doctor with the password 'pw'."""
+    return Doctor.objects.create_user(**{
+        'username': 'doctor', 'password': 'pw', 'first_name': 'Ada', 'last_name': 'Lovelace',
+        'phone_no': '+100000001', 'email': 'doctor@example.com', 'specialization': 'Cardiology',
+        'location': 'Pune', 'experience': '5', 'fee': 100, 'is_approved': True, **fields,
+    })
+
+
+def make_customer(**fields):
+    """A customer with the password 'pw'."""
+    return Customer.objects.create_user(**{
+        'username': 'customer', 'password': 'pw', 'first_name': 'Alan', 'last_name': 'Turing',
+        'phone_no': '+100000002', 'email': 'customer@example.com', **fields,
+    })
+
+
+class UsersMixin:
+    def signed_in(self, user):
+        """A new test client signed in as ``user``."""
+        client = self.client_class()
+        client.force_login(user)
+        return client
+
+
+@override_settings(METRICS={'ENFORCE_BUDGETS': True, 'TOKEN': 'scrape'})
+class QueryBudgetTests(UsersMixin, TransactionTestCase):
+    """
+    Pins every URL in appointment.urls to its view's ``query_budget``. A
+    TransactionTestCase, so requests run as in production: TestCase's
+    wrapping transaction would add savepoint queries and hold back on_commit
+    work. With ENFORCE_BUDGETS, MetricsMiddleware fails any other test that
+    drives a view over its budget, too.
+    """
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        today = datetime.date.today()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+        self.appointments = [
+            Appointment.objects.create(
+                doctor=self.doctor, customer=self.customer, date=self.monday + datetime.timedelta(days=i % 5),
+                start_time=datetime.time(9 + i // 5), end_time=datetime.time(9 + i // 5, 30),
+            )
+            for i in range(12)
+        ]
+        for _ in range(12):
+            DoctorReview.objects.create(doctor_id=self.doctor, author=self.customer, review='Good', rating=4)
+        self.customer_client = self.signed_in(self.customer)
+        self.doctor_client = self.signed_in(self.doctor)
+
+    def assertWithinBudget(self, client, method, path, data=None, status=200, **extra):
+        budget = metrics.budget_of(resolve(path.split('?')[0]).func, method)
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(client, method)(path, data or {}, **extra)
+        self.assertEqual(response.status_code, status)
+        queries = [query['sql'] for query in captured.captured_queries if query['sql'] not in TRANSACTION_CONTROL]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{method.upper()} {path} made {len(queries)} queries, over its budget of {budget}:\n' + '\n'.join(queries),
+        )
+        return response
+
+    def test_every_url_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            view_class = pattern.callback.view_class
+            for method in ['get', 'post']:
+                if hasattr(view_class, method):
+                    with self.subTest(pattern.name, method=method):
+                        self.assertIsNotNone(metrics.budget_of(pattern.callback, method))
+
+    def test_budget_per_method(self):
+        view = resolve(reverse('write_review', args=[self.doctor.pk])).func
+        self.assertEqual(metrics.budget_of(view, 'GET'), 2)
+        self.assertEqual(metrics.budget_of(view, 'post'), 11)
+        self.assertIsNone(metrics.budget_of(view, 'put'))
+
+    def test_directory(self):
+        for query in ['', '?q=lov', '?specialization=card', '?cursor=bad']:
+            self.assertWithinBudget(self.customer_client, 'get', reverse('index') + query)
+
+    def test_profiles(self):
+        self.assertWithinBudget(self.customer_client, 'get', reverse('user_detail', args=[self.customer.pk]))
+        self.assertWithinBudget(self.doctor_client, 'get', reverse('user_detail', args=[self.doctor.pk]))
+        self.assertWithinBudget(self.doctor_client, 'get', reverse('patient_detail', args=[self.customer.pk]))
+
+    def test_change_password(self):
+        path = reverse('change_password')
+        self.assertWithinBudget(self.customer_client, 'get', path)
+        self.assertWithinBudget(self.customer_client, 'post', path, {
+            'old_password': 'pw', 'new_password1': 'N3w-passw0rd!', 'new_password2': 'N3w-passw0rd!',
+        }, status=302)
+
+    def test_change_profile_pic(self):
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64)).save(image, 'PNG')
+        upload = SimpleUploadedFile('me.png', image.getvalue(), 'image/png')
+        with mock.patch('appointment.images.get_storage') as get_storage:
+            get_storage.return_value.exists.return_value = True
+            self.assertWithinBudget(self.customer_client, 'post', reverse('change_profile_pic'),
+                                    {'prifile_pic': upload}, status=302)
+
+    def test_user_appointments(self):
+        for when in ['', '?when=past', '?when=today', '?when=week']:
+            self.assertWithinBudget(self.customer_client, 'get', reverse('user_appointments', args=[self.customer.pk]) + when)
+
+    def test_doctor_pages(self):
+        self.assertWithinBudget(self.customer_client, 'get', reverse('doctor_details', args=[self.doctor.pk]))
+        self.assertWithinBudget(self.customer_client, 'get', reverse('doctor_availability', args=[self.doctor.pk]))
+
+    def test_write_review(self):
+        path = reverse('write_review', args=[self.doctor.pk])
+        self.assertWithinBudget(self.customer_client, 'get', path)
+        self.assertWithinBudget(self.customer_client, 'post', path, {'review': 'Very good', 'rating': 5}, status=302)
+
+    def test_create_appointment(self):
+        path = reverse('create_appointment', args=[self.doctor.pk])
+        self.assertWithinBudget(self.customer_client, 'get', path)
+        self.assertWithinBudget(self.customer_client, 'post', path, {
+            'date': self.monday + datetime.timedelta(days=1), 'start_time': '02:00 PM', 'end_time': '02:30 PM',
+        }, status=302)
+
+    def test_appointment_transitions(self):
+        for name, appointment in zip(['approve_appointment', 'complete_appointment', 'cancel_appointment'], self.appointments):
+            self.assertWithinBudget(self.doctor_client, 'get', reverse(name, args=[appointment.pk]),
+                                    status=302, HTTP_REFERER='/')
+
+    def test_doctor_dashboard(self):
+        for when in ['', '?when=past', '?when=week']:
+            self.assertWithinBudget(self.doctor_client, 'get', reverse('doctor_dashboard', args=[self.doctor.pk]) + when)
+        self.assertWithinBudget(self.doctor_client, 'get', reverse('doctor_appointment_stream', args=[self.doctor.pk]),
+                                status=204)
+
+    def test_bulk_transition(self):
+        path = reverse('bulk_appointment_transition', args=[self.doctor.pk])
+        self.assertWithinBudget(self.doctor_client, 'post', path, {
+            'action': 'approve', 'ids': [appointment.pk for appointment in self.appointments[:5]],
+        })
+        self.assertWithinBudget(self.doctor_client, 'post', path, {'action': 'cancel', 'scope': 'filter', 'format': 'html'})
+
+    def test_api(self):
+        client = self.customer_client
+        self.assertWithinBudget(client, 'get', reverse('api_doctors'))
+        self.assertWithinBudget(client, 'get', reverse('api_doctors') + '?q=ada')
+        self.assertWithinBudget(client, 'get', reverse('api_doctor_detail', args=[self.doctor.pk]))
+        self.assertWithinBudget(client, 'get', reverse('api_doctor_availability', args=[self.doctor.pk]))
+        self.assertWithinBudget(client, 'get', reverse('api_user_appointments', args=[self.customer.pk]))
+        self.assertWithinBudget(self.doctor_client, 'get', reverse('api_user_appointments', args=[self.doctor.pk]))
+        self.assertWithinBudget(client, 'post', reverse('api_book_appointment', args=[self.doctor.pk]), {
+            'date': self.monday + datetime.timedelta(days=2), 'start_time': '15:00', 'end_time': '15:30',
+        }, status=201)
+
+    def test_metrics(self):
+        self.assertWithinBudget(self.customer_client, 'get', reverse('metrics'), status=403)
+        response = self.assertWithinBudget(self.client, 'get', reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertIn(b'# TYPE http_request_db_queries histogram', response.content)
+
+    @override_settings(METRICS={'SERVER_TIMING': True})
+    def test_server_timing(self):
+        response = self.customer_client.get(reverse('doctor_details', args=[self.doctor.pk]))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_no_server_timing_by_default(self):
+        response = self.client.get(reverse('login_user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_budget_is_enforced(self):
+        with mock.patch.object(views.PatientDetailView, 'query_budget', 0):
+            with self.assertRaises(metrics.QueryBudgetExceeded):
+                self.doctor_client.get(reverse('patient_detail', args=[self.customer.pk]))
+
+
+class BenchmarkTests(TestCase):
+    """Keeps seed_perfdata and benchmark_urls working as the URLs change."""
+
+    def test_every_named_url_has_a_scenario(self):
+        self.assertEqual(benchmark_urls.named_urls() - {s.name for s in benchmark_urls.SCENARIOS}, set())
+
+    def test_seed_and_benchmark(self):
+        out = io.StringIO()
+        options = {'doctors': 5, 'customers': 20, 'appointments': 300, 'reviews': 50, 'stdout': out}
+        call_command('seed_perfdata', **options)
+        self.assertEqual(Doctor.objects.count(), 5)
+        self.assertEqual(DoctorReview.objects.count(), 50)
+        first = list(Appointment.objects.values_list('date', 'start_time', 'doctor__username', 'is_completed'))
+        call_command('seed_perfdata', flush=True, **options)
+        self.assertEqual(list(Appointment.objects.values_list('date', 'start_time', 'doctor__username', 'is_completed')),
+                         first)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_urls', requests=2, warmup=0, host='testserver', output=output,
+                         stdout=out, stderr=out)
+            with open(output) as f:
+                results = json.load(f)['urls']
+        self.assertEqual(set(results), {s.label for s in benchmark_urls.SCENARIOS})
+        for label, result in results.items():
+            with self.subTest(label):
+                # Timings are only reported when every request got the expected status
+                self.assertIn('p50_ms', result)
+
+
+class FragmentCacheTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        Appointment.objects.create(doctor=self.doctor, customer=self.customer, date=datetime.date.today() + datetime.timedelta(days=7),
+                                   start_time=datetime.time(9), end_time=datetime.time(9, 30))
+        self.customer_client = self.signed_in(self.customer)
+        self.doctor_client = self.signed_in(self.doctor)
+        self.addCleanup(setattr, fragment_cache, 'enabled', fragment_cache.enabled)
+
+    def get(self, client, path):
+        return re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', client.get(path).content.decode())
+
+    def test_cached_pages_match_uncached(self):
+        pages = [
+            (self.customer_client, reverse('index') + '?specialization=card'),
+            (self.customer_client, reverse('create_appointment', args=[self.doctor.pk])),
+            (self.doctor_client, reverse('doctor_dashboard', args=[self.doctor.pk]) + '?is_approved=false'),
+            (self.client, reverse('register_user')),
+        ]
+        for client, path in pages:
+            with self.subTest(path):
+                fragment_cache.enabled = False
+                expected = self.get(client, path)
+                fragment_cache.enabled = True
+                self.assertEqual(self.get(client, path), expected)
+                self.assertEqual(self.get(client, path), expected)
+
+    def test_edits_change_the_key(self):
+        path = reverse('doctor_dashboard', args=[self.doctor.pk])
+        self.assertIn('Alan', self.get(self.doctor_client, path))
+        self.customer.first_name = 'Grace'
+        self.customer.save()
+        self.assertIn('Grace', self.get(self.doctor_client, path))
+
+    def test_lookups_are_counted(self):
+        lookups = metrics.get_registry().cache_lookups
+        before = dict(lookups.series)
+        fragment_cache.enabled = True
+        fragment_cache.cache.clear()
+        path = reverse('create_appointment', args=[self.doctor.pk])
+        self.get(self.customer_client, path)
+        self.get(self.customer_client, path)
+        counts = {result: lookups.series.get(('fragment', result), 0) - before.get(('fragment', result), 0)
+                  for result in ['hit', 'miss']}
+        self.assertGreater(counts['miss'], 0)
+        self.assertEqual(counts['hit'], counts['miss'])
+        self.assertIn('cache_lookups_total{cache="fragment",result="hit"}', metrics.get_registry().render())
+
+
+class DirectoryCacheTests(UsersMixin, TestCase):
+    def setUp(self):
+        directory_cache.cache.clear()
+        self.doctor = make_doctor()
+        self.customer_client = self.signed_in(make_customer())
+
+    def count(self, metric, *labels):
+        return metrics.get_registry().__dict__[metric].series.get(labels, 0)
+
+    def get_index(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.customer_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        page = re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', response.content.decode())
+        return page, len(captured)
+
+    def test_equivalent_params_share_a_key(self):
+        key = directory_cache.key({'q': 'Ada  LOVELACE', 'location': 'Pune '}, None)
+        self.assertRegex(key, r'^directory:\d+:[0-9a-f]{40}$')
+        self.assertEqual(directory_cache.key({'location': 'pune', 'q': 'ada lovelace', 'page': '3'}, None), key)
+        self.assertEqual(directory_cache.key({'q': 'ada lovelace', 'location': 'pune', 'specialization': ''}, ''), key)
+        self.assertNotEqual(directory_cache.key({'q': 'ada', 'location': 'pune'}, None), key)
+        self.assertNotEqual(directory_cache.key({'q': 'ada lovelace', 'location': 'pune'}, 'abc'), key)
+
+    def test_listed_field_changes_invalidate_after_commit(self):
+        generation = directory_cache.generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.fee = 150
+            self.doctor.save()
+            self.assertEqual(directory_cache.generation(), generation)
+        self.assertEqual(directory_cache.generation(), generation + 1)
+
+        for changes in [{'phone_no': '+100000099'}, {'fee': 150}]:
+            with self.subTest(changes), self.captureOnCommitCallbacks() as callbacks:
+                for name, value in changes.items():
+                    setattr(self.doctor, name, value)
+                self.doctor.save()
+            self.assertNotIn(directory_cache.invalidate, callbacks)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.first_name = 'Grace'
+            self.doctor.save(update_fields=['last_login'])
+        self.assertNotIn(directory_cache.invalidate, callbacks)
+        self.assertEqual(directory_cache.generation(), generation + 1)
+
+    def test_hits_skip_the_queries_and_are_counted(self):
+        hits, misses = self.count('cache_lookups', 'directory', 'hit'), self.count('cache_lookups', 'directory', 'miss')
+        page, miss_queries = self.get_index()
+        cached_page, hit_queries = self.get_index()
+        self.assertEqual(cached_page, page)
+        self.assertLess(hit_queries, miss_queries)
+        self.assertEqual((self.count('cache_lookups', 'directory', 'hit') - hits,
+                          self.count('cache_lookups', 'directory', 'miss') - misses), (1, 1))
+
+    def test_edits_and_approvals_show_on_the_next_request(self):
+        liskov = make_doctor(username='liskov', first_name='Barbara', last_name='Liskov', phone_no='+100000003',
+                             email='liskov@example.com', is_approved=False)
+        invalidations = self.count('cache_invalidations', 'directory')
+        page, _ = self.get_index()
+        self.assertIn('Ada', page)
+        self.assertNotIn('Barbara', page)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.first_name = 'Grace'
+            self.doctor.save()
+        self.assertIn('Grace', self.get_index()[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            liskov.is_approved = True
+            liskov.save()
+        self.assertIn('Barbara', self.get_index()[0])
+        self.assertEqual(self.count('cache_invalidations', 'directory') - invalidations, 2)
+
+
+class RequestLogTests(SimpleTestCase):
+    """The request log writer, on a log file in a temporary directory."""
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = os.path.join(directory, 'requests.log')
+        self.enterContext(mock.patch.dict(request_log._writers, clear=True))
+
+    def writer(self, **options):
+        writer = request_log.get_writer({**request_log.get_log_config(), 'PATH': self.path, **options})
+        self.addCleanup(self.close, writer)
+        return writer
+
+    def close(self, writer):
+        # The writer thread outlives the test; leave it nothing open to write to
+        with writer.write_lock:
+            if writer.stream is not None:
+                writer.stream.close()
+                writer.stream = None
+
+    def records(self, count):
+        return [(1700000000.0, 'GET', f'/{i}', 200, 0.01, None) for i in range(count)]
+
+    def lines(self, path=None):
+        with open(path or self.path) as f:
+            return f.read().splitlines()
+
+    def test_full_buffer_drops_the_oldest(self):
+        writer = self.writer(BUFFER_SIZE=3)
+        with mock.patch.object(writer, 'start'):
+            for record in self.records(5):
+                writer.enqueue(record)
+        writer.flush()
+        lines = self.lines()
+        self.assertEqual([line.split()[3] for line in lines[:3]], ['/2', '/3', '/4'])
+        self.assertTrue(lines[3].endswith('request log buffer full, dropped 2 records'))
+        self.assertEqual(writer.dropped, 0)
+
+    def test_writer_thread_flushes_a_full_batch(self):
+        writer = self.writer(BATCH_SIZE=2, FLUSH_INTERVAL=60)
+        for record in self.records(2):
+            writer.enqueue(record)
+        self.assertTrue(writer.thread.is_alive())
+        for _ in range(100):
+            if os.path.exists(self.path) and len(self.lines()) == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.lines(), [request_log.format_record(record).rstrip() for record in self.records(2)])
+
+    def test_rotates_past_max_bytes(self):
+        writer = self.writer(MAX_BYTES=100, BACKUP_COUNT=2)
+        for i in range(7):
+            writer.write(f'{i}' * 60 + '\n')
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ['requests.log', 'requests.log.1', 'requests.log.2'])
+        self.assertEqual(self.lines(), ['6' * 60])
+        self.assertEqual(self.lines(self.path + '.1'), ['4' * 60, '5' * 60])
+        self.assertEqual(self.lines(self.path + '.2'), ['2' * 60, '3' * 60])
+
+    def test_exit_flush_writes_everything(self):
+        writer = self.writer()
+        with mock.patch.object(writer, 'start'):
+            for record in self.records(1000):
+                writer.enqueue(record)
+        request_log.flush_all()
+        self.assertEqual(len(self.lines()), 1000)
+        self.assertFalse(writer.buffer)
+
+    def test_middleware_logs_each_request(self):
+        with override_settings(REQUEST_LOG={'PATH': self.path, 'MODE': 'sync'}):
+            middleware = request_log.LoggingMiddleware(lambda request: HttpResponse(status=204))
+        self.addCleanup(self.close, middleware.writer)
+        middleware(RequestFactory().get('/doctors/'))
+        self.assertRegex(self.lines()[0], r'^\[[-\d :]+\] GET /doctors/ 204 [\d.]+ms user=-$')
+
+
+class LoginRequiredTests(SimpleTestCase):
+    def setUp(self):
+        self.response = HttpResponse()
+        self.middleware = LoginRequiredMiddleware(lambda request: self.response)
+
+    def get(self, path, user=None):
+        request = RequestFactory().get(path)
+        if user is not None:
+            request.user = user
+        return self.middleware(request)
+
+    def test_public_paths_never_load_the_user(self):
+        paths = [
+            '/login_user/', '/login_doctor/', '/user/register', '/doctor/register', '/admin/', '/admin/login/',
+            '/metrics', '/password_reset/done/', '/reset/MQ/set-password/', '/static/css/site.css',
+            '/media/profile_pics/doctor.png',
+        ]
+        for path in paths:
+            with self.subTest(path):
+                # No request.user, so touching it would raise
+                self.assertIs(self.get(path), self.response)
+
+    def test_near_misses_need_a_login(self):
+        paths = ['/', '/login_anything', '/login_user_x/', '/metrics_anything', '/user/register_anything',
+                 '/staticfiles/site.css', '/mediafoo', '/apiary']
+        for path in paths:
+            with self.subTest(path):
+                response = self.get(path, AnonymousUser())
+                self.assertEqual((response.status_code, response['Location']), (302, reverse('login_user')))
+
+    def test_static_and_media_urls_follow_the_settings(self):
+        with override_settings(STATIC_URL='/assets/', MEDIA_URL='/uploads/'):
+            self.middleware = LoginRequiredMiddleware(lambda request: self.response)
+        self.assertIs(self.get('/assets/site.css'), self.response)
+        self.assertIs(self.get('/uploads/doctor.png'), self.response)
+        self.assertEqual(self.get('/static/site.css', AnonymousUser()).status_code, 302)
+        self.assertEqual(self.get('/media/doctor.png', AnonymousUser()).status_code, 302)
+
+    def test_anonymous_api_requests_get_json_401(self):
+        response = self.get('/api/doctors', AnonymousUser())
+        self.assertEqual((response.status_code, response['Content-Type']), (401, 'application/json'))
+        self.assertEqual(json.loads(response.content), {'error': 'Authentication required.'})
+
+    def test_signed_in_users_pass(self):
+        user = User(username='ada')
+        for path in ['/', '/api/doctors', '/login_anything']:
+            with self.subTest(path):
+                self.assertIs(self.get(path, user), self.response)
+
+
+@contextlib.contextmanager
+def replica_database(path):
+    """A 'replica' alias on its own SQLite file, for the length of the block."""
+    connections.settings['replica'] = {**connections['default'].settings_dict, 'NAME': path}
+    try:
+        yield connections['replica']
+    finally:
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+
+@skipIf('replica' in settings.DATABASES, 'Uses its own replica database.')
+class DatabaseRoutingTests(TransactionTestCase):
+    """Primary and replica are separate SQLite files, so a read shows where it went."""
+
+    def setUp(self):
+        token, _ = database.start()
+        self.addCleanup(database.stop, token)
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.replica = self.enterContext(replica_database(os.path.join(directory, 'replica.sqlite3')))
+        # Django 5.2 refuses aliases missing from databases, even added ones
+        self.enterContext(mock.patch.object(type(self), 'databases', self.databases | {'replica'}))
+        with self.replica.schema_editor() as editor:
+            editor.create_model(ResourceVersion)
+        ResourceVersion.objects.using('replica').create(key='replica')
+
+    def keys(self):
+        return list(ResourceVersion.objects.values_list('key', flat=True))
+
+    def test_reads_follow_writes_to_the_primary(self):
+        self.assertEqual(self.keys(), ['replica'])
+        with transaction.atomic():
+            self.assertEqual(self.keys(), [])
+        ResourceVersion.objects.create(key='primary')
+        self.assertEqual(self.keys(), ['primary'])
+
+    def test_requests_stick_to_the_primary_after_a_write(self):
+        def view(request):
+            if request.method == 'POST':
+                ResourceVersion.objects.create(key='primary')
+            return HttpResponse(','.join(self.keys()))
+
+        middleware = DatabaseRoutingMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get('/'))
+        self.assertEqual((response.content, response.cookies), (b'replica', {}))
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.content, b'primary')
+        request = factory.get('/')
+        request.COOKIES = {key: morsel.value for key, morsel in response.cookies.items()}
+        self.assertEqual(middleware(request).content, b'primary')
+        self.assertEqual(middleware(factory.get('/')).content, b'replica')
+
+    def test_sqlite_pragmas(self):
+        with self.replica.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_transactions_take_the_write_lock(self):
+        with CaptureQueriesContext(connection) as captured, transaction.atomic():
+            ResourceVersion.objects.create(key='primary')
+        self.assertEqual(captured.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class DoctorFieldsTests(TestCase):
+    """The doctor-only columns are optional for customers and required for doctors."""
+
+    def test_customers_validate_without_a_doctor_profile(self):
+        customer = make_customer()
+        customer.full_clean()
+        form_class = admin_site._registry[Customer].get_form(RequestFactory().get('/'), customer)
+        self.assertFalse(set(form_class.base_fields) & set(DOCTOR_FIELDS))
+
+    def test_doctors_need_a_profile(self):
+        data = {'username': 'doc', 'first_name': 'Ada', 'last_name': 'L', 'phone_no': '+100000009',
+                'email': 'doc@example.com', 'password1': 'N3w-passw0rd!', 'password2': 'N3w-passw0rd!'}
+        form = RegisterDoctorUserForm(data)
+        self.assertEqual(set(form.errors), set(DOCTOR_PROFILE_FIELDS))
+        self.assertTrue(DoctorAdminForm().fields['specialization'].required)
+        rows = [(2, {'username': 'doc', 'email': 'doc@example.com', 'phone_no': '+100000009', 'first_name': 'Ada',
+                     'last_name': 'L', 'specialization': 'ENT', 'fee': '100', 'experience': '3'}, None)]
+        [(created, bad)] = bulk.import_rows('doctors', rows)
+        self.assertEqual((created, bad), (0, [(2, 'location: This field is required.')]))
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        today = datetime.date.today()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+
+    def book(self, start, end):
+        return availability.book(Appointment(doctor=self.doctor, customer=self.customer, date=self.monday,
+                                             start_time=start, end_time=end))
+
+    def test_double_booking_is_refused(self):
+        self.book(datetime.time(10), datetime.time(10, 30))
+        with self.assertRaises(availability.SlotUnavailable) as raised:
+            self.book(datetime.time(10, 15), datetime.time(10, 45))
+        self.assertEqual(raised.exception.code, 'slot_taken')
+        self.assertNotIn((datetime.time(10), datetime.time(10, 30)),
+                         availability.free_slots(self.doctor, days=1, start_date=self.monday)[self.monday])
+
+    def test_booking_outside_working_hours_is_refused(self):
+        with self.assertRaises(availability.SlotUnavailable) as raised:
+            self.book(datetime.time(16, 45), datetime.time(17, 15))
+        self.assertEqual(raised.exception.code, 'outside_hours')
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_slots_that_have_started_are_not_offered(self):
+        now = start_datetime(self.monday, datetime.time(10, 10))
+        with mock.patch('appointment.availability.current_time', return_value=now):
+            slots = availability.free_slots(self.doctor, days=8, start_date=self.monday - datetime.timedelta(days=7))
+        self.assertEqual(list(slots), [self.monday])
+        self.assertEqual(slots[self.monday][0], (datetime.time(10, 30), datetime.time(11)))
+
+    def test_booking_in_the_past_is_refused(self):
+        now = start_datetime(self.monday, datetime.time(10, 10))
+        with mock.patch('appointment.availability.current_time', return_value=now):
+            with self.assertRaises(availability.SlotUnavailable) as raised:
+                self.book(datetime.time(10), datetime.time(10, 30))
+            self.assertEqual(raised.exception.code, 'in_past')
+            self.book(datetime.time(10, 30), datetime.time(11))
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_working_hours_are_validated(self):
+        self.doctor.slot_minutes = 0
+        self.doctor.work_end = datetime.time(8)
+        with self.assertRaises(ValidationError) as raised:
+            self.doctor.full_clean()
+        self.assertEqual(set(raised.exception.message_dict), {'slot_minutes', 'work_end'})
+        self.assertEqual(availability.DayIndex().free_slots(540, 1020, 0), [])
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        Appointment.objects.create(doctor=self.doctor, customer=self.customer, date=datetime.date(2026, 3, 2),
+                                   start_time=datetime.time(9), end_time=datetime.time(9, 30), is_approved=True)
+
+    def export(self, kind, format):
+        return ''.join(bulk.export_lines(kind, format, passwords=True))
+
+    def load(self, kind, text, format):
+        return [bad for _, bad in bulk.import_rows(kind, bulk.read_rows(io.StringIO(text), format), welcome_email=False)]
+
+    def test_round_trip_into_an_empty_database(self):
+        doctors, customers = self.export('doctors', 'csv'), self.export('customers', 'jsonl')
+        appointments = self.export('appointments', 'jsonl')
+        User.objects.all().delete()
+        StatsCounter.objects.all().delete()
+        ResourceVersion.objects.all().delete()
+
+        [row] = csv.DictReader(io.StringIO(doctors))
+        rows = [
+            row,
+            row,                                                    # line 3: clashes with line 2
+            {**row, 'username': 'other', 'password': 'plain'},      # line 4
+            {**row, 'username': 'third', 'location': ''},           # line 5
+        ]
+        with_bad_rows = ''.join(bulk.csv_lines(bulk.columns('doctors', passwords=True), rows))
+        self.assertEqual(self.load('doctors', with_bad_rows, 'csv'), [[
+            (3, 'username, email, phone_no already taken'),
+            (4, 'password: Not an encoded password; pass plain text as raw_password.'),
+            (5, 'location: This field is required.'),
+        ]])
+        self.assertEqual(self.load('customers', customers, 'jsonl'), [[]])
+        self.assertEqual(dict(StatsCounter.objects.values_list('name', 'value')),
+                         {'doctors': 1, 'customers': 1})
+        self.assertEqual(self.load('appointments', appointments, 'jsonl'), [[]])
+
+        self.assertEqual(self.export('doctors', 'csv'), doctors)
+        self.assertEqual(self.export('customers', 'jsonl'), customers)
+        self.assertEqual(self.export('appointments', 'jsonl'), appointments)
+        doctor = Doctor.objects.get()
+        self.assertTrue(doctor.check_password('pw'))
+        self.assertEqual(StatsCounter.objects.get(name='appointments_approved').value, 1)
+        self.assertTrue(DoctorSearchIndex.objects.filter(doctor=doctor).exists())
+        self.assertEqual(versions.get(versions.DIRECTORY, versions.schedule_key(doctor.pk)), [1, 1])
+
+    def test_bad_lines_are_reported(self):
+        rows = '{"doctor_email": "nobody@example.com"}\n\nnot json\n'
+        [bad] = self.load('appointments', rows, 'jsonl')
+        self.assertEqual([line for line, _ in bad], [1, 3])
+        self.assertTrue(bad[1][1].startswith('Invalid JSON'))
+
+
+class DoctorDashboardTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        self.client = self.signed_in(self.doctor)
+        self.path = reverse('doctor_dashboard', args=[self.doctor.pk])
+        today = datetime.date.today()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+
+    def book(self, count, **fields):
+        return [
+            Appointment.objects.create(doctor=self.doctor, customer=self.customer, date=self.monday + datetime.timedelta(days=i),
+                                       start_time=datetime.time(9), end_time=datetime.time(9, 30), **fields)
+            for i in range(count)
+        ]
+
+    def listed(self, query=''):
+        return [appointment.pk for appointment in self.client.get(self.path + query).context['appointment_list']]
+
+    def test_filters_before_paginating(self):
+        approved = self.book(7, is_approved=True)
+        self.book(3)
+        response = self.client.get(self.path + '?is_approved=true')
+        self.assertEqual([a.pk for a in response.context['appointment_list']], [a.pk for a in approved[:5]])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertEqual(self.listed(f'?is_approved=true&cursor={cursor}'), [a.pk for a in approved[5:]])
+
+    def test_timeline_links_keep_the_filters(self):
+        response = self.client.get(self.path + '?is_approved=true&when=past&cursor=abc')
+        self.assertContains(response, 'href="?is_approved=true&when=week"')
+        self.assertContains(self.client.get(self.path), 'href="?when=past"')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.book(1)
+        self.client.get(self.path)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(self.path)
+        Appointment.objects.all().delete()
+        self.book(5)
+        with self.assertNumQueries(len(one)):
+            self.assertEqual(len(self.listed()), 5)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        doctor, customer = make_doctor(), make_customer()
+        # Pairs of rows share a date and start time, so the id breaks the tie
+        self.appointments = [
+            Appointment.objects.create(doctor=doctor, customer=customer, date=datetime.date(2026, 3, 2 + i // 2),
+                                       start_time=datetime.time(9), end_time=datetime.time(9, 30))
+            for i in range(7)
+        ]
+        self.paginator = KeysetPaginator(Appointment.objects.all(), 3)
+
+    def ids(self, page):
+        return [appointment.pk for appointment in page]
+
+    def test_cursors_walk_every_row_once(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([self.ids(page) for page in pages],
+                         [[a.pk for a in self.appointments[i:i + 3]] for i in (0, 3, 6)])
+        self.assertFalse(pages[0].has_previous())
+        back = self.paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(pages[1]))
+        self.assertEqual(self.ids(self.paginator.get_page(back.previous_cursor)), self.ids(pages[0]))
+
+    def test_deep_pages_cost_one_query(self):
+        cursor = self.paginator.get_page(self.paginator.get_page().next_cursor).next_cursor
+        with self.assertNumQueries(1):
+            self.paginator.get_page(cursor)
+
+    def test_bad_or_foreign_cursors_fall_back_to_page_one(self):
+        first = self.ids(self.paginator.get_page())
+        doctors = KeysetPaginator(Doctor.objects.all(), 3)
+        foreign = doctors.encode_cursor('n', Doctor.objects.get())
+        for cursor in ['', 'garbage', 'WyJ4Il0', foreign]:
+            with self.subTest(cursor):
+                self.assertEqual(self.ids(self.paginator.get_page(cursor)), first)
+        ranked = [a.pk for a in reversed(self.appointments)]
+        self.assertEqual(self.ids(RankedPaginator(Appointment.objects.all(), 3, ranked).get_page('garbage')), ranked[:3])
+
+    def test_cursor_survives_its_row_being_deleted(self):
+        cursor = self.paginator.get_page().next_cursor
+        self.appointments[2].delete()
+        self.assertEqual(self.ids(self.paginator.get_page(cursor)), [a.pk for a in self.appointments[3:6]])
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        self.ada = make_doctor()
+        self.grace = make_doctor(username='grace', email='grace@example.com', phone_no='+100000011',
+                                 first_name='Grace', last_name='Hopper', location='Ádana')
+        self.alan = make_doctor(username='alan', email='alan@example.com', phone_no='+100000012',
+                                first_name='Alan', last_name='Turing', specialization='Neurology')
+        make_doctor(username='adam', email='adam@example.com', phone_no='+100000013', first_name='Adam', is_approved=False)
+
+    def rankings(self, backend):
+        backend.setup()
+        backend.clear()
+        for entry in DoctorSearchIndex.objects.all():
+            backend.index(entry)
+        queries = [{'q': 'ada'}, {'q': 'card pune'}, {'q': 'TUR'}, {'specialization': 'neu'}, {'q': 'lovelace hopper'}]
+        return [backend.search(search.query_terms(**params)) for params in queries]
+
+    def test_backends_rank_alike(self):
+        expected = [[self.ada.pk, self.grace.pk], [self.ada.pk], [self.alan.pk], [self.alan.pk], []]
+        self.assertEqual(self.rankings(search.TokenSearchBackend()), expected)
+        if not search.fts5_available():
+            self.skipTest('SQLite was built without FTS5.')
+        self.assertEqual(self.rankings(search.FTS5SearchBackend()), expected)
+
+
+class BulkTransitionTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.other = make_doctor(username='grace', email='grace@example.com', phone_no='+100000011')
+        customer = make_customer()
+        self.client = self.signed_in(self.doctor)
+        self.path = reverse('bulk_appointment_transition', args=[self.doctor.pk])
+        self.appointments = [
+            Appointment.objects.create(doctor=doctor, customer=customer, date=datetime.date(2026, 3, 2),
+                                       start_time=datetime.time(9 + i), end_time=datetime.time(9 + i, 30))
+            for i, doctor in enumerate([self.doctor, self.doctor, self.doctor, self.other])
+        ]
+
+    def post(self, **data):
+        return self.client.post(self.path, data)
+
+    def updated(self, response):
+        return sorted(row['id'] for row in response.json()['updated'])
+
+    def test_only_own_appointments_in_a_valid_state_change(self):
+        mine, cancelled, _, theirs = self.appointments
+        Appointment.objects.filter(pk=cancelled.pk).update(is_cancelled=True)
+        response = self.post(action='complete', ids=[mine.pk, cancelled.pk, theirs.pk])
+        self.assertEqual(self.updated(response), [mine.pk])
+        self.assertEqual(
+            list(Appointment.objects.order_by('pk').values_list('is_completed', flat=True)), [True, False, False, False],
+        )
+        # Completed appointments can't be cancelled either
+        self.assertEqual(self.updated(self.post(action='cancel', ids=[mine.pk])), [])
+
+    def test_filter_scope(self):
+        first, second, third, _ = self.appointments
+        Appointment.objects.filter(pk=second.pk).update(is_approved=True)
+        response = self.post(action='cancel', scope='filter', is_approved='false')
+        self.assertEqual(self.updated(response), [first.pk, third.pk])
+        self.assertEqual(self.updated(self.post(action='approve')), [])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post(action='delete', ids=[1]).status_code, 400)
+        self.assertEqual(self.post(action='approve', ids=['x']).status_code, 400)
+        path = reverse('bulk_appointment_transition', args=[self.other.pk])
+        self.assertEqual(self.client.post(path, {'action': 'approve', 'scope': 'filter'}).status_code, 404)
+        self.assertFalse(Appointment.objects.filter(is_approved=True).exists())
+
+    def test_single_transitions_need_the_appointment_owner(self):
+        mine, second, _, theirs = self.appointments
+        referer = {'HTTP_REFERER': '/dashboard'}
+        self.assertEqual(self.client.get(reverse('approve_appointment', args=[theirs.pk]), **referer).status_code, 404)
+        customer = self.signed_in(mine.customer)
+        self.assertEqual(customer.get(reverse('approve_appointment', args=[mine.pk]), **referer).status_code, 404)
+        self.assertFalse(Appointment.objects.filter(is_approved=True).exists())
+        self.assertEqual(self.client.get(reverse('approve_appointment', args=[mine.pk]), **referer).status_code, 302)
+        self.assertEqual(customer.get(reverse('cancel_appointment', args=[second.pk]), **referer).status_code, 302)
+        self.assertEqual(
+            list(Appointment.objects.order_by('pk').values_list('is_approved', 'is_cancelled')),
+            [(True, False), (False, True), (False, False), (False, False)],
+        )
+
+
+class ReviewStatsTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.ada = make_doctor()
+        self.grace = make_doctor(username='grace', phone_no='+100000003', email='grace@example.com')
+        self.customer = make_customer()
+
+    def assertStatsMatchReviews(self):
+        for doctor in [self.ada, self.grace]:
+            with self.subTest(doctor.username):
+                expected = DoctorReview.objects.filter(doctor_id=doctor).aggregate(
+                    review_count=Count('id'), rating_count=Count('rating'),
+                    rating_sum=Coalesce(Sum('rating'), 0), last_review_at=Max('created_at'),
+                )
+                # A doctor nobody has reviewed has no row yet
+                empty = {'review_count': 0, 'rating_count': 0, 'rating_sum': 0, 'last_review_at': None}
+                self.assertEqual(DoctorReviewStats.objects.filter(doctor=doctor).values(*expected).first() or empty,
+                                 expected)
+
+    def review(self, doctor, rating):
+        return DoctorReview.objects.create(doctor_id=doctor, author=self.customer, review='Fine', rating=rating)
+
+    def test_stats_follow_every_review_change(self):
+        first, second, unrated = self.review(self.ada, 4), self.review(self.ada, 5), self.review(self.ada, None)
+        self.assertStatsMatchReviews()
+        self.signed_in(self.customer).post(reverse('write_review', args=[self.ada.pk]), {'review': 'Good', 'rating': 3})
+        self.assertEqual(DoctorReview.objects.filter(doctor_id=self.ada).count(), 4)
+        self.assertStatsMatchReviews()
+
+        first.rating = 2
+        first.save()
+        unrated.rating = 1
+        unrated.save()
+        self.assertStatsMatchReviews()
+        second.doctor_id = self.grace
+        second.save()
+        self.assertStatsMatchReviews()
+
+        DoctorReview.objects.filter(doctor_id=self.ada).latest('id').delete()
+        self.assertStatsMatchReviews()
+        second.delete()
+        self.assertStatsMatchReviews()
+        self.assertEqual(DoctorReviewStats.objects.get(doctor=self.grace).last_review_at, None)
+
+
+class StatsTests(UsersMixin, TestCase):
+    def rollups(self):
+        """Every rollup row with a non-zero count."""
+        counters = {name: value for name, value in StatsCounter.objects.values_list('name', 'value') if value}
+        daily = {
+            model.__name__: sorted(tuple(row.values()) for row in model.objects.values(*keys, *stats.DAILY_COUNTERS)
+                                   if any(row[name] for name in stats.DAILY_COUNTERS))
+            for model, keys in [(DailyDoctorStats, ['date', 'doctor']), (DailySpecializationStats, ['date', 'specialization'])]
+        }
+        return counters, daily
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        ada = make_doctor()
+        grace = make_doctor(username='grace', email='grace@example.com', phone_no='+100000011', specialization='ENT')
+        customer = make_customer()
+        appointments = [
+            Appointment.objects.create(doctor=doctor, customer=customer, date=datetime.date(2026, 3, 2 + i % 3),
+                                       start_time=datetime.time(9 + i), end_time=datetime.time(9 + i, 30))
+            for i, doctor in enumerate([ada, ada, ada, ada, grace, grace])
+        ]
+        transitions.apply(Appointment.objects.filter(pk__in=[a.pk for a in appointments[:3]]), 'approve')
+        transitions.apply(Appointment.objects.filter(pk=appointments[0].pk), 'complete')
+        transitions.apply(Appointment.objects.filter(doctor=ada), 'cancel')
+        appointments[4].is_approved = True
+        appointments[4].save()
+        Appointment.objects.get(pk=appointments[1].pk).delete()
+        Doctor.objects.get(pk=grace.pk).delete()
+
+        incremental = self.rollups()
+        stats.rebuild()
+        self.assertEqual(incremental, self.rollups())
+        self.assertEqual(incremental[0], {
+            'doctors': 1, 'customers': 1, 'appointments_booked': 3, 'appointments_approved': 2,
+            'appointments_completed': 1, 'appointments_cancelled': 2,
+        })
+
+    def test_specialization_change_moves_the_rollups(self):
+        ada = make_doctor()
+        customer = make_customer()
+        appointments = [
+            Appointment.objects.create(doctor=ada, customer=customer, date=datetime.date(2026, 3, 2 + i),
+                                       start_time=datetime.time(9), end_time=datetime.time(9, 30))
+            for i in range(2)
+        ]
+        doctor = Doctor.objects.get(pk=ada.pk)
+        doctor.specialization = 'Neurology'
+        doctor.save()
+        Appointment.objects.get(pk=appointments[0].pk).delete()
+        transitions.apply(Appointment.objects.filter(pk=appointments[1].pk), 'cancel')
+
+        incremental = self.rollups()
+        self.assertEqual(incremental[1]['DailySpecializationStats'],
+                         [(datetime.date(2026, 3, 3), 'Neurology', 1, 0, 0, 1)])
+        self.assertFalse(DailySpecializationStats.objects.filter(booked__lt=0).exists())
+        stats.rebuild()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_admin_index_reads_the_rollups(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        make_doctor(is_approved=False)
+        client = self.signed_in(admin)
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(reverse('admin:index'))
+        self.assertEqual((response.context['doctor_count'], response.context['pending_doctors']), (1, 1))
+        self.assertFalse([query['sql'] for query in captured if 'appointment_appointment' in query['sql']])
+
+
+class AdminChangelistTests(UsersMixin, TestCase):
+    """Changelist pages cost the same number of queries however many rows they show."""
+
+    def setUp(self):
+        self.admin = self.signed_in(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.add_rows(0)
+
+    def add_rows(self, start):
+        # No passwords, so no hashing
+        customer = make_customer(username=f'customer{start}', password=None, phone_no=f'+2{start:08}',
+                                 email=f'c{start}@example.com')
+        for i in range(start, start + 5):
+            doctor = make_doctor(username=f'doctor{i}', password=None, phone_no=f'+1{i:08}', email=f'd{i}@example.com',
+                                 specialization=['Cardiology', 'Neurology'][i % 2])
+            for day in range(3):
+                Appointment.objects.create(doctor=doctor, customer=customer,
+                                           date=datetime.date(2030, 1, 7) + datetime.timedelta(days=day),
+                                           start_time=datetime.time(9), end_time=datetime.time(9, 30))
+
+    def assertQueriesStayAt(self, count, path, rows):
+        for start in [5, 10]:
+            with self.assertNumQueries(count):
+                response = self.admin.get(path)
+            self.assertEqual(len(response.context['cl'].result_list), rows(start))
+            self.add_rows(start)
+
+    def test_doctor_changelist(self):
+        self.assertQueriesStayAt(5, reverse('admin:appointment_doctor_changelist'), lambda n: n)
+
+    def test_doctor_search(self):
+        self.assertQueriesStayAt(5, reverse('admin:appointment_doctor_changelist') + '?q=card', lambda n: (n + 1) // 2)
+
+    def test_appointment_changelist(self):
+        self.assertQueriesStayAt(8, reverse('admin:appointment_appointment_changelist'), lambda n: n * 3)
+
+    def test_appointment_search(self):
+        path = reverse('admin:appointment_appointment_changelist') + '?q=Alan&specialization=Neurology'
+        self.assertQueriesStayAt(7, path, lambda n: n // 2 * 3)
+
+
+@override_settings(TIME_ZONE='Asia/Kolkata')
+class TimelineTests(UsersMixin, TestCase):
+    # Wednesday 4 March 2026, 12:00 in Kolkata
+    now = datetime.datetime(2026, 3, 4, 6, 30, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.enterContext(mock.patch('appointment.models.current_time', return_value=self.now))
+        self.enterContext(mock.patch('appointment.models.current_date', return_value=datetime.date(2026, 3, 4)))
+        doctor, self.customer = make_doctor(), make_customer()
+        # Local start times, around "now"
+        self.appointments = {
+            name: Appointment.objects.create(doctor=doctor, customer=self.customer, date=date, start_time=start,
+                                             end_time=(datetime.datetime.combine(date, start) + datetime.timedelta(minutes=30)).time())
+            for name, date, start in [
+                ('last_week', datetime.date(2026, 2, 27), datetime.time(9)),
+                ('monday', datetime.date(2026, 3, 2), datetime.time(9)),
+                ('this_morning', datetime.date(2026, 3, 4), datetime.time(11, 30)),
+                ('this_afternoon', datetime.date(2026, 3, 4), datetime.time(12, 30)),
+                ('sunday', datetime.date(2026, 3, 8), datetime.time(9)),
+                ('next_week', datetime.date(2026, 3, 9), datetime.time(9)),
+            ]
+        }
+
+    def names(self, appointments):
+        by_pk = {appointment.pk: name for name, appointment in self.appointments.items()}
+        return [by_pk[appointment.pk] for appointment in appointments]
+
+    def test_querysets(self):
+        appointments = Appointment.objects.all()
+        self.assertEqual(self.names(appointments.upcoming()), ['this_afternoon', 'sunday', 'next_week'])
+        self.assertEqual(self.names(appointments.past()), ['this_morning', 'monday', 'last_week'])
+        self.assertEqual(self.names(appointments.today()), ['this_morning', 'this_afternoon'])
+        self.assertEqual(self.names(appointments.for_week()), ['monday', 'this_morning', 'this_afternoon', 'sunday'])
+        self.assertEqual([name for name, a in self.appointments.items() if a.is_outdated()],
+                         ['last_week', 'monday', 'this_morning'])
+
+    def test_starts_at_follows_date_and_time(self):
+        appointment = self.appointments['next_week']
+        appointment.date = datetime.date(2026, 3, 1)
+        appointment.save()
+        self.assertIn(appointment, Appointment.objects.past())
+
+    def test_user_appointments_default_to_upcoming(self):
+        client = self.signed_in(self.customer)
+        path = reverse('user_appointments', args=[self.customer.pk])
+        self.assertEqual(self.names(client.get(path).context['appointment_details']), ['this_afternoon', 'sunday', 'next_week'])
+        self.assertEqual(self.names(client.get(path + '?when=past').context['appointment_details']),
+                         ['this_morning', 'monday', 'last_week'])
+
+
+class ApiTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        self.client = self.signed_in(self.customer)
+        self.path = reverse('api_doctor_detail', args=[self.doctor.pk])
+
+    def test_conditional_get(self):
+        response = self.client.get(self.path)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.doctor.fee = 150
+        self.doctor.save()
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()['fee']), (200, 150))
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_doctors_are_404_even_when_the_etag_matches(self):
+        etag = self.client.get(self.path)['ETag']
+        doctor_pk = self.doctor.pk
+        self.doctor.delete()
+        for name in ['api_doctor_detail', 'api_doctor_availability']:
+            with self.subTest(name):
+                response = self.client.get(reverse(name, args=[doctor_pk]), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_doctor_detail', args=[0]), HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_anonymous_requests_get_json_401(self):
+        self.client.logout()
+        response = self.client.get(self.path)
+        self.assertEqual((response.status_code, response['Content-Type']), (401, 'application/json'))
+        self.assertEqual(self.client.get(reverse('index')).status_code, 302)
+
+    def test_refusals_are_json_403(self):
+        path = reverse('api_book_appointment', args=[self.doctor.pk])
+        data = {'date': '2030-01-07', 'start_time': '10:00', 'end_time': '10:30'}
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.customer)
+        response = client.post(path, data)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['error'])
+        response = self.signed_in(self.doctor).post(path, data)
+        self.assertEqual((response.status_code, response['Content-Type']), (403, 'application/json'))
+        self.assertFalse(Appointment.objects.exists())
+
+
+class LiveEventTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        self.hub = events.LocalHub({'QUEUE_SIZE': 2})
+        self.enterContext(mock.patch.object(events, '_hub', self.hub))
+
+    async def test_local_hub_delivers_to_the_channel_only(self):
+        async with self.hub.subscribe('doctor:1') as subscription:
+            # publish() is called from sync views, on other threads
+            await asyncio.to_thread(self.hub.publish, 'doctor:1', 'first')
+            self.hub.publish('doctor:2', 'elsewhere')
+            self.assertEqual(await subscription.get(timeout=1), 'first')
+            with self.assertRaises(asyncio.TimeoutError):
+                await subscription.get(timeout=0.05)
+        self.assertEqual(self.hub.subscribers, {})
+
+    async def test_a_full_queue_becomes_one_resync(self):
+        async with self.hub.subscribe('doctor:1') as subscription:
+            for message in ['a', 'b', 'c']:
+                self.hub.publish('doctor:1', message)
+            self.assertEqual(await subscription.get(timeout=1), events.RESYNC)
+            with self.assertRaises(asyncio.TimeoutError):
+                await subscription.get(timeout=0.05)
+
+    def test_messages_carry_status_and_version(self):
+        channel = events.doctor_channel(self.doctor.pk)
+        with mock.patch.object(self.hub, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = Appointment.objects.create(doctor=self.doctor, customer=self.customer,
+                                                         date=datetime.date(2030, 1, 7), start_time=datetime.time(9),
+                                                         end_time=datetime.time(9, 30))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.signed_in(self.doctor).post(reverse('bulk_appointment_transition', args=[self.doctor.pk]),
+                                                 {'action': 'approve', 'ids': [appointment.pk]})
+            with self.captureOnCommitCallbacks(execute=True):
+                Appointment.objects.get(pk=appointment.pk).delete()
+        messages = [(args[0], json.loads(args[1])) for args, _ in publish.call_args_list]
+        self.assertEqual(
+            [(name, message['event'], [(a['id'], a['status'], a['version']) for a in message['appointments']])
+             for name, message in messages],
+            [
+                (channel, 'created', [(appointment.pk, 'pending', 1)]),
+                (channel, 'approved', [(appointment.pk, 'approved', 2)]),
+                (channel, 'deleted', [(appointment.pk, 'approved', 3)]),
+            ],
+        )
+        self.assertEqual(messages[0][1]['appointments'][0]['start_time'], '09:00:00')
+
+    async def test_stream_relays_the_doctors_channel(self):
+        view = views.DoctorAppointmentStreamView(heartbeat=0.05)
+        stream = view.stream(self.doctor.pk)
+        self.assertEqual(await stream.__anext__(), 'retry: 5000\n\n')
+        self.assertEqual(await stream.__anext__(), ': keep-alive\n\n')
+        self.hub.publish(events.doctor_channel(self.doctor.pk), '{"event": "approved"}')
+        self.assertEqual(await stream.__anext__(), 'data: {"event": "approved"}\n\n')
+        await stream.aclose()
+        self.assertEqual(self.hub.subscribers, {})
+
+    async def test_stream_ends_after_max_duration(self):
+        view = views.DoctorAppointmentStreamView(max_duration=0)
+        self.assertEqual([chunk async for chunk in view.stream(self.doctor.pk)], ['retry: 5000\n\n'])
+
+
+@override_settings(METRICS={'SERVER_TIMING': True, 'ENFORCE_BUDGETS': True})
+class AsyncViewTests(TestCase):
+    """The async views and middleware paths, under AsyncClient as under ASGI."""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.customer = make_customer()
+        self.other = make_customer(username='other', phone_no='+100000003', email='other@example.com')
+        Appointment.objects.create(doctor=self.doctor, customer=self.customer, date=datetime.date(2030, 1, 7),
+                                   start_time=datetime.time(9), end_time=datetime.time(9, 30))
+        self.async_client.force_login(self.customer)
+
+    async def test_anonymous_requests_are_turned_away(self):
+        client = AsyncClient()
+        response = await client.get(reverse('user_appointments', args=[self.customer.pk]))
+        self.assertEqual((response.status_code, response['Location']), (302, reverse('login_user')))
+        response = await client.get(reverse('api_user_appointments', args=[self.customer.pk]))
+        self.assertEqual((response.status_code, response['Content-Type']), (401, 'application/json'))
+
+    async def test_pages_stay_within_their_budgets(self):
+        paths = [
+            reverse('index'), reverse('doctor_details', args=[self.doctor.pk]),
+            reverse('doctor_availability', args=[self.doctor.pk]), reverse('user_appointments', args=[self.customer.pk]),
+        ]
+        for path in paths:
+            with self.subTest(path):
+                # ENFORCE_BUDGETS would raise QueryBudgetExceeded here
+                response = await self.async_client.get(path)
+                self.assertEqual(response.status_code, 200)
+                queries = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+                self.assertLessEqual(queries, metrics.budget_of(resolve(path).func, 'get'))
+
+    async def test_user_appointments_are_the_owners_only(self):
+        response = await self.async_client.get(reverse('user_appointments', args=[self.customer.pk]))
+        self.assertContains(response, 'Jan. 7, 2030')
+        response = await self.async_client.get(reverse('user_appointments', args=[self.other.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfilePicTests(UsersMixin, TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.client = self.signed_in(self.customer)
+        self.path = reverse('change_profile_pic')
+        self.enterContext(mock.patch('appointment.images.get_storage'))
+
+    def upload(self, content, client=None):
+        return (client or self.client).post(self.path, {'prifile_pic': SimpleUploadedFile('me.png', content, 'image/png')})
+
+    def png(self):
+        image = io.BytesIO()
+        Image.effect_noise((64, 64), 100).convert('RGB').save(image, 'PNG')
+        return image.getvalue()
+
+    def test_valid_upload_is_staged(self):
+        response = self.upload(self.png())
+        self.assertRedirects(response, reverse('user_detail', args=[self.customer.pk]), fetch_redirect_response=False)
+        self.assertTrue(ProfileImageJob.objects.exists())
+
+    @override_settings(PROFILE_IMAGES={'MAX_UPLOAD_BYTES': 1024})
+    def test_oversized_upload_is_cut_off_and_reported(self):
+        with mock.patch.object(images.LimitedUploadHandler, 'receive_data_chunk', autospec=True,
+                               side_effect=images.LimitedUploadHandler.receive_data_chunk) as receive:
+            response = self.upload(self.png())
+        self.assertContains(response, 'The image is larger than 1.0\xa0KB.')
+        self.assertEqual(receive.call_count, 1)
+        self.assertFalse(ProfileImageJob.objects.exists())
+
+    def test_invalid_uploads_are_reported(self):
+        self.assertContains(self.upload(b'not an image'), 'Upload a valid image')
+        self.assertContains(self.client.post(self.path), 'Choose an image to upload.')
+        self.assertFalse(ProfileImageJob.objects.exists())
+
+    def test_handler_is_scoped_to_the_view_and_csrf_still_checked(self):
+        self.assertNotIn('appointment.images.LimitedUploadHandler', settings.FILE_UPLOAD_HANDLERS)
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.customer)
+        self.assertEqual(self.upload(self.png(), client).status_code, 403)
+        self.assertFalse(ProfileImageJob.objects.exists())
+        # A forged oversized POST from a browser holding the CSRF cookie is cut
+        # off at the limit before it is refused
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 32
+        with override_settings(PROFILE_IMAGES={'MAX_UPLOAD_BYTES': 1024}), \
+                mock.patch.object(images.LimitedUploadHandler, 'receive_data_chunk', autospec=True,
+                                  side_effect=images.LimitedUploadHandler.receive_data_chunk) as receive, \
+                mock.patch('appointment.images.store_upload') as store_upload:
+            self.assertEqual(self.upload(self.png(), client).status_code, 403)
+        self.assertEqual(receive.call_count, 1)
+        store_upload.assert_not_called()
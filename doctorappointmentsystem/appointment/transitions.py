@@ -0,0 +1,93 @@
+import sqlite3
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.models import Q
+
+from . import events, stats, versions
+from .models import Appointment
+
+# action -> (flag it sets, states it may be applied from)
+TRANSITIONS = {
+    'approve': ('is_approved', Q(is_approved=False, is_cancelled=False, is_completed=False)),
+    'complete': ('is_completed', Q(is_completed=False, is_cancelled=False)),
+    'cancel': ('is_cancelled', Q(is_cancelled=False, is_completed=False)),
+}
+
+RETURNED_FIELDS = ['id', 'date', 'start_time', 'end_time', 'doctor_id', 'customer_id', 'is_approved', 'is_completed', 'is_cancelled']
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def _supports_update_returning(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def apply(queryset, action):
+    """
+    Apply ``action`` to every appointment in ``queryset`` whose current state
+    allows it, as one UPDATE whose WHERE clause carries the state check.
+    Returns the updated rows as dicts of RETURNED_FIELDS; rows in an invalid
+    state (e.g. completing a cancelled appointment) are left untouched.
+    """
+    if action not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown action {action!r}.')
+    flag, allowed = TRANSITIONS[action]
+    with transaction.atomic(using=queryset.db):
+        rows = _update(queryset, flag, allowed)
+        _record_changes(rows, flag)
+    return rows
+
+
+def _update(queryset, flag, allowed):
+    queryset = queryset.filter(allowed).order_by()
+    connection = connections[queryset.db]
+
+    joined = sum(1 for count in queryset.query.alias_refcount.values() if count) > 1
+    if joined or not _supports_update_returning(connection):
+        # Fallback: two queries, the selected rows are then updated by pk
+        rows = list(queryset.values(*RETURNED_FIELDS))
+        Appointment.objects.filter(pk__in=[row['id'] for row in rows]).update(**{flag: True})
+        for row in rows:
+            row[flag] = True
+        return rows
+
+    compiler = queryset.query.get_compiler(using=queryset.db)
+    try:
+        where, params = compiler.compile(queryset.query.where)
+    except EmptyResultSet:
+        return []
+    opts = Appointment._meta
+    quote = connection.ops.quote_name
+    columns = [opts.get_field(name).column for name in RETURNED_FIELDS]
+    sql = (
+        f"UPDATE {quote(opts.db_table)} SET {quote(opts.get_field(flag).column)} = %s "
+        f"WHERE {where} RETURNING {', '.join(quote(column) for column in columns)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [True, *params])
+        result = cursor.fetchall()
+    fields = [opts.get_field(name) for name in RETURNED_FIELDS]
+    return [
+        {name: field.to_python(value) for name, field, value in zip(RETURNED_FIELDS, fields, row)}
+        for row in result
+    ]
+
+
+def _record_changes(rows, flag):
+    # Bulk updates bypass the model signals; every row had ``flag`` unset before
+    def state(row, **overrides):
+        values = {**row, **overrides}
+        return stats.appointment_state(
+            values['date'], values['doctor_id'], values['is_approved'], values['is_completed'], values['is_cancelled'],
+        )
+    stats.record_appointments([(state(row, **{flag: False}), state(row)) for row in rows])
+    versions.bump_many(
+        [versions.schedule_key(row['doctor_id']) for row in rows]
+        + [versions.customer_key(row['customer_id']) for row in rows if row['customer_id']]
+    )
+    events.publish_appointments(events.STATE_EVENTS[flag], rows)
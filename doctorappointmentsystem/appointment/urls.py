@@ -1,7 +1,5 @@
 from django.urls import path
-from . import views 
-from django.conf.urls.static import static
-from django.conf import settings
+from . import api, views 
 
 urlpatterns = [
     path('', views.IndexPageView.as_view(), name='index'),
@@ -11,11 +9,20 @@ urlpatterns = [
     path('<int:doctor_pk>/create-appoint/', views.CreateAppointmentDoctorView.as_view(), name='create_appointment'),
     path('<int:doctor_pk>/write-review', views.WriteReviewView.as_view(), name='write_review'),
     path('<int:doc_pk>/doctor-details', views.DoctorDetailView.as_view(), name='doctor_details'),
+    path('<int:doctor_pk>/availability', views.DoctorAvailabilityView.as_view(), name='doctor_availability'),
     path('<int:pk>/approve-appointment', views.ApproveAppointmentView.as_view(), name='approve_appointment'),
     path('<int:pk>/complete-appointment', views.CompleteAppointmentView.as_view(), name='complete_appointment'),
     path('<int:pk>/cancel-appointment', views.CancelAppointmentView.as_view(), name='cancel_appointment'),
     path('dashboard/<int:doctor_pk>', views.DoctorDashboardView.as_view(), name='doctor_dashboard'),
+    path('dashboard/<int:doctor_pk>/events', views.DoctorAppointmentStreamView.as_view(), name='doctor_appointment_stream'),
+    path('dashboard/<int:doctor_pk>/bulk', views.BulkAppointmentTransitionView.as_view(), name='bulk_appointment_transition'),
     path('<int:patient_pk>/patient-details', views.PatientDetailView.as_view(), name='patient_detail'),
     path('profile-pic/', views.changeProfilePic.as_view(), name='change_profile_pic'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/doctors', api.DoctorListApi.as_view(), name='api_doctors'),
+    path('api/doctors/<int:doctor_pk>', api.DoctorDetailApi.as_view(), name='api_doctor_detail'),
+    path('api/doctors/<int:doctor_pk>/availability', api.DoctorAvailabilityApi.as_view(), name='api_doctor_availability'),
+    path('api/doctors/<int:doctor_pk>/appointments', api.BookAppointmentApi.as_view(), name='api_book_appointment'),
+    path('api/users/<int:user_pk>/appointments', api.UserAppointmentsApi.as_view(), name='api_user_appointments'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+]
 
@@ -0,0 +1,49 @@
+from django.db.models import Subquery
+
+from . import counters
+from .models import ResourceVersion
+
+DIRECTORY = 'directory'
+
+
+def doctor_key(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def schedule_key(doctor_id):
+    """A doctor's appointments, i.e. their availability."""
+    return f'schedule:{doctor_id}'
+
+
+def customer_key(customer_id):
+    """A customer's appointments."""
+    return f'customer:{customer_id}'
+
+
+def get(*keys):
+    """Current versions of ``keys`` in one query, 0 for keys that never changed."""
+    found = dict(ResourceVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return [found.get(key, 0) for key in keys]
+
+
+def get_for(queryset, *keys):
+    """
+    get() in the same query as an existence check: the versions of ``keys``,
+    or None when ``queryset`` has no rows.
+    """
+    row = queryset.order_by().values('pk').annotate(**{
+        f'version_{i}': Subquery(ResourceVersion.objects.filter(key=key).values('version')[:1])
+        for i, key in enumerate(keys)
+    }).first()
+    if row is None:
+        return None
+    return [row[f'version_{i}'] or 0 for i in range(len(keys))]
+
+
+def bump(*keys):
+    """Increment the versions of ``keys``, in one statement where the backend can upsert."""
+    bump_many(keys)
+
+
+def bump_many(keys):
+    counters.increment(ResourceVersion, ['key'], {(key,): {'version': 1} for key in keys if key}, create_negative=True)
@@ -1,58 +1,101 @@
-from django.http import Http404, HttpResponseRedirect
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.functional import empty
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from .forms import DoctorReviewForm, AppointmentCreateForm, ProfilePic
-from .models import Appointment, Doctor, Customer, User
+from .models import Appointment, Doctor, Customer, User, DoctorSearchIndex, DoctorReview
 from .filters import DoctorFilter, AppointmentFilter
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from . import availability, events, images, metrics, transitions
+from .directory import directory_cache
+from .pagination import KeysetPaginator, KeysetPaginationMixin, RankedPaginator
 from django.views.generic import (
     DetailView, TemplateView, UpdateView, FormView, ListView, CreateView, RedirectView
 )
 
 
-class IndexPageView(TemplateView):
-    
-    def get(self, request, *args, **kwargs):
-        if request.user.is_superuser:
-            return redirect('admin:index')
-        elif request.user.user_type == 'D':
-            return redirect('doctor_dashboard', request.user.pk)
+async def get_user(request):
+    """
+    ``request.user`` for async views. Django 4.2 has no ``request.auser()``,
+    so a user no middleware has loaded yet is loaded in a worker thread.
+    """
+    if getattr(request.user, '_wrapped', None) is empty:
+        await sync_to_async(lambda: request.user.pk)()
+    return request.user
 
-        doctors_list = Doctor.objects.filter(is_approved=True).order_by('id')
-        myFilter = DoctorFilter(request.GET, queryset=doctors_list)
-        doctors_list = myFilter.qs
 
-        paginator = Paginator(doctors_list, 5)
-        page_number = request.GET.get('page')
-        try:
-            page_obj = paginator.get_page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+class IndexPageView(View):
+    query_budget = 4
 
+    async def get(self, request, *args, **kwargs):
+        user = await get_user(request)
+        if user.is_superuser:
+            return redirect('admin:index')
+        elif user.user_type == 'D':
+            return redirect('doctor_dashboard', user.pk)
+
+        myFilter = DoctorFilter(request.GET, queryset=DoctorSearchIndex.objects.filter(is_approved=True))
+        cursor = request.GET.get('cursor')
+
+        async def build_page():
+            # Free-text searches run the search backend's raw SQL
+            ranked_ids = await sync_to_async(lambda: myFilter.ranked_ids)()
+            doctors_list = myFilter.qs
+            if ranked_ids is not None:
+                paginator = RankedPaginator(doctors_list, 5, ranked_ids)
+            else:
+                paginator = KeysetPaginator(doctors_list, 5, ['specialization', 'last_name', 'pk'])
+            return await paginator.aget_page(cursor)
+
+        page_obj = await directory_cache.aget_page(request.GET, cursor, build_page)
+
+        params = request.GET.copy()
+        params.pop('cursor', None)
         context = {
             'page_obj': page_obj,
-            'myFilter': myFilter
+            'myFilter': myFilter,
+            'querystring': params.urlencode(),
         }
         return render(request, 'appointment/index.html', context)
     
 
 class DoctorDetailView(View):
+    query_budget = 4
+    reviews_per_page = 10
 
-    def get(self, request, doc_pk):
-        doctor_details = Doctor.objects.prefetch_related('doctorreview_set').filter(id=doc_pk)
+    async def get(self, request, doc_pk):
+        try:
+            doctor = await Doctor.objects.select_related('review_stats').aget(pk=doc_pk)
+        except Doctor.DoesNotExist:
+            raise Http404("Doctor does not exist.")
+        await get_user(request)  # The layout template reads it
+        reviews = DoctorReview.objects.select_related('author').filter(doctor_id=doc_pk)
+        # Newest first by id: legacy reviews have no created_at to page on
+        paginator = KeysetPaginator(reviews, self.reviews_per_page, ['-id'])
         context = {
-            'doctor_details': doctor_details
+            'doctor': doctor,
+            'stats': getattr(doctor, 'review_stats', None),
+            'page_obj': await paginator.aget_page(request.GET.get('cursor')),
         }
         return render(request, 'appointment/doctor_detail.html', context)
 
  
 
 class WriteReviewView(View):
+    query_budget = {'get': 2, 'post': 11}
+
     def get(self, request, doctor_pk):
         form = DoctorReviewForm(initial={'doctor_id': doctor_pk})
         return render(request, 'appointment/write_review.html', {'form': form})
@@ -62,50 +105,104 @@ class WriteReviewView(View):
         if not form.is_valid():
             return render(request, 'appointment/write_review.html', {'form': form})
         review = form.save(commit=False)
-        doctor = Doctor.objects.get(id=doctor_pk)
+        doctor = get_object_or_404(Doctor, id=doctor_pk)
         review.doctor_id = doctor
+        if request.user.is_customer():
+            review.author_id = request.user.pk
+        # Saving also updates the doctor's review stats
         review.save()
         return redirect('index')
     
 
-class UserAppointmentsView(ListView):
-    model = Appointment
-    template_name = 'appointment/user_appointments.html'
-    context_object_name = 'appointment_details'
+class AppointmentTimelineMixin:
+    """
+    Narrow appointment lists to ``?when=upcoming`` (the default, soonest
+    first), ``today``, ``week`` or ``past`` (latest first), all seeking on the
+    indexed starts_at column.
+    """
+    timeline_choices = ['upcoming', 'today', 'week', 'past']
+
+    def timeline(self, queryset):
+        self.when = self.request.GET.get('when')
+        if self.when not in self.timeline_choices:
+            self.when = 'upcoming'
+        self.keyset_ordering = ['-starts_at', '-id'] if self.when == 'past' else ['starts_at', 'id']
+        if self.when == 'today':
+            return queryset.today()
+        if self.when == 'week':
+            return queryset.for_week()
+        return getattr(queryset, self.when)()
+
+    def timeline_context(self):
+        # The timeline links keep the other filters but start from page 1
+        params = self.request.GET.copy()
+        params.pop('when', None)
+        params.pop('cursor', None)
+        return {'when': self.when, 'timeline_choices': self.timeline_choices, 'timeline_querystring': params.urlencode()}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.timeline_context())
+        return context
+
+
+class UserAppointmentsView(AppointmentTimelineMixin, View):
+    query_budget = 3
     paginate_by = 5
 
-    def get_queryset(self):
-        user_pk = self.kwargs['user_pk']
-        return Appointment.objects.select_related('doctor').filter(customer_id=user_pk).all()
+    async def get(self, request, user_pk):
+        user = await get_user(request)
+        if user.pk != user_pk:
+            raise Http404("ERROR: user is not authenticated.")
+        appointments = self.timeline(Appointment.objects.select_related('doctor').filter(customer_id=user_pk))
+        paginator = KeysetPaginator(appointments, self.paginate_by, self.keyset_ordering)
+        page_obj = await paginator.aget_page(request.GET.get('cursor'))
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        context = {
+            'appointment_details': page_obj.object_list,
+            'page_obj': page_obj,
+            'is_paginated': page_obj.has_other_pages(),
+            'querystring': params.urlencode(),
+            **self.timeline_context(),
+        }
+        return render(request, 'appointment/user_Appointments.html', context)
     
 
-class ApproveAppointmentView(View):
+class AppointmentTransitionView(View):
+    # One of these reads the schedule version sent with the live dashboard event
+    query_budget = 10
+    action = None
+
+    def owned_by(self, user):
+        """The appointments ``user`` may apply the action to: their own as the doctor."""
+        return Q(doctor_id=user.pk)
+
     def get(self, request, *args, **kwargs):
-        appointment = get_object_or_404(Appointment, pk=kwargs['pk'])
-        appointment.is_approved = True
-        appointment.save()
+        appointments = Appointment.objects.filter(self.owned_by(request.user), pk=kwargs['pk'])
+        if not transitions.apply(appointments, self.action) and not appointments.exists():
+            raise Http404("Appointment does not exist.")
         return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
-        
 
-class CompleteAppointmentView(View):
-    def get(self,request,  *args, **kwargs):
-        appointment = get_object_or_404(Appointment, pk=kwargs['pk'])
-        appointment.is_completed = True
-        appointment.save()
 
-        return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+class ApproveAppointmentView(AppointmentTransitionView):
+    action = 'approve'
+        
 
-class CancelAppointmentView(RedirectView):
+class CompleteAppointmentView(AppointmentTransitionView):
+    action = 'complete'
 
-    def get(self, request, *args, **kwargs):
-        appointment = get_object_or_404(Appointment, pk=kwargs['pk'])
-        appointment.is_cancelled = True
-        appointment.save()
 
-        return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+class CancelAppointmentView(AppointmentTransitionView):
+    action = 'cancel'
+
+    def owned_by(self, user):
+        # Patients cancel their own bookings from their appointments page
+        return Q(doctor_id=user.pk) | Q(customer_id=user.pk)
 
 
 class UserProfileView(DetailView):
+    query_budget = 2
     template_name = 'appointment/user_detail.html'
     model = None 
     form_class = ProfilePic
@@ -120,6 +217,9 @@ class UserProfileView(DetailView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_object(self, queryset=None):
+        # The session's user is already typed (see userauth.usercache)
+        if self.model is not None and isinstance(self.request.user, self.model):
+            return self.request.user
         return get_object_or_404(self.model, pk=self.kwargs['user_pk'])
 
     def get_context_data(self, **kwargs):
@@ -130,6 +230,7 @@ class UserProfileView(DetailView):
 
 
 class ChangePasswordView(FormView):
+    query_budget = {'get': 2, 'post': 10}
     template_name = 'appointment/change_password.html'
     form_class = PasswordChangeForm
 
@@ -144,7 +245,8 @@ class ChangePasswordView(FormView):
         return kwargs
 
 
-class DoctorDashboardView(ListView):
+class DoctorDashboardView(AppointmentTimelineMixin, KeysetPaginationMixin, ListView):
+    query_budget = 3
     model = Appointment
     template_name = 'appointment/doctor_dashboard.html'
     context_object_name = 'appointment_list'
@@ -152,34 +254,106 @@ class DoctorDashboardView(ListView):
 
     def get_queryset(self):
         doctor_pk = self.kwargs['doctor_pk']
-        if self.request.user.is_authenticated and self.request.user.pk == doctor_pk and self.request.user.is_doctor():
-            appointment_details = Appointment.objects.select_related('customer').filter(doctor_id=doctor_pk)
-            return appointment_details
-        else:
+        if not (self.request.user.is_authenticated and self.request.user.pk == doctor_pk and self.request.user.is_doctor()):
             raise Http404("ERROR: user is not authenticated.")
+        appointment_details = self.timeline(Appointment.objects.select_related('customer', 'doctor').filter(doctor_id=doctor_pk))
+        # Filter once and let ListView paginate the filtered queryset.
+        self.myFilter = AppointmentFilter(self.request.GET, queryset=appointment_details)
+        return self.myFilter.qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        myFilter = AppointmentFilter(self.request.GET, queryset=self.get_queryset())
-        appointment_details = myFilter.qs
-        
-        p = Paginator(appointment_details, self.paginate_by)
-        page_number = self.request.GET.get('page')
-        
-        try:
-            page_obj = p.page(page_number)  # returns the desired page object
-        except PageNotAnInteger:
-            # if page_number is not an integer then assign the first page
-            page_obj = p.page(1)
-        except EmptyPage:
-            # if page is empty then return last page
-            page_obj = p.page(p.num_pages)
-        context['page_obj'] = page_obj
-        context['myFilter'] = myFilter
+        context['myFilter'] = self.myFilter
         return context
  
 
+class DoctorAppointmentStreamView(View):
+    """
+    Server-sent events stream of a doctor's own appointment changes, fed by
+    appointment.events, so the dashboard can show them without reloading.
+    Needs an ASGI server. Under WSGI it answers 204, which tells EventSource
+    not to reconnect.
+    """
+    query_budget = 2
+    heartbeat = 15  # seconds between keep-alive comments
+    # Django 4.2 doesn't notice a client that went away until a write fails,
+    # so streams end after this long and EventSource reconnects.
+    max_duration = 600
+
+    async def get(self, request, doctor_pk):
+        user = await get_user(request)
+        if not (user.is_authenticated and user.pk == doctor_pk and user.is_doctor()):
+            raise Http404("ERROR: user is not authenticated.")
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+        response = StreamingHttpResponse(self.stream(doctor_pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+        return response
+
+    async def stream(self, doctor_pk):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_duration
+        async with events.get_hub().subscribe(events.doctor_channel(doctor_pk)) as subscription:
+            yield 'retry: 5000\n\n'
+            while loop.time() < deadline:
+                try:
+                    message = await subscription.get(timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'data: {message}\n\n'
+
+
+class BulkAppointmentTransitionView(View):
+    """
+    Apply approve/complete/cancel to many of a doctor's appointments with one
+    UPDATE. Targets are the posted ``ids``, or with ``scope=filter`` every
+    appointment matching the posted dashboard filter fields. Responds with the updated rows as
+    JSON, as table rows with ``format=html``, or redirects to ``next``.
+    """
+    # The rollups take one statement per table however many days are touched, and
+    # one more query reads the schedule version sent with the live dashboard event
+    query_budget = 11
+
+    def post(self, request, doctor_pk):
+        if not (request.user.is_authenticated and request.user.pk == doctor_pk and request.user.is_doctor()):
+            raise Http404("ERROR: user is not authenticated.")
+        action = request.POST.get('action')
+        if action not in transitions.TRANSITIONS:
+            return JsonResponse({'error': f'Unknown action {action!r}.'}, status=400)
+
+        appointments = Appointment.objects.filter(doctor_id=doctor_pk)
+        ids = request.POST.getlist('ids')
+        if ids:
+            try:
+                appointments = appointments.filter(pk__in=[int(pk) for pk in ids])
+            except ValueError:
+                return JsonResponse({'error': 'ids must be integers.'}, status=400)
+        elif request.POST.get('scope') == 'filter':
+            appointments = AppointmentFilter(request.POST, queryset=appointments).qs
+        else:
+            appointments = appointments.none()
+        updated = transitions.apply(appointments, action)
+
+        next_url = request.POST.get('next')
+        if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+            return redirect(next_url)
+        if request.POST.get('format') == 'html':
+            rows = Appointment.objects.select_related('customer', 'doctor').filter(pk__in=[row['id'] for row in updated])
+            return render(request, 'appointment/_appointment_rows.html', {'appointments': rows})
+        return JsonResponse({
+            'action': action,
+            'updated': [
+                {**row, 'date': row['date'].isoformat(), 'start_time': row['start_time'].isoformat(),
+                 'end_time': row['end_time'].isoformat()}
+                for row in updated
+            ],
+        })
+
+
 class PatientDetailView(DetailView):
+    query_budget = 3
     model = Customer
     template_name = 'appointment/customer_detail.html'
     context_object_name = 'cust_details'
@@ -189,6 +363,8 @@ class PatientDetailView(DetailView):
  
 
 class CreateAppointmentDoctorView(CreateView):
+    # One of these reads the schedule version sent with the live dashboard event
+    query_budget = {'get': 4, 'post': 13}
     model = Appointment
     form_class = AppointmentCreateForm
     template_name = 'appointment/create_appoint.html'
@@ -196,25 +372,96 @@ class CreateAppointmentDoctorView(CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['doctor'] = get_object_or_404(Doctor, pk=self.kwargs['doctor_pk'])
-        context['customer'] = get_object_or_404(Customer, pk=self.request.user.pk)
+        context['customer'] = self.get_customer()
+        context['free_slots'] = availability.free_slots(context['doctor'], days=7)
         return context
 
     def form_valid(self, form):
         doctor = get_object_or_404(Doctor, pk=self.kwargs['doctor_pk'])
-        customer = get_object_or_404(Customer, pk=self.request.user.pk)
+        customer = self.get_customer()
         form.instance.doctor = doctor
         form.instance.customer = customer
-        return super().form_valid(form)
+        try:
+            self.object = availability.book(form.instance)
+        except availability.SlotUnavailable as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+    def get_customer(self):
+        user = self.request.user
+        return user if isinstance(user, Customer) else get_object_or_404(Customer, pk=user.pk)
 
     def get_success_url(self):
         return reverse_lazy('index')
 
 
+class DoctorAvailabilityView(View):
+    query_budget = 4
+
+    def get(self, request, doctor_pk):
+        doctor = get_object_or_404(Doctor, pk=doctor_pk)
+        try:
+            days = int(request.GET.get('days', 7))
+        except ValueError:
+            days = 7
+        slots = availability.free_slots(doctor, days=days)
+        return JsonResponse({
+            'doctor': doctor.pk,
+            'slot_minutes': doctor.slot_minutes,
+            'free_slots': {
+                date.isoformat(): [[start.strftime('%H:%M'), end.strftime('%H:%M')] for start, end in day_slots]
+                for date, day_slots in slots.items()
+            },
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
 class changeProfilePic(View):
+    """
+    The upload handler has to be in place before anything reads
+    request.POST, CsrfViewMiddleware included, so the CSRF check runs in
+    upload() instead, once the handler is installed.
+
+    The exemption costs nothing: the token is in the body, so a CSRF check
+    parses the body first whenever the CSRF cookie is present. Here a forged
+    POST is parsed by the limited handler, which stops at MAX_UPLOAD_BYTES,
+    and is then refused before the form, the storage or the database see it.
+    Under the middleware it would be parsed in full by the default handlers.
+    """
+    query_budget = 9
+    template_name = 'appointment/user_detail.html'
+
     def post(self, request, *args, **kwargs):
-        user = get_object_or_404(User, pk=request.user.pk)
-        form = ProfilePic(request.POST, request.FILES, instance=user)
+        limited = images.LimitedUploadHandler(request)
+        request.upload_handlers.insert(0, limited)
+        return self.upload(request, limited)
+
+    @method_decorator(csrf_protect)
+    def upload(self, request, limited):
+        form = ProfilePic(request.POST, request.FILES, instance=request.user)
+        if limited.skipped:
+            form.add_error('prifile_pic', images.upload_too_large())
+        elif 'prifile_pic' not in request.FILES:
+            form.add_error('prifile_pic', ValidationError('Choose an image to upload.', code='required'))
         if form.is_valid():
-            form.save()
-            
-        return redirect('user_detail', user_pk=request.user.pk)
+            # Not form.save(): the original is staged for the image worker,
+            # which swaps in the re-encoded picture and thumbnails
+            images.store_upload(request.user, form.cleaned_data['prifile_pic'])
+            return redirect('user_detail', user_pk=request.user.pk)
+        return render(request, self.template_name, {'user_details': request.user, 'form': form})
+
+
+class MetricsView(View):
+    """
+    This process's request metrics in the Prometheus text format, for staff
+    users or a scraper sending ``Authorization: Bearer <METRICS['TOKEN']>``.
+    """
+    query_budget = 2
+
+    def get(self, request):
+        token = metrics.get_config()['TOKEN']
+        if not (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+            if not request.user.is_staff:
+                raise PermissionDenied
+        return HttpResponse(metrics.get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
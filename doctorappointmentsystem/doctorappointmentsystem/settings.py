@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'appointment.middlewareFiles.MetricsMiddleware.MetricsMiddleware',
+    'appointment.middlewareFiles.DatabaseRoutingMiddleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,12 +64,20 @@ ROOT_URLCONF = 'doctorappointmentsystem.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for appointment.metrics
+        'BACKEND': 'appointment.metrics.InstrumentedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parsed templates are kept in memory. With DEBUG the autoreloader
+            # clears them when a template file changes, so this suits both.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -83,11 +95,76 @@ WSGI_APPLICATION = 'doctorappointmentsystem.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # transaction_mode is new in Django 5.1; appointment.sqlite backports it
+        'ENGINE': 'django.db.backends.sqlite3' if django.VERSION >= (5, 1) else 'appointment.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # Persistent connections; SQLITE_PRAGMAS run once per connection
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Point DATABASE_REPLICA at a read-only copy of the database (kept by e.g.
+# Litestream or LiteFS) to send reads there; see appointment.database.
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'], 'NAME': os.environ['DATABASE_REPLICA'], 'OPTIONS': {}, 'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['appointment.database.PrimaryReplicaRouter']
+DATABASE_ROUTING = {'REPLICA': 'replica', 'STICKY_SECONDS': 15}
+# WAL, busy_timeout, synchronous=NORMAL and mmap_size by default
+SQLITE_PRAGMAS = {}
+
+# Local-memory LRU by default. It is per process, so with several workers
+# set REDIS_URL (or point this at Memcached) for directory invalidation to
+# reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'doctorappointmentsystem',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['REDIS_URL']}
+
+# Whether every worker sees the same cache. Sessions and signed-in users are
+# only served from the cache then: a per-process cache would miss a logout,
+# password change or deactivation handled by another worker.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in {
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Rendered template fragments, see appointment.fragments
+FRAGMENT_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+}
+
+# Cached doctor directory pages, see appointment.directory
+DIRECTORY_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 600,
+}
+
+# Pub/sub behind the live doctor dashboard, see appointment.events. LocalHub
+# only reaches subscribers in the same process; with several ASGI workers use
+# {'BACKEND': 'appointment.events.RedisHub', 'OPTIONS': {'URL': 'redis://...'}}.
+EVENT_HUB = {
+    'BACKEND': 'appointment.events.LocalHub',
+    'OPTIONS': {'QUEUE_SIZE': 100},
+}
+
+# Per-view request metrics, served in the Prometheus format at /metrics, see
+# appointment.metrics. Set TOKEN for a scraper; staff users can always read it.
+METRICS = {
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING') == '1',  # only while profiling, see README
+    'ENFORCE_BUDGETS': False,
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,14 +211,46 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
+# Profile picture pipeline, see appointment.images. STORAGE is a storage
+# alias; any backend with the Django storage API can replace the local one.
+PROFILE_IMAGES = {
+    'STORAGE': 'default',
+    'MAX_UPLOAD_BYTES': 10 * 1024 * 1024,
+    'THUMBNAIL_SIZES': [64, 256],
+}
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
 AUTH_USER_MODEL = 'appointment.User'
 
+AUTHENTICATION_BACKENDS = ['userauth.backends.EmailOrPhoneBackend']
+
+# With a shared cache, sessions are read from it and written through to the
+# database, and signed-in users are cached too (see userauth.usercache), so a
+# signed-in request makes no queries before the view. The userauth system
+# check refuses either mode on a per-process cache.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + ('cached_db' if SHARED_CACHE else 'db')
+USER_CACHE = {'ENABLED': SHARED_CACHE, 'ALIAS': 'default', 'TIMEOUT': 300}
+
 LOGIN_REDIRECT_URL = 'login_user'
 LOGOUT_REDIRECT_URL = 'index'
 
+# URL names or path prefixes anonymous users may reach. LoginRequiredMiddleware
+# always adds STATIC_URL, MEDIA_URL and the django.contrib.auth.urls views.
+LOGIN_REQUIRED_PUBLIC_PATHS = [
+    'login_user',
+    'login_doctor',
+    'register_user',
+    'register_doctor',
+    'admin:login',
+    'admin:index',
+    'metrics',  # checks staff or METRICS['TOKEN'] itself
+]
+# Answered with a JSON 401 (and JSON 403 on CSRF failures) instead of the login redirect
+LOGIN_REQUIRED_JSON_PATHS = ['/api/']
+CSRF_FAILURE_VIEW = 'appointment.api.csrf_failure'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -156,6 +265,14 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = ''  # Replace with your email address
 EMAIL_HOST_PASSWORD = ''  # Replace with your email password
 
+# Request log written by appointment.middlewareFiles.LoggingMiddleware
+REQUEST_LOG = {
+    'PATH': os.path.join(BASE_DIR, 'appointment', 'logfiles', 'logfile.log'),
+    'MODE': os.getenv('REQUEST_LOG_MODE', 'queue'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -6,5 +6,7 @@ class UserauthConfig(AppConfig):
     
     def ready(self):
         import userauth.signals.email_signals  #To import the signals.py
+        import userauth.signals.user_cache_signals
+        import userauth.checks  # Refuses the auth caches on a per-process cache
 
     
\ No newline at end of file
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+
+from userauth.usercache import typed, user_cache
+
+UserModel = get_user_model()
+
+
+class EmailOrPhoneBackend(ModelBackend):
+    """
+    Authenticate with an email address, phone number or username in a single
+    query. All three columns are unique, so at most one row per column can
+    match; email wins over phone, and phone over username.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        candidates = list(
+            UserModel._default_manager.filter(Q(email=username) | Q(phone_no=username) | Q(username=username))[:3]
+        )
+        user = next(
+            (u for field in ('email', 'phone_no', 'username') for u in candidates if getattr(u, field) == username),
+            None,
+        )
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        def load():
+            user = super(EmailOrPhoneBackend, self).get_user(user_id)
+            return typed(user) if user is not None else None
+        return user_cache.get(user_id, load)
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PER_PROCESS_CACHES = {'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache'}
+CACHED_SESSION_ENGINES = {'django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db'}
+
+
+def is_per_process(alias):
+    return settings.CACHES[alias]['BACKEND'] in PER_PROCESS_CACHES
+
+
+@register()
+def check_auth_caches(app_configs, **kwargs):
+    """Sessions and users cached per process outlive a logout or password change in another worker."""
+    from userauth.usercache import get_config
+
+    errors = []
+    config = get_config()
+    if config['ENABLED'] and is_per_process(config['ALIAS']):
+        errors.append(Error(
+            f"USER_CACHE is enabled on the per-process cache {config['ALIAS']!r}.",
+            hint="Point it at a cache shared by every worker (e.g. set REDIS_URL), or set USER_CACHE['ENABLED'] = False.",
+            id='userauth.E001',
+        ))
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and is_per_process(settings.SESSION_CACHE_ALIAS):
+        errors.append(Error(
+            f'{settings.SESSION_ENGINE} keeps sessions in the per-process cache {settings.SESSION_CACHE_ALIAS!r}.',
+            hint="Use a cache shared by every worker (e.g. set REDIS_URL), or the 'db' session engine.",
+            id='userauth.E002',
+        ))
+    return errors
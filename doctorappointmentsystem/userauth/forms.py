@@ -1,5 +1,6 @@
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from appointment.models import Customer, Doctor, User
+from appointment.forms import DoctorProfileFormMixin
+from appointment.models import Customer, Doctor
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
@@ -10,7 +11,7 @@ class RegisterUserForm(UserCreationForm):
                   'gender', 'password1', 'password2']
 
 
-class RegisterDoctorUserForm(UserCreationForm):
+class RegisterDoctorUserForm(DoctorProfileFormMixin, UserCreationForm):
     class Meta:
         model = Doctor
         fields = ['username', 'first_name', 'last_name', 'phone_no', 'email', 
@@ -18,46 +19,13 @@ class RegisterDoctorUserForm(UserCreationForm):
         
         
 class CustomAuthenticationForm(AuthenticationForm):
+    """
+    Login with an email address or mobile number. AuthenticationForm.clean()
+    calls authenticate(), which EmailOrPhoneBackend answers with one query.
+    """
     username = forms.CharField(label=_('Mobile/Email'), max_length=254)
     
     error_messages = {
         'invalid_login': "Please enter a correct email or mobile number and password. Note that both fields may be case-sensitive.",
         'inactive': "This account is inactive.",
     }
-    
-    def clean(self):
-        username = self.cleaned_data.get('username')
-        password = self.cleaned_data.get('password')
-
-        if username and password:
-            user = None
-            if User.objects.filter(email=username).exists():
-                user = User.objects.get(email=username)
-            elif User.objects.filter(phone_no=username).exists():
-                user = User.objects.get(phone_no=username)
-
-            if user is None or not user.check_password(password):
-                raise forms.ValidationError(
-                    self.error_messages['invalid_login'],
-                    code='invalid_login',
-                    params={'username': self.username_field.verbose_name},
-                )
-
-            self.user_cache = (
-                user
-                if user.email == username or user.phone_no == username
-                else None
-            )
-            if self.user_cache is None:
-                raise forms.ValidationError(
-                    self.error_messages['invalid_login'],
-                    code='invalid_login',
-                    params={'username': self.username_field.verbose_name},
-                )
-            if self.user_cache is not None and not self.user_cache.is_active:
-                raise forms.ValidationError(
-                    self.error_messages['inactive'],
-                    code='inactive',
-                )
-                
-        return self.cleaned_data
\ No newline at end of file
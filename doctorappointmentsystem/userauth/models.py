@@ -1,3 +1,48 @@
 from django.db import models
+from django.db.models import Q
 
-# Create your models here.
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be delivered by the send_queued_mail worker. Signal
+    handlers only insert rows here, so request handling never waits on SMTP.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    status_choices = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    dedupe_key = models.CharField(max_length=100)
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.TextField(help_text='Comma-separated addresses')
+    status = models.CharField(max_length=10, choices=status_choices, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set by the worker sending it (see outbox.claim)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+        constraints = [
+            # The same message can't be queued twice until it is delivered
+            models.UniqueConstraint(fields=['dedupe_key'], condition=Q(status__in=['pending', 'sending']),
+                                    name='outbox_unsent_dedupe'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipients}"
@@ -0,0 +1,109 @@
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = 5
+# A claim older than this belongs to a worker that died mid-batch
+CLAIM_TIMEOUT = datetime.timedelta(minutes=10)
+
+
+def enqueue(dedupe_key, subject, message, recipients, from_email=None):
+    """Queue an email; an unsent email with the same dedupe_key is kept instead."""
+    enqueue_many([(dedupe_key, subject, message, recipients)], from_email)
+
+
+def enqueue_many(emails, from_email=None, batch_size=1000):
+    """Queue ``(dedupe_key, subject, message, recipients)`` tuples in bulk, like enqueue."""
+    now = timezone.now()
+    OutboxEmail.objects.bulk_create([
+        OutboxEmail(
+            dedupe_key=dedupe_key,
+            subject=subject,
+            message=message,
+            from_email=from_email if from_email is not None else settings.EMAIL_HOST_USER,
+            recipients=','.join(recipients),
+            next_attempt_at=now,
+        )
+        for dedupe_key, subject, message, recipients in emails
+    ], batch_size=batch_size, ignore_conflicts=True)
+
+
+def retry_delay(attempts):
+    return datetime.timedelta(minutes=2 ** attempts)
+
+
+def claim(batch_size, now):
+    """
+    Mark up to ``batch_size`` due emails as being sent by this worker and
+    return them. The UPDATE only takes rows still unclaimed, so concurrent
+    workers never get the same row; rows whose claim timed out are taken
+    over (and may be sent twice if that worker did send them).
+    """
+    due = (Q(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+           | Q(status=OutboxEmail.SENDING, claimed_at__lt=now - CLAIM_TIMEOUT))
+    ids = list(OutboxEmail.objects.filter(due).values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboxEmail.objects.filter(due, pk__in=ids).update(status=OutboxEmail.SENDING, claimed_by=token, claimed_at=now)
+    return list(OutboxEmail.objects.filter(claimed_by=token, status=OutboxEmail.SENDING))
+
+
+def drain(batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """
+    Claim and send one batch of due emails over a single backend connection.
+    Failed sends are retried with exponential backoff and given up on after
+    ``max_attempts``. Returns ``(sent, failed)``.
+    """
+    now = timezone.now()
+    batch = claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            _record_failure(email, e, now, max_attempts)
+        failed = len(batch)
+    else:
+        try:
+            for email in batch:
+                message = EmailMessage(
+                    email.subject, email.message, email.from_email or None,
+                    email.recipients.split(','), connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as e:
+                    _record_failure(email, e, now, max_attempts)
+                    failed += 1
+                else:
+                    email.attempts += 1
+                    email.status = OutboxEmail.SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+                    sent += 1
+        finally:
+            connection.close()
+
+    OutboxEmail.objects.bulk_update(batch, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+    return sent, failed
+
+
+def _record_failure(email, error, now, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.FAILED
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = now + retry_delay(email.attempts)
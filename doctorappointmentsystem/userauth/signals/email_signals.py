@@ -1,26 +1,54 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
 from appointment.models import Customer, Doctor
+from userauth import outbox
+
+
+def welcome_email(user):
+    """``(dedupe_key, subject, message, recipients)`` for outbox.enqueue."""
+    return (
+        f'welcome:{user.pk}',
+        'Welcome to Our Website',
+        f'Hello {user.first_name} {user.last_name},\n\nWelcome to our website! Thank you for joining us.',
+        [user.email],
+    )
+
+
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=Doctor)
+def remember_active_state(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred is_active isn't fetched just for this
+    instance._loaded_is_active = instance.__dict__.get('is_active')
+
 
 @receiver(post_save, sender=Customer)
 @receiver(post_save, sender=Doctor)
-def send_welcome_email(sender, instance, created, **kwargs):
+def send_welcome_email(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    previous = getattr(instance, '_loaded_is_active', None)
+    instance._loaded_is_active = instance.is_active
+    if raw:
+        return
+
     if created:
-        subject = 'Welcome to Our Website'
-        message = f'Hello {instance.first_name} {instance.last_name},\n\nWelcome to our website! Thank you for joining us.'
-        from_email = settings.EMAIL_HOST_USER
-        recipient_email = [instance.email]
+        email = welcome_email(instance)
+        transaction.on_commit(lambda: outbox.enqueue(*email))
+        return
+
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    elif previous is None or previous == instance.is_active:
+        # Not an activation change, e.g. a profile or password update
+        return
     elif instance.is_active == False:
+        kind = 'deactivated'
         subject = 'Account Deactivated'
         message = f'Hello {instance.first_name} {instance.last_name},\n\nYour account has been deactivated.'
-        from_email = settings.EMAIL_HOST_USER
-        recipient_email = [instance.email]
-    elif instance.is_active == True:
+    else:
+        kind = 'activated'
         subject = 'Account Activated'
         message = f'Hello {instance.first_name} {instance.last_name},\n\nYour account has been activated.'
-        from_email = settings.EMAIL_HOST_USER
-        recipient_email = [instance.email]
-        
-    send_mail(subject, message, from_email, recipient_email)
\ No newline at end of file
+
+    dedupe_key = f'{kind}:{instance.pk}'
+    recipient_email = [instance.email]
+    transaction.on_commit(lambda: outbox.enqueue(dedupe_key, subject, message, recipient_email))
@@ -0,0 +1,17 @@
+from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from appointment.models import Customer, Doctor, User
+from userauth.usercache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Customer)
+def invalidate_user(sender, instance, **kwargs):
+    # Now and after commit, so a concurrent request can't re-cache the old row
+    user_cache.invalidate(instance.pk)
+    transaction.on_commit(lambda: user_cache.invalidate(instance.pk))
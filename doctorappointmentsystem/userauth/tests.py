@@ -1,3 +1,124 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from appointment.models import Customer, User
+from appointment.tests import UsersMixin, make_customer, make_doctor
+
+from . import outbox
+from .checks import check_auth_caches
+from .forms import CustomAuthenticationForm
+from .models import OutboxEmail
+from .usercache import user_cache
+
+
+class EmailOrPhoneBackendTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+
+    def test_every_identifier_signs_in_with_one_query(self):
+        for identifier in ['customer@example.com', '+100000002', 'customer']:
+            with self.subTest(identifier), self.assertNumQueries(1):
+                self.assertEqual(authenticate(username=identifier, password='pw'), self.customer)
+        self.assertIsNone(authenticate(username='customer@example.com', password='wrong'))
+
+    def test_email_wins_over_phone_and_username(self):
+        # Usernames may look like another user's email or phone number
+        doctor = make_doctor(username='customer@example.com')
+        make_doctor(username='+100000002', email='other@example.com', phone_no='+100000003')
+        self.assertEqual(authenticate(username='customer@example.com', password='pw'), self.customer)
+        self.assertEqual(authenticate(username='+100000002', password='pw'), self.customer)
+        self.assertEqual(authenticate(username='doctor@example.com', password='pw'), doctor)
+
+    def test_unknown_user_still_hashes_the_password(self):
+        with mock.patch.object(User, 'set_password', autospec=True) as set_password, self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='nobody@example.com', password='pw'))
+        set_password.assert_called_once_with(mock.ANY, 'pw')
+
+    def test_inactive_users_are_refused(self):
+        User.objects.filter(pk=self.customer.pk).update(is_active=False)
+        self.assertIsNone(authenticate(username='customer@example.com', password='pw'))
+        form = CustomAuthenticationForm(data={'username': 'customer@example.com', 'password': 'pw'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['__all__'][0].code, 'invalid_login')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+    def test_enqueue_dedupes_unsent_emails(self):
+        outbox.enqueue('welcome:1', 'Welcome', 'Hello', ['a@example.com'])
+        outbox.enqueue('welcome:1', 'Welcome', 'Hello again', ['a@example.com'])
+        self.assertEqual(OutboxEmail.objects.get().message, 'Hello')
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual([(m.subject, m.to) for m in mail.outbox], [('Welcome', ['a@example.com'])])
+        self.assertEqual(outbox.drain(), (0, 0))
+        # Once sent, the key may be queued again
+        outbox.enqueue('welcome:1', 'Welcome', 'Hello', ['a@example.com'])
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count(), 1)
+
+    def test_failures_are_retried_then_given_up(self):
+        outbox.enqueue('welcome:1', 'Welcome', 'Hello', ['a@example.com'])
+        with mock.patch('userauth.outbox.EmailMessage.send', side_effect=OSError('refused')):
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 1))
+            email = OutboxEmail.objects.get()
+            self.assertEqual((email.status, email.attempts, email.last_error), (OutboxEmail.PENDING, 1, 'refused'))
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 0))  # backing off
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 1))
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.FAILED)
+        self.assertEqual(mail.outbox, [])
+
+    def test_workers_claim_disjoint_batches(self):
+        outbox.enqueue_many((f'welcome:{i}', 'Welcome', 'Hello', [f'{i}@example.com']) for i in range(3))
+        now = timezone.now()
+        first = outbox.claim(2, now)
+        second = outbox.claim(2, now)
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        self.assertEqual(outbox.claim(2, now), [])
+        # A worker that died mid-batch loses its claim after CLAIM_TIMEOUT
+        self.assertEqual(len(outbox.claim(5, now + outbox.CLAIM_TIMEOUT + datetime.timedelta(seconds=1))), 3)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class UserCacheTests(UsersMixin, TestCase):
+    """The shared-cache mode, on the test run's per-process cache."""
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(user_cache, 'enabled', True))
+        self.customer = make_customer()
+        self.client.force_login(self.customer)
+
+    def test_signed_in_request_makes_no_queries(self):
+        path = reverse('change_password')
+        self.client.get(path)
+        with self.assertNumQueries(0):
+            response = self.client.get(path)
+        self.assertIsInstance(response.wsgi_request.user, Customer)
+
+    def test_saves_reach_the_next_request(self):
+        path = reverse('user_detail', args=[self.customer.pk])
+        self.client.get(path)
+        self.customer.first_name = 'Grace'
+        self.customer.save()
+        self.assertContains(self.client.get(path), 'Grace')
+
+    def test_password_change_ends_other_sessions(self):
+        other = self.signed_in(self.customer)
+        other.get(reverse('change_password'))
+        self.client.post(reverse('change_password'), {
+            'old_password': 'pw', 'new_password1': 'N3w-passw0rd!', 'new_password2': 'N3w-passw0rd!',
+        })
+        self.assertEqual(self.client.get(reverse('change_password')).status_code, 200)
+        self.assertRedirects(other.get(reverse('change_password')), reverse('login_user'), fetch_redirect_response=False)
+
+    def test_per_process_cache_is_refused(self):
+        with override_settings(USER_CACHE={'ENABLED': True}):
+            self.assertEqual([error.id for error in check_auth_caches(None)], ['userauth.E001', 'userauth.E002'])
+        with override_settings(USER_CACHE={'ENABLED': False}, SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertEqual(check_auth_caches(None), [])
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from appointment import database, metrics
+from appointment.models import Customer, Doctor
+
+DEFAULT_USER_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    # Part of every key; change it when the User model's fields change and
+    # the cache outlives the deploy
+    'VERSION': 1,
+}
+
+
+def get_config():
+    return {**DEFAULT_USER_CACHE, **getattr(settings, 'USER_CACHE', {})}
+
+
+def typed(user):
+    """
+    ``user`` as a Doctor or Customer when it is one, built from the row
+    already loaded, so views can use request.user instead of fetching it
+    again through the proxy's manager.
+    """
+    if user.user_type == 'D':
+        model = Doctor
+    elif user.user_type == 'C' and not user.is_superuser:
+        model = Customer
+    else:
+        return user
+    if type(user) is model:
+        return user
+    fields = [field.attname for field in model._meta.concrete_fields]
+    return model.from_db(user._state.db, fields, [getattr(user, name) for name in fields])
+
+
+class UserCache:
+    """
+    Signed-in users under ``auth-user:<version>:<id>``, as typed() returns
+    them. Entries are deleted when the row is saved or deleted (see
+    userauth.signals.user_cache_signals), which covers password changes
+    and deactivation; the timeout bounds anything written behind the ORM's back.
+    """
+
+    def __init__(self, config):
+        self.enabled = config['ENABLED']
+        self.alias = config['ALIAS']
+        self.timeout = config['TIMEOUT']
+        self.version = config['VERSION']
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, user_id):
+        return f'auth-user:{self.version}:{user_id}'
+
+    def get(self, user_id, load):
+        """The cached user ``user_id``, calling ``load()`` on a miss; None is not cached."""
+        if not self.enabled:
+            return load()
+        key = self.key(user_id)
+        user = self.cache.get(key)
+        metrics.get_registry().cache_lookup('user', user is not None)
+        if user is not None:
+            return user
+        # Not from a replica that may not have the write that invalidated it
+        with database.use_primary():
+            user = load()
+        if user is not None:
+            self.cache.set(key, user, self.timeout)
+        return user
+
+    def invalidate(self, user_id):
+        self.cache.delete(self.key(user_id))
+
+
+user_cache = UserCache(get_config())
@@ -17,7 +17,7 @@ class LoginUserView(View):
 
     def post(self, request):
         error = None
-        form = self.form_class(data=request.POST)
+        form = self.form_class(request, data=request.POST)
         if form.is_valid():
             user = form.user_cache
             if user is not None and user.user_type == 'C':
@@ -37,7 +37,7 @@ class LoginDoctorView(View):
     
     def post(self, request):
         error = None
-        form = self.form_class(data=request.POST)
+        form = self.form_class(request, data=request.POST)
         if form.is_valid():
             user = form.user_cache
             if user is not None and user.user_type == 'D':